@@ -0,0 +1,12 @@
+from fastapi import HTTPException
+from typing import Dict, Any
+import math
+
+from core.resilience import is_circuit_open
+
+
+def raise_if_unavailable(response: Dict[str, Any]):
+    # An open circuit breaker means the service is known to be down: 503 at once
+    if is_circuit_open(response):
+        retry_after = math.ceil(response.get("retry_after") or 0)
+        raise HTTPException(status_code=503, detail=str(response.get("error")), headers={"Retry-After": str(retry_after)})
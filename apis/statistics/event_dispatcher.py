@@ -1,9 +1,10 @@
 from loguru import logger
 from typing import Dict, Any
-import sys
+import base64, sys, zlib
 
 sys.path.append("../../")
 from apis.statistics.repository import StatisticsRepository
+from apis.statistics.timeseries import parse_window
 
 class EventHandlers:
     def __init__(self, repository: StatisticsRepository):
@@ -24,11 +25,31 @@ class EventHandlers:
         logger.info(f"[StatisticsAPI] Users registered in last 24h: {count}")
         return {"registered_last_24h": count}
 
+    def statistics_summary_rpc(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        labels = payload.get("windows") or ["24h"]
+        try:
+            summary = self.repo.get_summary({label: parse_window(label) for label in labels})
+        except ValueError as ex:
+            logger.warning(f"[StatisticsAPI] Invalid summary request: {str(ex)}")
+            return {"error": f"Validation error: {str(ex)}"}
+        logger.info(f"[StatisticsAPI] Summary requested - windows: {labels}")
+        return summary
+
+    def statistics_snapshot_rpc(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        # Seeds gateway read models; compressed because SQS bodies cap at 256 KB
+        body = zlib.compress(self.repo.export_snapshot())
+        logger.info(f"[StatisticsAPI] Snapshot requested - {len(body)} bytes")
+        return {"snapshot": base64.b64encode(body).decode("ascii")}
+
     def user_registered_event(self, payload: Dict[str, Any]) -> None:
-        self.repo.increment_total_users()
+        if not self.repo.increment_total_users(seq=payload.get("id"), epoch=payload.get("users_epoch") or 0):
+            logger.info(f"[StatisticsAPI] User registered event already applied - id: {payload.get('id')}")
+            return
         logger.info(f"[StatisticsAPI] User registered event handled")
 
     def user_updated_event(self, payload: Dict[str, Any]) -> None:
-        self.repo.increment_total_updates()
+        if not self.repo.increment_total_updates(seq=payload.get("update_seq"), epoch=payload.get("users_epoch") or 0):
+            logger.info(f"[StatisticsAPI] User updated event already applied - update_seq: {payload.get('update_seq')}")
+            return
         logger.info(f"[StatisticsAPI] User updated event handled")
 
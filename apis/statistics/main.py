@@ -1,36 +1,76 @@
 import sys
 import signal
+from typing import Dict, Any, Callable
 sys.path.append("../../")
 
 from loguru import logger
 from core.consumer import Consumer
+from core.publisher import TOPIC_ARN
+from core.routing import apply_lane_policies
 from apis.statistics.repository import StatisticsRepository
 from apis.statistics.event_dispatcher import EventHandlers
 
 
 # Queue URLs
 QUEUE_URL = "http://localhost:4566/000000000000/statistics-queue"
+EVENTS_QUEUE_URL = "http://localhost:4566/000000000000/statistics-events-queue"
 RESPONSE_QUEUE_URL = "http://localhost:4566/000000000000/beeneu-response-queue"
 
+# Durability: WAL plus periodic snapshots, fsync "always", "group" or "off"
+DATA_DIR = "../../data/statistics"
+FSYNC_POLICY = "group"
+SNAPSHOT_EVERY = 10000
 
-def main():
-    logger.info("[StatisticsAPI] Starting consumer...")
-    
-    repository = StatisticsRepository()
+# Handler execution: "sync", "thread", "process" or "asyncio"
+EXECUTION_MODE = "thread"
+MAX_IN_FLIGHT = 20
+
+# Priority lanes: RPCs (a caller is waiting) on QUEUE_URL, fire-and-forget events
+# on EVENTS_QUEUE_URL. Each lane long-polls on its own; events never hold more
+# than EVENTS_MAX_IN_FLIGHT handler slots, RPCs get MAX_IN_FLIGHT of their own
+EVENTS_MAX_IN_FLIGHT = 5
+
+
+def build_event_handlers(repository: StatisticsRepository) -> Dict[str, Callable]:
     handlers = EventHandlers(repository=repository)
     
-    EVENT_HANDLERS = {
+    return {
         "TOTAL_USERS_RPC": handlers.total_users_rpc,
         "TOTAL_UPDATES_RPC": handlers.total_updates_rpc,
         "REGISTERED_LAST_24_RPC": handlers.registered_last_24_rpc,
+        "STATISTICS_SUMMARY_RPC": handlers.statistics_summary_rpc,
+        "STATISTICS_SNAPSHOT_RPC": handlers.statistics_snapshot_rpc,
         "USER_REGISTERED_EVENT": handlers.user_registered_event,
         "USER_UPDATED_EVENT": handlers.user_updated_event,
     }
-    
+
+
+def build_consumer(sqs_client: Any = None) -> Consumer:
+    # sqs_client lets the in-process broker (core.local_broker) stand in for LocalStack
     consumer = Consumer(
         queue_url=QUEUE_URL,
-        response_queue_url=RESPONSE_QUEUE_URL
+        response_queue_url=RESPONSE_QUEUE_URL,
+        execution_mode=EXECUTION_MODE,
+        max_in_flight=MAX_IN_FLIGHT,
+        sqs_client=sqs_client
     )
+    consumer.add_lane("event", EVENTS_QUEUE_URL, max_in_flight=EVENTS_MAX_IN_FLIGHT)
+    return consumer
+
+
+def main():
+    logger.info("[StatisticsAPI] Starting consumer...")
+    
+    repository = StatisticsRepository()
+    replayed = repository.enable_persistence(DATA_DIR, fsync=FSYNC_POLICY, snapshot_every=SNAPSHOT_EVERY)
+    logger.info(f"[StatisticsAPI] State recovered - replayed WAL records: {replayed}")
+    
+    EVENT_HANDLERS = build_event_handlers(repository)
+    consumer = build_consumer()
+    
+    # Only the event types in the handler table are delivered, RPCs and events
+    # to their own lane
+    apply_lane_policies(TOPIC_ARN, QUEUE_URL, EVENTS_QUEUE_URL, EVENT_HANDLERS)
     
     running = True
     
@@ -50,6 +90,10 @@ def main():
         except Exception as ex:
             logger.error(f"[StatisticsAPI] Error in consumer loop: {str(ex)}")
     
+    consumer.close()
+    repository.close_persistence()
+    if consumer.expired:
+        logger.info(f"[StatisticsAPI] Expired RPCs dropped: {consumer.expired}")
     logger.info("[StatisticsAPI] Consumer stopped.")
 
 
@@ -1,7 +1,111 @@
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from zoneinfo import ZoneInfo
+from typing import Dict, Any, Optional, Set, Tuple
 from loguru import logger
-from typing import List
+from array import array
+import struct, threading
+
+from core.persistence import DurableStore
+from apis.statistics.timeseries import RegistrationTimeline
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+# WAL operations, registrations carry their epoch-microsecond timestamp and
+# both carry the event's users_epoch and sequence number (0 when it had none)
+OP_USER_REGISTERED = 1
+OP_USER_UPDATED = 2
+REGISTERED_RECORD = struct.Struct("<qqQ")
+UPDATED_RECORD = struct.Struct("<qQ")
+# Records written before events carried a users_epoch, and before they were sequenced
+UNSCOPED_REGISTERED_RECORD = struct.Struct("<qQ")
+UNSCOPED_UPDATED_RECORD = struct.Struct("<Q")
+LEGACY_REGISTERED_RECORD = struct.Struct("<q")
+
+# Snapshot body header: total users, total updates
+SNAPSHOT_COUNTS = struct.Struct("<QQ")
+
+# Snapshot trailer: per event type the number of users epochs, then per epoch
+# its id and sequence (applied through, numbers applied above it)
+EPOCH_COUNT = struct.Struct("<I")
+EPOCH_ID = struct.Struct("<q")
+SEQUENCE_HEADER = struct.Struct("<QI")
+
+class AppliedSequence:
+    # Which numbers of a gap-free event sequence (user ids for registrations,
+    # update_seq for updates) have been applied: all up to `through` plus the
+    # ones above it that arrived early. A number that never arrives, e.g. an
+    # event the gateway failed to publish, is given up once MAX_AHEAD later
+    # numbers have been applied; if it shows up after that it is skipped.
+    MAX_AHEAD = 1000
+
+    def __init__(self):
+        self.through = 0
+        self.ahead: Set[int] = set()
+
+    def __contains__(self, seq: int) -> bool:
+        return seq <= self.through or seq in self.ahead
+
+    def add(self, seq: int) -> None:
+        self.ahead.add(seq)
+        if len(self.ahead) > self.MAX_AHEAD:
+            self.through = min(self.ahead) - 1
+        while self.through + 1 in self.ahead:
+            self.through += 1
+            self.ahead.discard(self.through)
+
+    def dump(self) -> bytes:
+        ahead = array("Q", sorted(self.ahead))
+        return SEQUENCE_HEADER.pack(self.through, len(ahead)) + ahead.tobytes()
+
+    def load(self, view: memoryview, offset: int) -> int:
+        # Returns the offset right after this sequence
+        self.through, count = SEQUENCE_HEADER.unpack_from(view, offset)
+        offset += SEQUENCE_HEADER.size
+        ahead = array("Q")
+        ahead.frombytes(view[offset:offset + count * ahead.itemsize])
+        self.ahead = set(ahead)
+        return offset + count * ahead.itemsize
+
+class EpochSequences:
+    # One AppliedSequence per users_epoch: user ids and update_seq restart at 1
+    # whenever the users store starts out empty, and every store has its own.
+    # Only the MAX_EPOCHS most recently used epochs are kept
+    MAX_EPOCHS = 16
+
+    def __init__(self):
+        self.epochs: Dict[int, AppliedSequence] = {}
+
+    def __contains__(self, key: Tuple[int, int]) -> bool:
+        epoch, seq = key
+        sequence = self.epochs.get(epoch)
+        return sequence is not None and seq in sequence
+
+    def add(self, epoch: int, seq: int) -> None:
+        sequence = self.epochs.pop(epoch, None) or AppliedSequence()
+        sequence.add(seq)
+        self.epochs[epoch] = sequence
+        while len(self.epochs) > self.MAX_EPOCHS:
+            del self.epochs[next(iter(self.epochs))]
+
+    def dump(self) -> bytes:
+        parts = [EPOCH_COUNT.pack(len(self.epochs))]
+        for epoch, sequence in self.epochs.items():
+            parts.append(EPOCH_ID.pack(epoch))
+            parts.append(sequence.dump())
+        return b"".join(parts)
+
+    def load(self, view: memoryview, offset: int) -> int:
+        # Returns the offset right after these sequences
+        (count,) = EPOCH_COUNT.unpack_from(view, offset)
+        offset += EPOCH_COUNT.size
+        self.epochs = {}
+        for _ in range(count):
+            (epoch,) = EPOCH_ID.unpack_from(view, offset)
+            sequence = AppliedSequence()
+            offset = sequence.load(view, offset + EPOCH_ID.size)
+            self.epochs[epoch] = sequence
+        return offset
 
 class StatisticsRepository:
     _instance = None
@@ -9,11 +113,25 @@ class StatisticsRepository:
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(StatisticsRepository, cls).__new__(cls)
-            cls._instance._total_users = 0
-            cls._instance._total_updates = 0
-            cls._instance._user_registration_timeline = []
+            cls._instance._init_state()
         return cls._instance
 
+    @classmethod
+    def detached(cls) -> "StatisticsRepository":
+        # An instance outside the singleton, e.g. the gateway's read model
+        instance = super(StatisticsRepository, cls).__new__(cls)
+        instance._init_state()
+        return instance
+
+    def _init_state(self) -> None:
+        self._total_users = 0
+        self._total_updates = 0
+        self._user_registration_timeline = RegistrationTimeline()
+        self._registered = EpochSequences()
+        self._updated = EpochSequences()
+        self._lock = threading.Lock()
+        self._store = None
+
     @staticmethod
     def get_argentina_time() -> datetime:
         return datetime.now(ZoneInfo("America/Argentina/Buenos_Aires"))
@@ -24,17 +142,130 @@ class StatisticsRepository:
     def get_total_updates(self) -> int:
         return self._total_updates
 
-    def increment_total_users(self) -> None:
-        self._total_users += 1
-        self._user_registration_timeline.append(self.get_argentina_time())
+    def increment_total_users(self, seq: Optional[int] = None, epoch: int = 0) -> bool:
+        # seq is the registered user's id within its users_epoch; an already applied
+        # one is a redelivery (or part of the snapshot a read model was seeded with)
+        # and is skipped
+        with self._lock:
+            if seq is not None and (epoch, seq) in self._registered:
+                return False
+            now = self.get_argentina_time()
+            self._register(now, seq, epoch)
+            self._log(OP_USER_REGISTERED, REGISTERED_RECORD.pack((now - EPOCH) // MICROSECOND, epoch, seq or 0))
         logger.info(f"Total users incremented to {self._total_users}")
+        return True
 
-    def increment_total_updates(self) -> None:
-        self._total_updates += 1
+    def increment_total_updates(self, seq: Optional[int] = None, epoch: int = 0) -> bool:
+        # seq is the update_seq the users service gave the update
+        with self._lock:
+            if seq is not None and (epoch, seq) in self._updated:
+                return False
+            self._record_update(seq, epoch)
+            self._log(OP_USER_UPDATED, UPDATED_RECORD.pack(epoch, seq or 0))
         logger.info(f"Total updates incremented to {self._total_updates}")
+        return True
+
+    def get_registered_in_window(self, window: timedelta) -> int:
+        with self._lock:
+            return self._user_registration_timeline.count_since(window, self.get_argentina_time())
 
     def get_registered_last_24h(self) -> int:
-        now = self.get_argentina_time()
-        cutoff = now - timedelta(hours=24)
-        count = sum(1 for timestamp in self._user_registration_timeline if timestamp > cutoff)
-        return count
+        return self.get_registered_in_window(timedelta(hours=24))
+
+    def get_summary(self, windows: Dict[str, timedelta]) -> Dict[str, Any]:
+        # Every value comes from the same locked view of the counters
+        with self._lock:
+            now = self.get_argentina_time()
+            return {
+                "total_users": self._total_users,
+                "total_updates": self._total_updates,
+                "registered": {
+                    label: self._user_registration_timeline.count_since(window, now)
+                    for label, window in windows.items()
+                },
+            }
+
+    def enable_persistence(self, directory: str, fsync: str = "group", snapshot_every: int = 10000) -> int:
+        # Loads the newest snapshot, replays the WAL tail and logs every later write
+        with self._lock:
+            self._total_users = 0
+            self._total_updates = 0
+            self._user_registration_timeline = RegistrationTimeline()
+            self._registered = EpochSequences()
+            self._updated = EpochSequences()
+            store = DurableStore(directory, "statistics", fsync=fsync, snapshot_every=snapshot_every)
+            replayed = store.recover(self._load_snapshot, self._apply_record)
+            self._store = store
+        return replayed
+
+    def export_snapshot(self) -> bytes:
+        # Same body as a persistence snapshot, used to seed read models elsewhere;
+        # it carries the applied event sequences, so the read model skips events
+        # that are already counted in it
+        with self._lock:
+            return self._snapshot_bytes()
+
+    def import_snapshot(self, body: bytes) -> None:
+        with self._lock:
+            self._load_snapshot(memoryview(body))
+
+    def close_persistence(self) -> None:
+        with self._lock:
+            store, self._store = self._store, None
+        if store is not None:
+            store.close()
+
+    def _register(self, moment: datetime, seq: Optional[int] = None, epoch: int = 0) -> None:
+        self._total_users += 1
+        self._user_registration_timeline.record(moment)
+        if seq:
+            self._registered.add(epoch, seq)
+
+    def _record_update(self, seq: Optional[int], epoch: int = 0) -> None:
+        self._total_updates += 1
+        if seq:
+            self._updated.add(epoch, seq)
+
+    def _log(self, op: int, payload: bytes) -> None:
+        if self._store is None:
+            return
+        self._store.append(op, payload)
+        if self._store.should_snapshot():
+            self._store.snapshot(self._snapshot_bytes())
+
+    def _apply_record(self, op: int, payload: bytes) -> None:
+        if op == OP_USER_REGISTERED and len(payload) == LEGACY_REGISTERED_RECORD.size:
+            (micros,) = LEGACY_REGISTERED_RECORD.unpack(payload)
+            self._register(EPOCH + timedelta(microseconds=micros))
+        elif op == OP_USER_REGISTERED and len(payload) == UNSCOPED_REGISTERED_RECORD.size:
+            micros, seq = UNSCOPED_REGISTERED_RECORD.unpack(payload)
+            self._register(EPOCH + timedelta(microseconds=micros), seq)
+        elif op == OP_USER_REGISTERED:
+            micros, epoch, seq = REGISTERED_RECORD.unpack(payload)
+            self._register(EPOCH + timedelta(microseconds=micros), seq, epoch)
+        elif op == OP_USER_UPDATED and len(payload) == UNSCOPED_UPDATED_RECORD.size:
+            self._record_update(UNSCOPED_UPDATED_RECORD.unpack(payload)[0])
+        elif op == OP_USER_UPDATED:
+            epoch, seq = UPDATED_RECORD.unpack(payload) if payload else (0, None)
+            self._record_update(seq, epoch)
+        else:
+            raise ValueError(f"Unknown statistics WAL operation: {op}")
+
+    def _snapshot_bytes(self) -> bytes:
+        return b"".join([
+            SNAPSHOT_COUNTS.pack(self._total_users, self._total_updates),
+            self._user_registration_timeline.dump(),
+            self._registered.dump(),
+            self._updated.dump(),
+        ])
+
+    def _load_snapshot(self, view: memoryview) -> None:
+        self._total_users, self._total_updates = SNAPSHOT_COUNTS.unpack_from(view, 0)
+        self._user_registration_timeline = RegistrationTimeline()
+        offset = SNAPSHOT_COUNTS.size + self._user_registration_timeline.load(view[SNAPSHOT_COUNTS.size:])
+        self._registered = EpochSequences()
+        self._updated = EpochSequences()
+        # Snapshots written before events were sequenced end with the timeline
+        if offset < len(view):
+            offset = self._registered.load(view, offset)
+            self._updated.load(view, offset)
@@ -1,25 +1,53 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import JSONResponse
+from typing import Dict, Any, Callable, Optional
 from loguru import logger
-import sys
+import settings, sys
 
 sys.path.append("../../")
-from core.publisher import default_publisher_service
+from core.publisher import default_async_publisher_service
+from core.rpc_cache import RPCCache
+from apis.errors import raise_if_unavailable
 
 router = APIRouter(prefix="/statistics", tags=["statistics"])
 
-from apis.statistics.schemas import TotalUsersResponse, TotalUpdatesResponse, TimelineResponse
+from apis.statistics.schemas import TotalUsersResponse, TotalUpdatesResponse, TimelineResponse, SummaryResponse
+from apis.statistics.timeseries import DEFAULT_RETENTION, parse_window
+from apis.statistics.repository import StatisticsRepository
+from apis.statistics.view import get_statistics_view
 
-publisher = default_publisher_service()
+publisher = default_async_publisher_service()
+
+MAX_SUMMARY_WINDOWS = 10
+
+# Identical concurrent calls share one RPC; results live settings.statistics_cache_ttl seconds
+statistics_cache = RPCCache(ttl=settings.statistics_cache_ttl)
+statistics_cache.invalidate_on("USER_REGISTERED_EVENT", "TOTAL_USERS_RPC", "REGISTERED_LAST_24_RPC", "STATISTICS_SUMMARY_RPC")
+statistics_cache.invalidate_on("USER_UPDATED_EVENT", "TOTAL_UPDATES_RPC", "STATISTICS_SUMMARY_RPC")
+publisher.add_publish_listener(statistics_cache.on_publish)
+
+def _from_view(build: Callable[[StatisticsRepository], Dict[str, Any]]) -> Optional[JSONResponse]:
+    # Answered from the gateway read model when enabled and fresh enough, else None
+    view = get_statistics_view()
+    if view is None or not view.is_fresh():
+        return None
+    
+    return JSONResponse(build(view.repository), headers={
+        "X-Statistics-Source": "view",
+        "X-Statistics-Staleness": f"{view.staleness():.3f}"
+    })
 
 @router.get("/total-users", response_model=TotalUsersResponse)
-def get_total_users():
+async def get_total_users():
     try:
-        response = publisher.call_rpc(
-            event_type="TOTAL_USERS_RPC",
-            payload={}
-        )
+        served = _from_view(lambda repo: {"total_users": repo.get_total_users()})
+        if served is not None:
+            return served
+        
+        response = await statistics_cache.call_rpc(publisher, "TOTAL_USERS_RPC", {})
 
         if not response.get("success"):
+            raise_if_unavailable(response)
             raise HTTPException(status_code=500, detail=response.get("error", "Error getting total users"))
         
         return response.get("data", {})
@@ -30,14 +58,16 @@ def get_total_users():
         raise HTTPException(status_code=500, detail=str(e))
     
 @router.get("/total-updates", response_model=TotalUpdatesResponse)
-def get_total_updates():
+async def get_total_updates():
     try:
-        response = publisher.call_rpc(
-            event_type="TOTAL_UPDATES_RPC",
-            payload={}
-        )
+        served = _from_view(lambda repo: {"total_updates": repo.get_total_updates()})
+        if served is not None:
+            return served
+        
+        response = await statistics_cache.call_rpc(publisher, "TOTAL_UPDATES_RPC", {})
 
         if not response.get("success"):
+            raise_if_unavailable(response)
             raise HTTPException(status_code=500, detail=response.get("error", "Error getting total updates"))
         
         return response.get("data", {})
@@ -48,13 +78,15 @@ def get_total_updates():
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/registered-last-24h", response_model=TimelineResponse)
-def get_registered_last_24h():
+async def get_registered_last_24h():
     try:
-        response = publisher.call_rpc(
-            event_type="REGISTERED_LAST_24_RPC",
-            payload={}
-        )
+        served = _from_view(lambda repo: {"registered_last_24h": repo.get_registered_last_24h()})
+        if served is not None:
+            return served
+        
+        response = await statistics_cache.call_rpc(publisher, "REGISTERED_LAST_24_RPC", {})
         if not response.get("success"):
+            raise_if_unavailable(response)
             raise HTTPException(status_code=500, detail=response.get("error", "Error getting registered users"))
         
         return response.get("data", {})
@@ -63,3 +95,39 @@ def get_registered_last_24h():
     except Exception as e:
         logger.error(f"Error getting registered users in last 24h: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/summary", response_model=SummaryResponse)
+async def get_summary(windows: str = "24h"):
+    # One RPC for every counter, e.g. /statistics/summary?windows=1h,24h,7d
+    labels = list(dict.fromkeys(label.strip() for label in windows.split(",") if label.strip()))
+    try:
+        if not labels or len(labels) > MAX_SUMMARY_WINDOWS:
+            raise ValueError(f"Between 1 and {MAX_SUMMARY_WINDOWS} windows are required")
+        for label in labels:
+            if parse_window(label) > DEFAULT_RETENTION:
+                raise ValueError(f"Window {label} exceeds retention of {DEFAULT_RETENTION.days} days")
+    except ValueError as ex:
+        raise HTTPException(status_code=400, detail=str(ex))
+    
+    try:
+        served = _from_view(lambda repo: repo.get_summary({label: parse_window(label) for label in labels}))
+        if served is not None:
+            return served
+        
+        response = await statistics_cache.call_rpc(publisher, "STATISTICS_SUMMARY_RPC", {"windows": labels})
+        
+        if not response.get("success"):
+            raise_if_unavailable(response)
+            raise HTTPException(status_code=500, detail=response.get("error", "Error getting statistics summary"))
+        
+        data = response.get("data") or {}
+        if "error" in data:
+            status_code = 400 if "validation" in str(data["error"]).lower() else 500
+            raise HTTPException(status_code=status_code, detail=data["error"])
+        
+        return data
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting statistics summary: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,4 +1,5 @@
 from pydantic import BaseModel
+from typing import Dict
 
 class TotalUsersResponse(BaseModel):
     total_users: int
@@ -8,3 +9,8 @@ class TotalUpdatesResponse(BaseModel):
 
 class TimelineResponse(BaseModel):
     registered_last_24h: int
+
+class SummaryResponse(BaseModel):
+    total_users: int
+    total_updates: int
+    registered: Dict[str, int]
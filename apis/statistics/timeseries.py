@@ -0,0 +1,109 @@
+from array import array
+from datetime import datetime, timedelta
+from typing import Optional
+import math, struct
+
+# resolution seconds, ring size, head bucket, first bucket, total
+TIMELINE_HEADER = struct.Struct("<dQqqQ")
+
+DEFAULT_RETENTION = timedelta(days=30)
+WINDOW_UNITS = {"m": "minutes", "h": "hours", "d": "days"}
+
+
+def parse_window(label: str) -> timedelta:
+    # "15m", "24h", "7d"
+    label = label.strip()
+    unit = WINDOW_UNITS.get(label[-1:])
+    if unit is None or not label[:-1].isdigit() or int(label[:-1]) <= 0:
+        raise ValueError(f"Invalid window {label!r}, expected a positive number followed by one of {''.join(WINDOW_UNITS)}")
+    return timedelta(**{unit: int(label[:-1])})
+
+
+class RegistrationTimeline:
+    # Ring of per-bucket cumulative counts: slot i holds how many events were
+    # recorded up to the end of its bucket, so any window is one subtraction.
+    # Not thread-safe, callers serialize access.
+
+    def __init__(self, resolution: timedelta = timedelta(minutes=1), retention: timedelta = DEFAULT_RETENTION):
+        if resolution.total_seconds() <= 0:
+            raise ValueError("Resolution must be positive")
+        if retention < resolution:
+            raise ValueError("Retention must be at least one bucket")
+        
+        self.resolution = resolution.total_seconds()
+        self.retention = retention
+        self.size = int(retention.total_seconds() // self.resolution) + 1
+        
+        self._cumulative = array("q", bytes(8 * self.size))
+        self._head: Optional[int] = None
+        self._start: Optional[int] = None
+        self._total = 0
+
+    @property
+    def total(self) -> int:
+        return self._total
+
+    def record(self, timestamp: datetime) -> None:
+        bucket = self._bucket(timestamp)
+        self._advance(bucket)
+        
+        # Late events also count in every newer bucket still in the ring
+        oldest = max(bucket, self._head - self.size + 1)
+        for index in range(oldest, self._head + 1):
+            self._cumulative[index % self.size] += 1
+        
+        self._start = min(self._start, bucket)
+        self._total += 1
+
+    def count_since(self, window: timedelta, now: datetime) -> int:
+        if window.total_seconds() <= 0:
+            raise ValueError("Window must be positive")
+        if window > self.retention:
+            raise ValueError(f"Window {window} exceeds retention of {self.retention}")
+        
+        current = self._bucket(now)
+        self._advance(current)
+        
+        boundary = current - math.ceil(window.total_seconds() / self.resolution)
+        if boundary < self._start:
+            return self._total
+        
+        return self._total - self._cumulative[boundary % self.size]
+
+    def _bucket(self, timestamp: datetime) -> int:
+        return int(timestamp.timestamp() // self.resolution)
+
+    def _advance(self, bucket: int) -> None:
+        if self._head is None:
+            self._head = self._start = bucket
+            return
+        
+        if bucket <= self._head:
+            return
+        
+        # Buckets without events carry the running total forward
+        first = max(self._head + 1, bucket - self.size + 1)
+        for index in range(first, bucket + 1):
+            self._cumulative[index % self.size] = self._total
+        
+        self._head = bucket
+
+    def dump(self) -> bytes:
+        head = -1 if self._head is None else self._head
+        start = -1 if self._start is None else self._start
+        return TIMELINE_HEADER.pack(self.resolution, self.size, head, start, self._total) + self._cumulative.tobytes()
+
+    def load(self, view: memoryview) -> int:
+        # Adopts the stored layout, returns the offset right after the timeline
+        resolution, size, head, start, total = TIMELINE_HEADER.unpack_from(view, 0)
+        end = TIMELINE_HEADER.size + size * self._cumulative.itemsize
+        
+        self.resolution = resolution
+        self.size = size
+        self.retention = timedelta(seconds=resolution * (size - 1))
+        self._cumulative = array("q")
+        self._cumulative.frombytes(view[TIMELINE_HEADER.size:end])
+        self._head = None if head == -1 else head
+        self._start = None if start == -1 else start
+        self._total = total
+        return end
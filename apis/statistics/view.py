@@ -0,0 +1,125 @@
+from typing import Any, Optional
+from loguru import logger
+import asyncio, base64, threading, time, zlib
+
+from core.consumer import Consumer
+from apis.statistics.repository import StatisticsRepository
+from apis.statistics.event_dispatcher import EventHandlers
+
+
+class StatisticsView:
+    # Gateway-side read model: a private queue subscribed to the topic folds
+    # USER_REGISTERED_EVENT / USER_UPDATED_EVENT into a detached
+    # StatisticsRepository, seeded once from the statistics service snapshot.
+    # The snapshot carries the event sequences it already counts, so events the
+    # queue delivers on either side of it are applied exactly once.
+
+    def __init__(self, queue_url: str, sqs_client: Any = None, max_staleness: float = 10.0):
+        self.queue_url = queue_url
+        self.max_staleness = max_staleness
+        self.SEED_RETRY = 5
+
+        self.repository = StatisticsRepository.detached()
+        handlers = EventHandlers(repository=self.repository)
+        self.event_handlers = {
+            "USER_REGISTERED_EVENT": handlers.user_registered_event,
+            "USER_UPDATED_EVENT": handlers.user_updated_event,
+        }
+
+        # Sync execution: when consume() returns, every received event is applied
+        self.consumer = Consumer(queue_url=queue_url, execution_mode="sync", sqs_client=sqs_client)
+        self.consumer.POLLING_TIME = 1
+
+        self._seeded = threading.Event()
+        self._synced_at: Optional[float] = None
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+
+
+    def start(self):
+        # Events wait in the queue until the snapshot is loaded; any backlog left
+        # from an earlier process is folded then, skipping what the snapshot
+        # already counts. The queue is not purged: on SQS a purge may also drop
+        # messages sent up to 60 s after it
+        self._running = True
+        self._thread = threading.Thread(target=self._consume, name="statistics-view", daemon=True)
+        self._thread.start()
+
+
+
+    async def seed(self, publisher: Any):
+        # Retries until the statistics service answers; routes use RPCs meanwhile
+        while not self._seeded.is_set():
+            response = await publisher.call_rpc(event_type="STATISTICS_SNAPSHOT_RPC", payload={})
+            snapshot = (response.get("data") or {}).get("snapshot") if response.get("success") else None
+
+            if snapshot:
+                self.load_snapshot(zlib.decompress(base64.b64decode(snapshot)))
+                logger.success(f"[StatisticsView] Seeded - total users: {self.repository.get_total_users()}")
+                return
+
+            logger.warning(f"[StatisticsView] Seeding failed, retrying in {self.SEED_RETRY}s: {response.get('error')}")
+            await asyncio.sleep(self.SEED_RETRY)
+
+
+
+    def load_snapshot(self, body: bytes):
+        self.repository.import_snapshot(body)
+        self._seeded.set()
+
+
+
+    def staleness(self) -> Optional[float]:
+        # Upper bound, in seconds, on how old the newest unapplied event can be;
+        # None until the view is seeded and has drained its queue once
+        if not self._seeded.is_set() or self._synced_at is None:
+            return None
+        return time.monotonic() - self._synced_at
+
+
+
+    def is_fresh(self) -> bool:
+        staleness = self.staleness()
+        return staleness is not None and staleness <= self.max_staleness
+
+
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=self.consumer.POLLING_TIME + 5)
+            self._thread = None
+        self.consumer.close()
+
+
+
+    def _consume(self):
+        while self._running:
+            if not self._seeded.wait(timeout=self.consumer.POLLING_TIME):
+                continue
+            received = self.consumer.consume(self.event_handlers)
+
+            # A receive that came back short means the queue was drained when it
+            # returned, so everything published before then has been applied
+            if received is not None and received < self.consumer.MAX_NUMBER_MESSAGES:
+                self._synced_at = time.monotonic()
+
+
+_statistics_view: Optional[StatisticsView] = None
+
+def get_statistics_view() -> Optional[StatisticsView]:
+    return _statistics_view
+
+def enable_statistics_view(queue_url: str, sqs_client: Any = None, max_staleness: float = 10.0) -> StatisticsView:
+    global _statistics_view
+    disable_statistics_view()
+    _statistics_view = StatisticsView(queue_url, sqs_client=sqs_client, max_staleness=max_staleness)
+    _statistics_view.start()
+    return _statistics_view
+
+def disable_statistics_view():
+    global _statistics_view
+    view, _statistics_view = _statistics_view, None
+    if view is not None:
+        view.stop()
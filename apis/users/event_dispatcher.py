@@ -1,13 +1,20 @@
 from loguru import logger
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterator, List
 from pydantic import ValidationError
 import sys
 
 sys.path.append("../../")
-from apis.users.schemas import UserCreate, UserUpdate, UserFilter
+from apis.users.schemas import UserCreate, UserBulkCreate, UserUpdate, UserBulkUpdate, UserFilter, MAX_PAGE_SIZE, MAX_PAGE_BYTES
 from apis.users.repository import UserRepository, UserNotFoundError, UserValidationError
 
+# UserFilter keys that shape the reply instead of filtering users
+QUERY_OPTIONS = {"limit", "cursor", "fields", "count_only"}
+
 class EventHandlers:
+    # Users per chunk message of LIST_USERS_STREAM_RPC; chunks of long users end
+    # sooner, at MAX_PAGE_BYTES
+    STREAM_CHUNK_SIZE = 500
+
     def __init__(self, repository: UserRepository):
         self.repo = repository
 
@@ -15,7 +22,8 @@ class EventHandlers:
         try:
             user_data = UserCreate(**payload)
             created_user = self.repo.create(user_data.model_dump())
-            return created_user
+            # USER_REGISTERED_EVENT consumers dedupe on the id within its users_epoch
+            return {**created_user, "users_epoch": self.repo.get_epoch()}
         except ValidationError as e:
             logger.error(f"[UsersAPI] Validation error: {str(e)}")
             return {"error": str(e)}
@@ -23,20 +31,92 @@ class EventHandlers:
             logger.error(f"[UsersAPI] Error in register_user_rpc: {str(e)}")
             return {"error": str(e)}
 
-    def list_users_rpc(self, payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def register_users_batch_rpc(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        # Per-item results in request order: {"index", "user"} or {"index", "error"}
+        try:
+            request = UserBulkCreate(**payload)
+        except ValidationError as e:
+            logger.error(f"[UsersAPI] Validation error: {str(e)}")
+            return {"error": f"Validation error: {str(e)}"}
+        
+        results: List[Dict[str, Any]] = [None] * len(request.users)
+        valid, positions = [], []
+        for index, item in enumerate(request.users):
+            try:
+                valid.append(UserCreate(**item).model_dump())
+                positions.append(index)
+            except (ValidationError, TypeError) as e:
+                results[index] = {"index": index, "error": f"Validation error: {str(e)}"}
+        
         try:
-            filters = UserFilter(**payload).model_dump(exclude_unset=True)
-            return self.repo.list_all(filters)
+            created = self.repo.create_many(valid)
         except Exception as e:
-            logger.error(f"[UsersAPI] Error listing users: {str(e)}")
-            return []
+            logger.error(f"[UsersAPI] Error in register_users_batch_rpc: {str(e)}")
+            return {"error": str(e)}
+        
+        epoch = self.repo.get_epoch()
+        for index, user in zip(positions, created):
+            results[index] = {"index": index, "user": {**user, "users_epoch": epoch}}
+        
+        return {"created": len(created), "failed": len(results) - len(created), "results": results}
+
+    def list_users_rpc(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            request = UserFilter(**payload)
+        except ValidationError as e:
+            logger.error(f"[UsersAPI] Validation error: {str(e)}")
+            return {"error": f"Validation error: {str(e)}"}
+        
+        filters = request.model_dump(exclude_unset=True, exclude=QUERY_OPTIONS)
+        
+        if request.count_only:
+            return {"count": self.repo.count(filters)}
+        
+        # Always paged: the reply is capped at MAX_PAGE_SIZE users (or fewer with a
+        # limit) and MAX_PAGE_BYTES so it still fits in one SQS message; the caller
+        # follows next_cursor
+        try:
+            return self.repo.list_page(
+                filters,
+                limit=request.limit or MAX_PAGE_SIZE,
+                cursor=request.cursor,
+                fields=request.fields,
+                max_bytes=MAX_PAGE_BYTES
+            )
+        except UserValidationError as e:
+            logger.error(f"[UsersAPI] {str(e)}")
+            return {"error": str(e)}
+
+    def list_users_stream_rpc(self, payload: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        # Each yielded page goes out as its own chunk message; every page takes
+        # the repository lock on its own, so users updated mid-stream may show
+        # either version
+        request = UserFilter(**payload)
+        filters = request.model_dump(exclude_unset=True, exclude=QUERY_OPTIONS)
+        cursor = request.cursor
+        
+        while True:
+            page = self.repo.list_page(
+                filters,
+                limit=self.STREAM_CHUNK_SIZE,
+                cursor=cursor,
+                fields=request.fields,
+                max_bytes=MAX_PAGE_BYTES
+            )
+            yield {"users": page["users"]}
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return
 
     def update_user_rpc(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         try:
             update_request = UserUpdate(**payload)
             update_data = update_request.model_dump(exclude_unset=True, exclude={"id"})
             
-            updated_user = self.repo.update(update_request.id, update_data)
+            # A one-patch update_many, so the reply carries the update_seq too
+            [updated_user] = self.repo.update_many([{"id": update_request.id, **update_data}])
+            if updated_user is None:
+                raise UserNotFoundError(f"User with id {update_request.id} not found")
             return updated_user
         except ValidationError as e:
              logger.error(f"[UsersAPI] Validation error: {str(e)}")
@@ -48,5 +128,38 @@ class EventHandlers:
             logger.error(f"[UsersAPI] Error updating user: {str(e)}")
             return {"error": str(e)}
 
+    def update_users_batch_rpc(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        # Per-item results in request order: {"index", "user"} or {"index", "error"}
+        try:
+            request = UserBulkUpdate(**payload)
+        except ValidationError as e:
+            logger.error(f"[UsersAPI] Validation error: {str(e)}")
+            return {"error": f"Validation error: {str(e)}"}
+        
+        results: List[Dict[str, Any]] = [None] * len(request.users)
+        patches, positions = [], []
+        for index, item in enumerate(request.users):
+            try:
+                update_request = UserUpdate(**item)
+                patches.append({"id": update_request.id, **update_request.model_dump(exclude_unset=True, exclude={"id"})})
+                positions.append(index)
+            except (ValidationError, TypeError) as e:
+                results[index] = {"index": index, "error": f"Validation error: {str(e)}"}
+        
+        try:
+            updated = self.repo.update_many(patches)
+        except Exception as e:
+            logger.error(f"[UsersAPI] Error in update_users_batch_rpc: {str(e)}")
+            return {"error": str(e)}
+        
+        for index, patch, user in zip(positions, patches, updated):
+            if user is None:
+                results[index] = {"index": index, "error": f"User with id {patch['id']} not found"}
+            else:
+                results[index] = {"index": index, "user": user}
+        
+        succeeded = sum("user" in result for result in results)
+        return {"updated": succeeded, "failed": len(results) - succeeded, "results": results}
+
     def send_email(self, payload: Dict[str, Any]) -> None:
         logger.info(f"[UsersAPI] Sending email to {payload.get('name')} {payload.get('surname')}")
\ No newline at end of file
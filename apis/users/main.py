@@ -1,34 +1,88 @@
 import sys
 import signal
+from typing import Dict, Any, Callable, List, Tuple
 sys.path.append("../../")
 
 from loguru import logger
 from core.consumer import Consumer
+from core.publisher import TOPIC_ARN
+from core.routing import apply_lane_policies
 from apis.users.repository import UserRepository
 from apis.users.event_dispatcher import EventHandlers
 
 # Queue URLs
 QUEUE_URL = "http://localhost:4566/000000000000/users-queue"
+EVENTS_QUEUE_URL = "http://localhost:4566/000000000000/users-events-queue"
 RESPONSE_QUEUE_URL = "http://localhost:4566/000000000000/beeneu-response-queue"
 
+# Durability: WAL plus periodic snapshots, fsync "always", "group" or "off"
+DATA_DIR = "../../data/users"
+FSYNC_POLICY = "group"
+SNAPSHOT_EVERY = 10000
 
-def main():
-    logger.info("[UsersAPI] Starting consumer...")
-    
-    repository = UserRepository()
+# Handler execution: "sync", "thread", "process" or "asyncio"
+EXECUTION_MODE = "thread"
+MAX_IN_FLIGHT = 20
+
+# Priority lanes: RPCs (a caller is waiting) on QUEUE_URL, fire-and-forget events
+# on EVENTS_QUEUE_URL. Each lane long-polls on its own; events never hold more
+# than EVENTS_MAX_IN_FLIGHT handler slots, RPCs get MAX_IN_FLIGHT of their own
+EVENTS_MAX_IN_FLIGHT = 5
+
+# Messages sharing a key run one after another, in arrival order. A batch
+# (micro-batched updates included) takes the key of every user it touches, so
+# it waits only for earlier updates of those users
+def batch_update_keys(payload: Dict[str, Any]) -> List[Tuple[str, Any]]:
+    return [("user", item.get("id")) for item in payload.get("users") or [] if isinstance(item, dict)]
+
+
+ORDERING_KEYS = {
+    "UPDATE_USER_RPC": lambda payload: ("user", payload.get("id")),
+    "UPDATE_USERS_BATCH_RPC": batch_update_keys,
+}
+
+
+def build_event_handlers(repository: UserRepository) -> Dict[str, Callable]:
     handlers = EventHandlers(repository=repository)
     
-    EVENT_HANDLERS = {
+    return {
         "REGISTER_USER_RPC": handlers.register_user_rpc,
+        "REGISTER_USERS_BATCH_RPC": handlers.register_users_batch_rpc,
         "LIST_USERS_RPC": handlers.list_users_rpc,
+        "LIST_USERS_STREAM_RPC": handlers.list_users_stream_rpc,
         "UPDATE_USER_RPC": handlers.update_user_rpc,
+        "UPDATE_USERS_BATCH_RPC": handlers.update_users_batch_rpc,
         "SEND_EMAIL": handlers.send_email,
     }
-    
+
+
+def build_consumer(sqs_client: Any = None) -> Consumer:
+    # sqs_client lets the in-process broker (core.local_broker) stand in for LocalStack
     consumer = Consumer(
         queue_url=QUEUE_URL,
-        response_queue_url=RESPONSE_QUEUE_URL
+        response_queue_url=RESPONSE_QUEUE_URL,
+        execution_mode=EXECUTION_MODE,
+        max_in_flight=MAX_IN_FLIGHT,
+        ordering_keys=ORDERING_KEYS,
+        sqs_client=sqs_client
     )
+    consumer.add_lane("event", EVENTS_QUEUE_URL, max_in_flight=EVENTS_MAX_IN_FLIGHT)
+    return consumer
+
+
+def main():
+    logger.info("[UsersAPI] Starting consumer...")
+    
+    repository = UserRepository()
+    replayed = repository.enable_persistence(DATA_DIR, fsync=FSYNC_POLICY, snapshot_every=SNAPSHOT_EVERY)
+    logger.info(f"[UsersAPI] State recovered - replayed WAL records: {replayed}")
+    
+    EVENT_HANDLERS = build_event_handlers(repository)
+    consumer = build_consumer()
+    
+    # Only the event types in the handler table are delivered, RPCs and events
+    # to their own lane
+    apply_lane_policies(TOPIC_ARN, QUEUE_URL, EVENTS_QUEUE_URL, EVENT_HANDLERS)
     
     running = True
     
@@ -48,6 +102,10 @@ def main():
         except Exception as ex:
             logger.error(f"[UsersAPI] Error in consumer loop: {str(ex)}")
     
+    consumer.close()
+    repository.close_persistence()
+    if consumer.expired:
+        logger.info(f"[UsersAPI] Expired RPCs dropped: {consumer.expired}")
     logger.info("[UsersAPI] Consumer stopped.")
 
 
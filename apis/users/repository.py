@@ -1,7 +1,22 @@
-from typing import List, Optional, Dict, Any
-from datetime import datetime
+from typing import List, Optional, Dict, Any, Callable, Iterable
+from datetime import datetime, timedelta, timezone
 from zoneinfo import ZoneInfo
 from loguru import logger
+from array import array
+import base64, bisect, json, struct, threading
+
+from core.persistence import DurableStore, pack_blobs, unpack_blobs, unpack_array
+
+ARGENTINA_TZ = ZoneInfo("America/Argentina/Buenos_Aires")
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+# WAL operations
+OP_CREATE = 1
+OP_UPDATE = 2
+
+# Snapshot body header: rows, updates count
+SNAPSHOT_COUNTS = struct.Struct("<QQ")
 
 class UserNotFoundError(Exception):
     pass
@@ -9,56 +24,485 @@ class UserNotFoundError(Exception):
 class UserValidationError(Exception):
     pass
 
+def encode_cursor(user_id: int) -> str:
+    # Opaque to clients; ids never change or get reused, so a cursor stays valid
+    return base64.urlsafe_b64encode(f"after:{user_id}".encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        prefix, _, user_id = raw.partition(":")
+        if prefix != "after" or not user_id.isdigit():
+            raise ValueError(raw)
+        return int(user_id)
+    except ValueError:
+        raise UserValidationError(f"Validation error: invalid cursor {cursor!r}")
+
+class StringTable:
+    # Interns repeated values (names, surnames) into small integer codes
+
+    def __init__(self):
+        self.codes: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def encode(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.codes[value] = code
+            self.values.append(value)
+        return code
+
+    def clear(self) -> None:
+        self.codes.clear()
+        self.values.clear()
+
 class UserRepository:
     _instance = None
 
+    FIELDS = ("name", "surname", "dni", "address")
+    # Low-cardinality fields stored as codes into the string table
+    INTERNED_FIELDS = ("name", "surname")
+    INDEXED_FIELDS = ("dni", "name", "surname")
+
+    # Users live in columns: row = id - 1, timestamps are epoch microseconds,
+    # names/surnames are string table codes and dni/address are UTF-8 bytes.
+    # Dicts are only built when a user leaves the repository.
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(UserRepository, cls).__new__(cls)
-            cls._instance.users = []
             cls._instance._updates_count = 0 
+            cls._instance._lock = threading.RLock()
+            cls._instance._strings = StringTable()
+            cls._instance._columns = cls._empty_columns()
+            # code -> rows; updates leave stale rows behind that are checked on read
+            cls._instance._postings = {field: [] for field in cls.INTERNED_FIELDS}
+            cls._instance._stale = {field: [] for field in cls.INTERNED_FIELDS}
+            # dni bytes -> row, or list of rows when the dni is shared
+            cls._instance._dni_index = {}
+            cls._instance._store = None
         return cls._instance
 
+    @staticmethod
+    def _empty_columns() -> Dict[str, Any]:
+        return {
+            "name": array("I"),
+            "surname": array("I"),
+            "dni": [],
+            "address": [],
+            "created_at": array("q"),
+            "updated_at": array("q"),
+        }
+
     @staticmethod
     def get_argentina_time() -> datetime:
-        return datetime.now(ZoneInfo("America/Argentina/Buenos_Aires"))
+        return datetime.now(ARGENTINA_TZ)
+
+    @staticmethod
+    def _to_micros(moment: datetime) -> int:
+        return (moment - EPOCH) // MICROSECOND
+
+    @staticmethod
+    def _from_micros(micros: int) -> str:
+        return (EPOCH + timedelta(microseconds=micros)).astimezone(ARGENTINA_TZ).isoformat()
+
+    @property
+    def users(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [self._materialize(row) for row in range(self._row_count())]
 
     def create(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
-        user_id = len(self.users) + 1
-        now = self.get_argentina_time().isoformat()
-        
-        user = {
-            "id": user_id,
-            **user_data,
-            "created_at": now,
-            "updated_at": now,
-        }
-        self.users.append(user)
+        self._validate_fields(user_data)
+        
+        with self._lock:
+            now = self._to_micros(self.get_argentina_time())
+            row = self._append_row(user_data, now, now)
+            user = self._materialize(row)
+            self._log(OP_CREATE, {**{field: user[field] for field in self.FIELDS}, "created_at": now, "updated_at": now})
         logger.info(f"User created: {user}")
         return user
 
-    def list_all(self, filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def create_many(self, users_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # One lock acquisition and one timestamp for the whole batch; ids are consecutive
+        for user_data in users_data:
+            self._validate_fields(user_data)
+        
+        with self._lock:
+            now = self._to_micros(self.get_argentina_time())
+            users = []
+            for user_data in users_data:
+                user = self._materialize(self._append_row(user_data, now, now))
+                self._log(OP_CREATE, {**{field: user[field] for field in self.FIELDS}, "created_at": now, "updated_at": now})
+                users.append(user)
+        logger.info(f"Users created: {len(users)}")
+        return users
+
+    def get_by_id(self, user_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._row_of(user_id)
+            return None if row is None else self._materialize(row)
+
+    def find_by_dni(self, dni: str) -> List[Dict[str, Any]]:
+        return self.list_all({"dni": dni})
+
+    def list_all(self, filters: Dict[str, Any], fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
         active_filters = {k: v for k, v in filters.items() if v is not None}
         
-        result = [
-            u for u in self.users
-            if all(str(u.get(k)) == str(v) for k, v in active_filters.items())
-        ]
-        return result
+        with self._lock:
+            if not active_filters:
+                rows = range(self._row_count())
+            else:
+                rows = self._matching_rows(active_filters)
+            project = self._projector(fields)
+            return [project(row) for row in rows]
 
-    def update(self, user_id: int, updates: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        user = next((u for u in self.users if u["id"] == user_id), None)
-        if not user:
-            raise UserNotFoundError(f"User with id {user_id} not found")
+    def count(self, filters: Dict[str, Any]) -> int:
+        active_filters = {k: v for k, v in filters.items() if v is not None}
+        
+        with self._lock:
+            if not active_filters:
+                return self._row_count()
+            return len(self._matching_rows(active_filters))
+
+    def list_page(
+        self,
+        filters: Dict[str, Any],
+        limit: int,
+        cursor: Optional[str] = None,
+        fields: Optional[List[str]] = None,
+        max_bytes: Optional[int] = None
+    ) -> Dict[str, Any]:
+        # Users in id order after the cursor, plus the cursor of the next page (None at the end).
+        # With max_bytes the page also ends before the users outgrow it as JSON (but holds at least one)
+        if limit < 1:
+            raise UserValidationError("Validation error: limit must be positive")
+        start = decode_cursor(cursor) if cursor else 0
+        active_filters = {k: v for k, v in filters.items() if v is not None}
+        
+        with self._lock:
+            if not active_filters:
+                rows = range(start, min(start + limit + 1, self._row_count()))
+            else:
+                matching = self._matching_rows(active_filters)
+                first = bisect.bisect_left(matching, start)
+                rows = matching[first:first + limit + 1]
+            
+            project = self._projector(fields)
+            users, size = [], 0
+            for row in rows[:limit]:
+                user = project(row)
+                if max_bytes is not None:
+                    size += len(json.dumps(user)) + 1
+                    if users and size > max_bytes:
+                        break
+                users.append(user)
+        
+        # Cursors hold the user id (row + 1) even when the projection leaves it out
+        next_cursor = encode_cursor(rows[len(users) - 1] + 1) if len(rows) > len(users) else None
+        return {"users": users, "next_cursor": next_cursor}
 
-        for key, value in updates.items():
-            if value is not None:
-                user[key] = value
+    def update(self, user_id: int, updates: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        self._validate_fields(updates)
+        
+        with self._lock:
+            row = self._row_of(user_id)
+            if row is None:
+                raise UserNotFoundError(f"User with id {user_id} not found")
 
-        user["updated_at"] = self.get_argentina_time().isoformat()
-        self._updates_count += 1
+            changes = {key: str(value) for key, value in updates.items() if value is not None and key in self.FIELDS}
+            updated_at = self._to_micros(self.get_argentina_time())
+            self._apply_update(row, changes, updated_at)
+            user = self._materialize(row)
+            self._log(OP_UPDATE, {"id": user_id, "fields": changes, "updated_at": updated_at})
         logger.info(f"User updated: {user}")
         return user
     
+    def update_many(self, patches: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        # Patches carry "id" plus the changed fields and apply in order under one
+        # lock acquisition; missing ids come back as None instead of raising.
+        # Each updated user also carries the update's update_seq: the gap-free
+        # number of updates applied so far, which USER_UPDATED_EVENT consumers
+        # dedupe on, and the users_epoch it belongs to
+        for patch in patches:
+            self._validate_fields(patch)
+        
+        results: List[Optional[Dict[str, Any]]] = []
+        with self._lock:
+            updated_at = self._to_micros(self.get_argentina_time())
+            for patch in patches:
+                row = self._row_of(patch.get("id"))
+                if row is None:
+                    results.append(None)
+                    continue
+                
+                changes = {key: str(value) for key, value in patch.items() if value is not None and key in self.FIELDS}
+                self._apply_update(row, changes, updated_at)
+                self._log(OP_UPDATE, {"id": row + 1, "fields": changes, "updated_at": updated_at})
+                results.append({**self._materialize(row), "update_seq": self._updates_count, "users_epoch": self._epoch()})
+        logger.info(f"Users updated: {sum(user is not None for user in results)}")
+        return results
+    
     def get_updates_count(self) -> int:
         return self._updates_count
+
+    def get_epoch(self) -> int:
+        with self._lock:
+            return self._epoch()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._updates_count = 0
+            self._strings.clear()
+            self._columns = self._empty_columns()
+            self._postings = {field: [] for field in self.INTERNED_FIELDS}
+            self._stale = {field: [] for field in self.INTERNED_FIELDS}
+            self._dni_index = {}
+
+    def enable_persistence(self, directory: str, fsync: str = "group", snapshot_every: int = 10000) -> int:
+        # Loads the newest snapshot, replays the WAL tail and logs every later write
+        with self._lock:
+            self.clear()
+            store = DurableStore(directory, "users", fsync=fsync, snapshot_every=snapshot_every)
+            replayed = store.recover(self._load_snapshot, self._apply_record)
+            self._store = store
+        return replayed
+
+    def export_snapshot(self) -> bytes:
+        # Same body as a persistence snapshot; import_snapshot() restores it
+        with self._lock:
+            return self._snapshot_bytes()
+
+    def import_snapshot(self, body: bytes) -> None:
+        with self._lock:
+            self._load_snapshot(memoryview(body))
+
+    def close_persistence(self) -> None:
+        with self._lock:
+            store, self._store = self._store, None
+        if store is not None:
+            store.close()
+
+    def _log(self, op: int, record: Dict[str, Any]) -> None:
+        if self._store is None:
+            return
+        self._store.append(op, json.dumps(record, separators=(",", ":")).encode())
+        if self._store.should_snapshot():
+            self._store.snapshot(self._snapshot_bytes())
+
+    def _apply_record(self, op: int, payload: bytes) -> None:
+        record = json.loads(payload)
+        if op == OP_CREATE:
+            self._append_row(record, record["created_at"], record["updated_at"])
+        elif op == OP_UPDATE:
+            self._apply_update(self._row_of(record["id"]), record["fields"], record["updated_at"])
+        else:
+            raise ValueError(f"Unknown users WAL operation: {op}")
+
+    def _apply_update(self, row: int, changes: Dict[str, str], updated_at: int) -> None:
+        for key, value in changes.items():
+            self._set(row, key, value)
+        self._columns["updated_at"][row] = updated_at
+        self._updates_count += 1
+
+    def _snapshot_bytes(self) -> bytes:
+        columns = self._columns
+        return b"".join([
+            SNAPSHOT_COUNTS.pack(self._row_count(), self._updates_count),
+            pack_blobs([value.encode() for value in self._strings.values]),
+            columns["name"].tobytes(),
+            columns["surname"].tobytes(),
+            columns["created_at"].tobytes(),
+            columns["updated_at"].tobytes(),
+            pack_blobs(columns["dni"]),
+            pack_blobs(columns["address"]),
+        ])
+
+    def _load_snapshot(self, view: memoryview) -> None:
+        self.clear()
+        rows, updates_count = SNAPSHOT_COUNTS.unpack_from(view, 0)
+        offset = SNAPSHOT_COUNTS.size
+        
+        strings, offset = unpack_blobs(view, offset)
+        for value in strings:
+            self._strings.encode(value.decode())
+        
+        columns = self._columns
+        for field, typecode in (("name", "I"), ("surname", "I"), ("created_at", "q"), ("updated_at", "q")):
+            columns[field], offset = unpack_array(typecode, view, offset, rows)
+        columns["dni"], offset = unpack_blobs(view, offset)
+        columns["address"], offset = unpack_blobs(view, offset)
+        
+        for row in range(rows):
+            for field in self.INTERNED_FIELDS:
+                self._add_posting(field, columns[field][row], row)
+            self._add_dni(columns["dni"][row], row)
+        self._updates_count = updates_count
+
+    def _validate_fields(self, data: Dict[str, Any]) -> None:
+        unknown = set(data) - set(self.FIELDS) - {"id", "created_at", "updated_at"}
+        if unknown:
+            raise UserValidationError(f"Unknown user fields: {sorted(unknown)}")
+
+    def _row_count(self) -> int:
+        return len(self._columns["dni"])
+
+    def _epoch(self) -> int:
+        # Tells apart runs of user ids and update_seq numbers: both restart only
+        # when the store starts out empty, and then its first user gets a new
+        # created_at. Survives restarts with persistence; 0 while empty
+        return self._columns["created_at"][0] if self._row_count() else 0
+
+    def _row_of(self, user_id: Any) -> Optional[int]:
+        try:
+            row = int(user_id) - 1
+        except (TypeError, ValueError):
+            return None
+        return row if 0 <= row < self._row_count() else None
+
+    def _append_row(self, data: Dict[str, Any], created_at: int, updated_at: int) -> int:
+        row = self._row_count()
+        columns = self._columns
+        
+        for field in self.INTERNED_FIELDS:
+            code = self._strings.encode(str(data[field]))
+            columns[field].append(code)
+            self._add_posting(field, code, row)
+        
+        columns["dni"].append(str(data["dni"]).encode())
+        columns["address"].append(str(data["address"]).encode())
+        columns["created_at"].append(created_at)
+        columns["updated_at"].append(updated_at)
+        self._add_dni(columns["dni"][row], row)
+        return row
+
+    def _set(self, row: int, field: str, value: Any) -> None:
+        value = str(value)
+        
+        if field in self.INTERNED_FIELDS:
+            old_code = self._columns[field][row]
+            code = self._strings.encode(value)
+            if code != old_code:
+                self._columns[field][row] = code
+                self._add_posting(field, code, row)
+                self._mark_stale(field, old_code)
+        elif field == "dni":
+            self._remove_dni(self._columns["dni"][row], row)
+            self._columns["dni"][row] = value.encode()
+            self._add_dni(self._columns["dni"][row], row)
+        elif field == "address":
+            self._columns["address"][row] = value.encode()
+
+    def _materialize(self, row: int) -> Dict[str, Any]:
+        columns = self._columns
+        values = self._strings.values
+        return {
+            "id": row + 1,
+            "name": values[columns["name"][row]],
+            "surname": values[columns["surname"][row]],
+            "dni": columns["dni"][row].decode(),
+            "address": columns["address"][row].decode(),
+            "created_at": self._from_micros(columns["created_at"][row]),
+            "updated_at": self._from_micros(columns["updated_at"][row]),
+        }
+
+    def _projector(self, fields: Optional[List[str]]) -> Callable[[int], Dict[str, Any]]:
+        # Row -> dict with only the requested fields, so unused columns are never
+        # decoded; must be called under the lock, it binds the current columns
+        if fields is None:
+            return self._materialize
+        
+        columns = self._columns
+        values = self._strings.values
+        getters = {
+            "id": lambda row: row + 1,
+            "name": lambda row: values[columns["name"][row]],
+            "surname": lambda row: values[columns["surname"][row]],
+            "dni": lambda row: columns["dni"][row].decode(),
+            "address": lambda row: columns["address"][row].decode(),
+            "created_at": lambda row: self._from_micros(columns["created_at"][row]),
+            "updated_at": lambda row: self._from_micros(columns["updated_at"][row]),
+        }
+        
+        unknown = [field for field in fields if field not in getters]
+        if unknown:
+            raise UserValidationError(f"Validation error: unknown fields {unknown}")
+        
+        selected = [(field, getters[field]) for field in dict.fromkeys(fields)]
+        return lambda row: {field: get(row) for field, get in selected}
+
+    def _add_posting(self, field: str, code: int, row: int) -> None:
+        postings = self._postings[field]
+        while len(postings) <= code:
+            postings.append(array("I"))
+            self._stale[field].append(0)
+        postings[code].append(row)
+
+    def _mark_stale(self, field: str, code: int) -> None:
+        self._stale[field][code] += 1
+        posting = self._postings[field][code]
+        
+        # Rebuild once stale rows dominate so postings stay proportional to live data
+        if self._stale[field][code] * 2 > len(posting):
+            column = self._columns[field]
+            live = sorted({row for row in posting if column[row] == code})
+            self._postings[field][code] = array("I", live)
+            self._stale[field][code] = 0
+
+    def _add_dni(self, dni: bytes, row: int) -> None:
+        current = self._dni_index.get(dni)
+        if current is None:
+            self._dni_index[dni] = row
+        elif isinstance(current, list):
+            current.append(row)
+        else:
+            self._dni_index[dni] = [current, row]
+
+    def _remove_dni(self, dni: bytes, row: int) -> None:
+        current = self._dni_index.get(dni)
+        if isinstance(current, list):
+            current.remove(row)
+            if len(current) == 1:
+                self._dni_index[dni] = current[0]
+        elif current == row:
+            del self._dni_index[dni]
+
+    def _candidates(self, field: str, value: Any) -> Iterable[int]:
+        if field == "id":
+            row = self._row_of(value)
+            return () if row is None else (row,)
+        
+        if field == "dni":
+            current = self._dni_index.get(str(value).encode())
+            if current is None:
+                return ()
+            return current if isinstance(current, list) else (current,)
+        
+        code = self._strings.codes.get(str(value))
+        if code is None or code >= len(self._postings[field]):
+            return ()
+        return self._postings[field][code]
+
+    def _row_matches(self, row: int, field: str, value: Any) -> bool:
+        if field == "id":
+            return row + 1 == int(value)
+        if field in self.INTERNED_FIELDS:
+            return self._strings.values[self._columns[field][row]] == str(value)
+        if field in ("dni", "address"):
+            return self._columns[field][row] == str(value).encode()
+        return False
+
+    def _matching_rows(self, filters: Dict[str, Any]) -> List[int]:
+        indexed = [(k, v) for k, v in filters.items() if k == "id" or k in self.INDEXED_FIELDS]
+        
+        if indexed:
+            # Drive from the smallest posting list and check the rest column-wise
+            candidates = min((self._candidates(k, v) for k, v in indexed), key=len)
+        else:
+            candidates = range(self._row_count())
+        
+        checks = list(filters.items())
+        rows = {
+            row for row in candidates
+            if all(self._row_matches(row, k, v) for k, v in checks)
+        }
+        return sorted(rows)
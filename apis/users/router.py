@@ -1,27 +1,54 @@
-from fastapi import APIRouter, HTTPException, Body
-from typing import Dict, Any, Optional
+from fastapi import APIRouter, HTTPException, Body, Query
+from fastapi.responses import StreamingResponse
+from typing import Dict, Any, AsyncIterator, List, Optional
 from loguru import logger
-import sys
+import json, settings, sys
 
 sys.path.append("../../")
-from core.publisher import default_publisher_service
-from apis.users.schemas import UserCreate, UserUpdate, UserFilter
+from core.publisher import default_async_publisher_service
+from core.micro_batcher import RPCBatcher
+from apis.errors import raise_if_unavailable
+from apis.users.schemas import UserCreate, UserBulkCreate, UserUpdate, UserBulkUpdate, UserFilter, MAX_PAGE_SIZE, USER_FIELDS
 
 router = APIRouter(prefix="/users", tags=["users"])
 
-publisher = default_publisher_service()
+publisher = default_async_publisher_service()
+
+# With settings.micro_batching, concurrent registers/updates share one batch RPC
+register_batcher = RPCBatcher(
+    "REGISTER_USERS_BATCH_RPC",
+    max_items=settings.micro_batch_max_items,
+    max_delay=settings.micro_batch_max_delay
+)
+update_batcher = RPCBatcher(
+    "UPDATE_USERS_BATCH_RPC",
+    max_items=settings.micro_batch_max_items,
+    max_delay=settings.micro_batch_max_delay
+)
+
+# Set by the users service for USER_*_EVENT consumers only, left out of HTTP replies
+EVENT_ONLY_FIELDS = ("users_epoch", "update_seq")
+
+async def _call_rpc(event_type: str, payload: Dict[str, Any], batcher: RPCBatcher) -> Dict:
+    if settings.micro_batching:
+        return await batcher.call(publisher, payload)
+    return await publisher.call_rpc(event_type=event_type, payload=payload)
+
+def _public_user(user: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value for key, value in user.items() if key not in EVENT_ONLY_FIELDS}
+
+def _public_results(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [{**result, "user": _public_user(result["user"])} if "user" in result else result for result in results]
 
 @router.post("/register")
-def register_user(user: UserCreate):
+async def register_user(user: UserCreate):
     try:
         payload = user.model_dump()
         
-        response = publisher.call_rpc(
-            event_type="REGISTER_USER_RPC",
-            payload=payload
-        )
+        response = await _call_rpc("REGISTER_USER_RPC", payload, register_batcher)
         
         if not response.get("success"):
+            raise_if_unavailable(response)
             error = response.get("error") or response.get("data", {}).get("error", "Error registering user")
             if "validation" in str(error).lower():
                 raise HTTPException(status_code=400, detail=str(error))
@@ -29,20 +56,24 @@ def register_user(user: UserCreate):
         
         user_data = response.get("data")
         
+        if isinstance(user_data, dict) and "error" in user_data:
+            status_code = 400 if "validation" in str(user_data["error"]).lower() else 500
+            raise HTTPException(status_code=status_code, detail=str(user_data["error"]))
+        
         try:
-            publisher.publish(
+            await publisher.publish(
                 event_type="USER_REGISTERED_EVENT",
                 payload=user_data
             )
             
-            publisher.publish(
+            await publisher.publish(
                 event_type="SEND_EMAIL",
                 payload={"name": user_data["name"], "surname": user_data["surname"]}
             )
         except Exception as e:
             logger.warning(f"Error publishing events: {str(e)}")
         
-        return {"status": "success", "user": user_data}
+        return {"status": "success", "user": _public_user(user_data)}
     
     except HTTPException:
         raise
@@ -50,37 +81,165 @@ def register_user(user: UserCreate):
         logger.error(f"Error registering user: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/register/bulk")
+async def register_users_bulk(request: UserBulkCreate):
+    # One RPC for the whole batch; invalid items are reported per index
+    try:
+        response = await publisher.call_rpc(
+            event_type="REGISTER_USERS_BATCH_RPC",
+            payload=request.model_dump()
+        )
+        
+        if not response.get("success"):
+            raise_if_unavailable(response)
+            raise HTTPException(status_code=500, detail=str(response.get("error", "Error registering users")))
+        
+        data = response.get("data") or {}
+        if "error" in data:
+            status_code = 400 if "validation" in str(data["error"]).lower() else 500
+            raise HTTPException(status_code=status_code, detail=str(data["error"]))
+        
+        created = [result["user"] for result in data.get("results", []) if "user" in result]
+        
+        # Two follow-up events per user, sent through PublishBatch
+        events = []
+        for user in created:
+            events.append(("USER_REGISTERED_EVENT", user))
+            events.append(("SEND_EMAIL", {"name": user["name"], "surname": user["surname"]}))
+        
+        if events:
+            published = await publisher.publish_batch(events)
+            if not published.get("success"):
+                logger.warning(f"Error publishing events: {len(published.get('failed', []))} failed")
+        
+        return {
+            "status": "success",
+            "created": data.get("created", len(created)),
+            "failed": data.get("failed", 0),
+            "results": _public_results(data.get("results", []))
+        }
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error registering users: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/")
-def list_users(name: Optional[str] = None, surname: Optional[str] = None, dni: Optional[str] = None):
+async def list_users(
+    name: Optional[str] = None,
+    surname: Optional[str] = None,
+    dni: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    count_only: bool = False
+):
     try:
         payload = {"name": name, "surname": surname, "dni": dni}
+        # Paging: pass next_cursor back as cursor until it comes back null. Without
+        # a limit the users service answers with a page of up to MAX_PAGE_SIZE users,
+        # fewer when they would not fit in one SQS message
+        if limit is not None or cursor is not None:
+            payload.update({"limit": limit, "cursor": cursor})
+        # fields=id,dni projects each user; count_only skips the users altogether
+        if fields is not None:
+            payload["fields"] = _parse_fields(fields)
+        if count_only:
+            payload["count_only"] = True
         
-        response = publisher.call_rpc(
+        response = await publisher.call_rpc(
             event_type="LIST_USERS_RPC",
             payload=payload
         )
         
         if not response.get("success"):
+            raise_if_unavailable(response)
             raise HTTPException(status_code=500, detail=str(response.get("error", "Error listing users")))
         
-        return {"users": response.get("data", [])}
+        data = response.get("data", {})
+        if isinstance(data, dict) and "error" in data:
+            status_code = 400 if "validation" in str(data["error"]).lower() else 500
+            raise HTTPException(status_code=status_code, detail=str(data["error"]))
+        
+        if count_only:
+            return {"count": data.get("count", 0)}
+        return {"users": data.get("users", []), "next_cursor": data.get("next_cursor")}
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error listing users: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/stream")
+async def stream_users(
+    name: Optional[str] = None,
+    surname: Optional[str] = None,
+    dni: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    # NDJSON, one user per line, written as the users service sends its chunks
+    payload = {"name": name, "surname": surname, "dni": dni}
+    if fields is not None:
+        payload["fields"] = _parse_fields(fields)
+    chunks = publisher.stream_rpc(event_type="LIST_USERS_STREAM_RPC", payload=payload)
+    
+    # The first chunk decides the status code; later failures end the body with an error line
+    try:
+        first = await chunks.__anext__()
+    except StopAsyncIteration:
+        first = {"success": False, "error": "Empty stream"}
+    
+    error = _chunk_error(first)
+    if error is not None:
+        await chunks.aclose()
+        raise_if_unavailable(first)
+        status_code = 400 if "validation" in error.lower() else 500
+        raise HTTPException(status_code=status_code, detail=error)
+    
+    async def lines() -> AsyncIterator[str]:
+        chunk = first
+        try:
+            while True:
+                error = _chunk_error(chunk)
+                if error is not None:
+                    yield json.dumps({"error": error}) + "\n"
+                    return
+                for user in (chunk.get("data") or {}).get("users", []):
+                    yield json.dumps(user) + "\n"
+                chunk = await chunks.__anext__()
+        except StopAsyncIteration:
+            pass
+        finally:
+            await chunks.aclose()
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+def _parse_fields(fields: str) -> List[str]:
+    # Rejected here so a typo costs no RPC
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in USER_FIELDS]
+    if not requested or unknown:
+        raise HTTPException(status_code=400, detail=f"Invalid fields {unknown or fields!r}, expected some of {list(USER_FIELDS)}")
+    return requested
+
+def _chunk_error(chunk: Dict[str, Any]) -> Optional[str]:
+    if not chunk.get("success"):
+        return str(chunk.get("error", "Error streaming users"))
+    data = chunk.get("data")
+    if chunk.get("status") == "ERROR" or (isinstance(data, dict) and "error" in data):
+        return str((data or {}).get("error", "Error streaming users"))
+    return None
+
 @router.put("/update")
-def update_user(user_update: UserUpdate):
+async def update_user(user_update: UserUpdate):
     try:
         payload = user_update.model_dump(exclude_unset=True)
         
-        response = publisher.call_rpc(
-            event_type="UPDATE_USER_RPC",
-            payload=payload
-        )
+        response = await _call_rpc("UPDATE_USER_RPC", payload, update_batcher)
         
         if not response.get("success"):
+            raise_if_unavailable(response)
             error_msg = str(response.get("error", "Error updating user"))
             error_data_msg = str(response.get("data", {}).get("error", "")) if response.get("data") else ""
             
@@ -103,16 +262,53 @@ def update_user(user_update: UserUpdate):
             raise HTTPException(status_code=400, detail=user_data["error"])
         
         try:
-            publisher.publish(
+            await publisher.publish(
                 event_type="USER_UPDATED_EVENT",
                 payload=user_data
             )
         except Exception as e:
              logger.warning(f"Error publishing USER_UPDATED_EVENT: {str(e)}")
         
-        return {"status": "success", "user": user_data}
+        return {"status": "success", "user": _public_user(user_data)}
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error updating user: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.put("/update/bulk")
+async def update_users_bulk(request: UserBulkUpdate):
+    # One RPC for the whole batch; invalid items and unknown ids are reported per index
+    try:
+        response = await publisher.call_rpc(
+            event_type="UPDATE_USERS_BATCH_RPC",
+            payload=request.model_dump()
+        )
+        
+        if not response.get("success"):
+            raise_if_unavailable(response)
+            raise HTTPException(status_code=500, detail=str(response.get("error", "Error updating users")))
+        
+        data = response.get("data") or {}
+        if "error" in data:
+            status_code = 400 if "validation" in str(data["error"]).lower() else 500
+            raise HTTPException(status_code=status_code, detail=str(data["error"]))
+        
+        events = [("USER_UPDATED_EVENT", result["user"]) for result in data.get("results", []) if "user" in result]
+        if events:
+            published = await publisher.publish_batch(events)
+            if not published.get("success"):
+                logger.warning(f"Error publishing USER_UPDATED_EVENT: {len(published.get('failed', []))} failed")
+        
+        return {
+            "status": "success",
+            "updated": data.get("updated", len(events)),
+            "failed": data.get("failed", 0),
+            "results": _public_results(data.get("results", []))
+        }
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error updating users: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Literal, Dict, Any
 from datetime import datetime
 
 class UserBase(BaseModel):
@@ -11,6 +11,14 @@ class UserBase(BaseModel):
 class UserCreate(UserBase):
     pass
 
+# Users per REGISTER_USERS_BATCH_RPC, so request and reply stay well under 256 KB
+MAX_BULK_USERS = 500
+
+class UserBulkCreate(BaseModel):
+    # Items are validated one by one by the users service, so one bad item
+    # does not reject the rest
+    users: List[Dict[str, Any]] = Field(..., min_length=1, max_length=MAX_BULK_USERS)
+
 class UserUpdate(BaseModel):
     id: int
     name: Optional[str] = None
@@ -18,10 +26,30 @@ class UserUpdate(BaseModel):
     dni: Optional[str] = None
     address: Optional[str] = None
 
+class UserBulkUpdate(BaseModel):
+    # Each item is a UserUpdate patch, validated one by one like UserBulkCreate
+    users: List[Dict[str, Any]] = Field(..., min_length=1, max_length=MAX_BULK_USERS)
+
+# Most users a LIST_USERS_RPC page may carry
+MAX_PAGE_SIZE = 1000
+
+# Fields have no max length, so pages and stream chunks also stop once their
+# users take this many bytes as JSON. base64 msgpack adds a third on top, which
+# still leaves room for the reply envelope under the 256 KB SQS limit
+MAX_PAGE_BYTES = 180 * 1024
+
+# Fields a listing can be projected to
+USER_FIELDS = ("id", "name", "surname", "dni", "address", "created_at", "updated_at")
+UserField = Literal["id", "name", "surname", "dni", "address", "created_at", "updated_at"]
+
 class UserFilter(BaseModel):
     name: Optional[str] = None
     surname: Optional[str] = None
     dni: Optional[str] = None
+    limit: Optional[int] = Field(None, ge=1, le=MAX_PAGE_SIZE)
+    cursor: Optional[str] = None
+    fields: Optional[List[UserField]] = Field(None, min_length=1)
+    count_only: bool = False
 
 class UserResponse(UserBase):
     id: int
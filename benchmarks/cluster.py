@@ -0,0 +1,160 @@
+import threading
+from typing import List, Optional, Tuple
+
+from core.consumer import Consumer
+from core.local_broker import LocalBroker
+from core.routing import EVENT_LANE, RPC_LANE, apply_filter_policy, apply_lane_policies, lane_filter_policy
+from core.publisher import TOPIC_ARN, default_async_publisher_service
+from apis.users import main as users_service
+from apis.users.repository import UserRepository
+from apis.statistics import main as statistics_service
+from apis.statistics.repository import StatisticsRepository
+from apis.statistics.view import enable_statistics_view, disable_statistics_view, get_statistics_view
+import settings
+
+
+class LocalCluster:
+    # The gateway and both consumers in one process, wired through a LocalBroker
+    # that mirrors localstack-init/init-queue-and-topic.sh
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        failure_rate: float = 0.0,
+        seed: Optional[int] = None,
+        polling_time: float = 0.5,
+        statistics_view: bool = False
+    ):
+        self.broker = LocalBroker(latency=latency, jitter=jitter, failure_rate=failure_rate, seed=seed)
+        # Short long-polls so stop() never waits long on an idle queue
+        self.polling_time = polling_time
+        self.statistics_view = statistics_view
+        self.consumers: List[Tuple[Consumer, dict]] = []
+        self._threads: List[threading.Thread] = []
+        self._running = False
+        self._saved_publisher = None
+
+
+
+    @property
+    def app(self):
+        from main import app
+        return app
+
+
+
+    def start(self) -> "LocalCluster":
+        topic_name = TOPIC_ARN.rsplit(":", 1)[-1]
+        self.broker.create_topic(topic_name)
+        self.broker.create_queue("beeneu-response-queue")
+        for service in (users_service, statistics_service):
+            for queue_url, lane in ((service.QUEUE_URL, RPC_LANE), (service.EVENTS_QUEUE_URL, EVENT_LANE)):
+                self.broker.create_queue(queue_url.rsplit("/", 1)[-1])
+                self.broker.subscribe(TOPIC_ARN, queue_url, raw=True, filter_policy=lane_filter_policy(lane))
+
+        publisher = default_async_publisher_service()
+        self._saved_publisher = (publisher.sns, publisher.sqs, publisher.POLLING_TIME)
+        publisher.sns = self.broker.sns_client()
+        publisher.sqs = self.broker.sqs_client()
+        publisher.POLLING_TIME = self.polling_time
+
+        self.consumers = [
+            (users_service.build_consumer(self.broker.sqs_client()),
+             users_service.build_event_handlers(UserRepository())),
+            (statistics_service.build_consumer(self.broker.sqs_client()),
+             statistics_service.build_event_handlers(StatisticsRepository())),
+        ]
+        # Same routing as the real services install at startup
+        for service, (_, handlers) in zip((users_service, statistics_service), self.consumers):
+            apply_lane_policies(
+                TOPIC_ARN, service.QUEUE_URL, service.EVENTS_QUEUE_URL, handlers,
+                self.broker.sns_client(), self.broker.sqs_client()
+            )
+
+        if self.statistics_view:
+            view_queue = self.broker.create_queue(settings.statistics_view_queue.rsplit("/", 1)[-1])
+            self.broker.subscribe(TOPIC_ARN, view_queue, raw=True)
+            view = enable_statistics_view(view_queue, sqs_client=self.broker.sqs_client())
+            apply_filter_policy(TOPIC_ARN, view_queue, view.event_handlers, self.broker.sns_client(), self.broker.sqs_client())
+            view.consumer.POLLING_TIME = self.polling_time
+
+        self._running = True
+        for consumer, handlers in self.consumers:
+            consumer.POLLING_TIME = self.polling_time
+            thread = threading.Thread(
+                target=self._consume,
+                args=(consumer, handlers),
+                name=f"local-consumer-{consumer.queue_url.rsplit('/', 1)[-1]}",
+                daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+        return self
+
+
+
+    def stop(self):
+        self._running = False
+        if self.statistics_view:
+            disable_statistics_view()
+        for thread in self._threads:
+            thread.join(timeout=self.polling_time + 5)
+        for consumer, _ in self.consumers:
+            consumer.close()
+        self._threads = []
+        self.consumers = []
+
+        if self._saved_publisher is not None:
+            publisher = default_async_publisher_service()
+            publisher.sns, publisher.sqs, publisher.POLLING_TIME = self._saved_publisher
+            self._saved_publisher = None
+
+
+
+    def expired(self) -> dict:
+        # RPCs the consumers dropped because the gateway had already timed out
+        totals: dict = {}
+        for consumer, _ in self.consumers:
+            for event_type, count in consumer.expired.items():
+                totals[event_type] = totals.get(event_type, 0) + count
+        return totals
+
+
+
+    async def stop_listener(self):
+        # The publisher's reply listener lives on the caller's event loop; stop it
+        # there before the loop closes so it never polls the restored clients
+        await default_async_publisher_service().stop_listener()
+
+
+
+    def __enter__(self) -> "LocalCluster":
+        return self.start()
+
+
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+
+    async def __aenter__(self) -> "LocalCluster":
+        self.start()
+        view = get_statistics_view()
+        if self.statistics_view and view is not None:
+            await view.seed(default_async_publisher_service())
+        return self
+
+
+
+    async def __aexit__(self, *exc_info):
+        await self.stop_listener()
+        self.stop()
+
+
+
+    def _consume(self, consumer: Consumer, handlers: dict):
+        while self._running:
+            consumer.consume(handlers)
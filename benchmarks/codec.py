@@ -0,0 +1,79 @@
+import argparse
+import json
+import time
+import uuid
+
+from loguru import logger
+from apis.users.event_dispatcher import EventHandlers
+from apis.users.repository import UserRepository
+from apis.users.schemas import MAX_PAGE_SIZE
+from benchmarks.memory_users import generate_users
+from core.codec import available_codecs, get_codec
+from core.consumer import build_response
+from core.publisher import build_message
+
+
+def sample_messages(users: int):
+    # Representative traffic, built by the same code as the real messages: the
+    # USER_REGISTERED_EVENT the gateway publishes after a registration and the
+    # LIST_USERS_RPC reply of a page of `users` users
+    repo = UserRepository()
+    repo.clear()
+    handlers = EventHandlers(repository=repo)
+    records = list(generate_users(users))
+    registered = handlers.register_user_rpc(records[0])
+    repo.create_many(records[1:])
+    page = handlers.list_users_rpc({"limit": min(users, MAX_PAGE_SIZE)})
+    return {
+        "register event": build_message("USER_REGISTERED_EVENT", registered, str(uuid.uuid4())),
+        f"list reply ({len(page['users'])} users)": build_response(str(uuid.uuid4()), page),
+    }
+
+
+def timed(func, arg, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func(arg)
+    return (time.perf_counter() - start) / iterations
+
+
+def run(iterations: int, users: int):
+    results = []
+    for label, message in sample_messages(users).items():
+        for name in available_codecs():
+            codec = get_codec(name)
+            body = codec.encode(message)
+            results.append({
+                "message": label,
+                "codec": name,
+                "bytes": len(body.encode()),
+                "encode_us": timed(codec.encode, message, iterations) * 1e6,
+                "decode_us": timed(codec.decode, body, iterations) * 1e6,
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Encode/decode speed and wire size per message codec")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--json", action="store_true", help="Print raw results as JSON")
+    args = parser.parse_args()
+
+    # The users repository logs every registration while the samples are built
+    logger.remove()
+    results = run(args.iterations, args.users)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"Codecs: {', '.join(available_codecs())}   iterations: {args.iterations:,}")
+    for row in results:
+        print(
+            f"{row['message']:<24} {row['codec']:<12} {row['bytes']:>9,} B"
+            f"   encode {row['encode_us']:9.1f} us   decode {row['decode_us']:9.1f} us"
+        )
+
+
+if __name__ == "__main__":
+    main()
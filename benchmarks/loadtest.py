@@ -0,0 +1,316 @@
+import argparse
+import asyncio
+import json
+import platform
+import random
+import subprocess
+import time
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional
+
+import httpx
+from loguru import logger
+
+from benchmarks.cluster import LocalCluster
+from benchmarks.memory_users import generate_users
+from core.publisher import default_async_publisher_service
+from core.resilience import HedgePolicy
+from apis.users import router as users_router
+import settings
+
+DEFAULT_MIX = "register=3,list=3,update=2,total-users=1,total-updates=1,registered-last-24h=1,summary=1"
+PERCENTILES = (50, 95, 99, 99.9)
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        if name.strip() not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"Unknown endpoint {name!r}, expected one of {sorted(ENDPOINTS)}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    # Nearest-rank, so p99.9 of fewer than 1000 samples is simply the maximum
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(min(rank, len(sorted_values))) - 1]
+
+
+class Workload:
+    # Generates requests from synthetic users, or replays a JSONL file with one
+    # {"endpoint", "method", "path", "params"?, "json"?} object per line
+
+    def __init__(self, mix: Dict[str, float], seed: int, replay: Optional[str] = None):
+        self.mix = mix
+        self.random = random.Random(seed)
+        self.users = generate_users(10_000_000, seed=seed)
+        self.known: List[Dict[str, Any]] = []
+        self.replay = self._load_replay(replay) if replay else None
+
+
+
+    def next_request(self) -> Dict[str, Any]:
+        if self.replay is not None:
+            request = self.replay[self._replay_index % len(self.replay)]
+            self._replay_index += 1
+            return request
+
+        endpoint = self.random.choices(list(self.mix), weights=list(self.mix.values()))[0]
+        return ENDPOINTS[endpoint](self)
+
+
+
+    def register(self) -> Dict[str, Any]:
+        return {"endpoint": "register", "method": "POST", "path": "/users/register", "json": next(self.users)}
+
+
+
+    def remember(self, request: Dict[str, Any], response: httpx.Response):
+        if request["endpoint"] == "register" and response.status_code == 200:
+            self.known.append(response.json()["user"])
+
+
+
+    def _load_replay(self, path: str) -> List[Dict[str, Any]]:
+        self._replay_index = 0
+        with open(path, encoding="utf-8") as file:
+            requests = [json.loads(line) for line in file if line.strip()]
+        for request in requests:
+            request.setdefault("endpoint", request["path"])
+        return requests
+
+
+def _list(workload: Workload) -> Dict[str, Any]:
+    if not workload.known:
+        return workload.register()
+    user = workload.random.choice(workload.known)
+    return {"endpoint": "list", "method": "GET", "path": "/users/", "params": {"dni": user["dni"]}}
+
+
+def _update(workload: Workload) -> Dict[str, Any]:
+    if not workload.known:
+        return workload.register()
+    user = workload.random.choice(workload.known)
+    address = f"{workload.random.choice(['Av. Belgrano', 'Calle Tucumán'])} {workload.random.randint(1, 9999)}"
+    return {"endpoint": "update", "method": "PUT", "path": "/users/update", "json": {"id": user["id"], "address": address}}
+
+
+def _statistics(name: str):
+    return lambda workload: {"endpoint": name, "method": "GET", "path": f"/statistics/{name}"}
+
+
+ENDPOINTS = {
+    "register": Workload.register,
+    "list": _list,
+    "update": _update,
+    "total-users": _statistics("total-users"),
+    "total-updates": _statistics("total-updates"),
+    "registered-last-24h": _statistics("registered-last-24h"),
+    "summary": lambda workload: {"endpoint": "summary", "method": "GET", "path": "/statistics/summary", "params": {"windows": "1h,24h,7d"}},
+}
+
+
+async def run_load(client: httpx.AsyncClient, workload: Workload, total: int, concurrency: int, duration: Optional[float]):
+    samples: Dict[str, List[float]] = {}
+    statuses: Dict[str, Dict[str, int]] = {}
+    issued = 0
+    stop_at = time.perf_counter() + duration if duration else None
+
+    async def worker():
+        nonlocal issued
+        while True:
+            if stop_at is not None:
+                if time.perf_counter() >= stop_at:
+                    return
+            elif issued >= total:
+                return
+            issued += 1
+
+            request = workload.next_request()
+            start = time.perf_counter()
+            try:
+                response = await client.request(
+                    request["method"], request["path"], params=request.get("params"), json=request.get("json")
+                )
+                status = str(response.status_code)
+            except httpx.HTTPError as ex:
+                response, status = None, type(ex).__name__
+            elapsed = time.perf_counter() - start
+
+            endpoint = request["endpoint"]
+            samples.setdefault(endpoint, []).append(elapsed)
+            counts = statuses.setdefault(endpoint, {})
+            counts[status] = counts.get(status, 0) + 1
+            if response is not None:
+                workload.remember(request, response)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples, statuses, time.perf_counter() - started
+
+
+def summarize(samples: Dict[str, List[float]], statuses: Dict[str, Dict[str, int]], wall_time: float) -> Dict[str, Any]:
+    def stats(latencies: List[float], counts: Dict[str, int]) -> Dict[str, Any]:
+        ordered = sorted(latencies)
+        errors = sum(count for status, count in counts.items() if not status.startswith("2"))
+        return {
+            "requests": len(ordered),
+            "errors": errors,
+            "throughput_rps": len(ordered) / wall_time if wall_time else 0.0,
+            "mean_ms": sum(ordered) / len(ordered) * 1000 if ordered else 0.0,
+            **{f"p{str(pct).replace('.', '')}_ms": percentile(ordered, pct) * 1000 for pct in PERCENTILES},
+            "max_ms": ordered[-1] * 1000 if ordered else 0.0,
+            "statuses": counts,
+        }
+
+    every = [latency for latencies in samples.values() for latency in latencies]
+    merged: Dict[str, int] = {}
+    for counts in statuses.values():
+        for status, count in counts.items():
+            merged[status] = merged.get(status, 0) + count
+
+    return {
+        "wall_time_s": wall_time,
+        "overall": stats(every, merged),
+        "endpoints": {endpoint: stats(samples[endpoint], statuses[endpoint]) for endpoint in sorted(samples)},
+    }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def benchmark(args) -> Dict[str, Any]:
+    # Repositories start empty in a fresh process and persistence stays off,
+    # so every run begins from the same state
+    workload = Workload(args.mix, args.seed, args.replay)
+    cluster = LocalCluster(
+        latency=args.latency,
+        jitter=args.jitter,
+        failure_rate=args.failure_rate,
+        seed=args.seed,
+        statistics_view=args.statistics_view
+    )
+
+    settings.micro_batching = args.micro_batching
+    hedging = HedgePolicy(settings.rpc_hedge_event_types, percentile=args.hedge_percentile, budget=args.hedge_budget) if args.hedging else None
+    default_async_publisher_service().hedging = hedging
+    for batcher in (users_router.register_batcher, users_router.update_batcher):
+        batcher.max_items = args.batch_items
+        batcher.max_delay = args.batch_delay
+
+    async with cluster:
+        transport = httpx.ASGITransport(app=cluster.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://gateway", timeout=30) as client:
+            if args.preload and workload.replay is None:
+                preload = Workload({"register": 1}, args.seed + 1)
+                preload.users, preload.known = workload.users, workload.known
+                await run_load(client, preload, args.preload, args.concurrency, None)
+            samples, statuses, wall_time = await run_load(client, workload, args.requests, args.concurrency, args.duration)
+        expired = cluster.expired()
+    default_async_publisher_service().hedging = None
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "config": {
+            "requests": args.requests,
+            "duration": args.duration,
+            "concurrency": args.concurrency,
+            "mix": args.mix,
+            "replay": args.replay,
+            "preload": args.preload,
+            "seed": args.seed,
+            "broker": {"latency": args.latency, "jitter": args.jitter, "failure_rate": args.failure_rate},
+            "statistics_view": args.statistics_view,
+            "micro_batching": {"enabled": args.micro_batching, "max_items": args.batch_items, "max_delay": args.batch_delay},
+            "hedging": {"enabled": args.hedging, "percentile": args.hedge_percentile, "budget": args.hedge_budget},
+        },
+        **summarize(samples, statuses, wall_time),
+        "expired_rpcs": expired,
+        "hedged_rpcs": {"sent": hedging.hedged, "over_budget": hedging.over_budget} if hedging else None,
+    }
+
+
+def print_report(result: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None):
+    config = result["config"]
+    print(f"Concurrency: {config['concurrency']}   wall time: {result['wall_time_s']:.2f} s   revision: {result['revision']}")
+    print(f"{'endpoint':<22} {'reqs':>7} {'err':>5} {'rps':>9} {'p50':>8} {'p95':>8} {'p99':>8} {'p999':>8}  (ms)")
+
+    rows = [("overall", result["overall"])] + list(result["endpoints"].items())
+    for name, row in rows:
+        print(
+            f"{name:<22} {row['requests']:>7} {row['errors']:>5} {row['throughput_rps']:>9.1f}"
+            f" {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f} {row['p999_ms']:>8.2f}"
+        )
+        if baseline is not None:
+            before = baseline["overall"] if name == "overall" else baseline["endpoints"].get(name)
+            if before:
+                deltas = [
+                    f"{key[:-3]} {(row[key] / before[key] - 1) * 100:+.1f}%"
+                    for key in ("p50_ms", "p99_ms") if before[key]
+                ]
+                if before["throughput_rps"]:
+                    deltas.insert(0, f"rps {(row['throughput_rps'] / before['throughput_rps'] - 1) * 100:+.1f}%")
+                print(f"{'':<22} vs baseline: {', '.join(deltas)}")
+
+    if result.get("hedged_rpcs"):
+        print(f"Hedged RPCs: {result['hedged_rpcs']['sent']} sent, {result['hedged_rpcs']['over_budget']} over budget")
+
+    if result.get("expired_rpcs"):
+        dropped = ", ".join(f"{event_type} {count}" for event_type, count in sorted(result["expired_rpcs"].items()))
+        print(f"Expired RPCs dropped by consumers: {dropped}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end gateway load test over the in-process broker")
+    parser.add_argument("--requests", type=int, default=2000, help="Total measured requests")
+    parser.add_argument("--duration", type=float, help="Run for this many seconds instead of a request count")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX), help=f"Endpoint weights (default {DEFAULT_MIX})")
+    parser.add_argument("--replay", help="JSONL file of requests to replay instead of generated ones")
+    parser.add_argument("--preload", type=int, default=200, help="Users registered before measuring")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--latency", type=float, default=0.001, help="Broker latency per call, seconds")
+    parser.add_argument("--jitter", type=float, default=0.0005, help="Extra uniform broker latency, seconds")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Probability of an injected broker error")
+    parser.add_argument("--statistics-view", action="store_true", help="Answer /statistics from the gateway read model")
+    parser.add_argument("--micro-batching", action="store_true", help="Batch concurrent register/update RPCs at the gateway")
+    parser.add_argument("--batch-items", type=int, default=settings.micro_batch_max_items, help="Micro-batch size limit")
+    parser.add_argument("--batch-delay", type=float, default=settings.micro_batch_max_delay, help="Micro-batch window, seconds")
+    parser.add_argument("--hedging", action="store_true", help="Hedge slow idempotent read RPCs")
+    parser.add_argument("--hedge-percentile", type=float, default=settings.rpc_hedge_percentile, help="Hedge after this latency percentile")
+    parser.add_argument("--hedge-budget", type=float, default=settings.rpc_hedge_budget, help="Max hedges per eligible RPC")
+    parser.add_argument("--output", help="Write the JSON results here")
+    parser.add_argument("--baseline", help="Earlier JSON results to compare against")
+    parser.add_argument("--verbose", action="store_true", help="Keep the per-message service logs")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logger.remove()
+
+    result = asyncio.run(benchmark(args))
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+
+    print_report(result, baseline)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(result, file, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
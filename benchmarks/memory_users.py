@@ -0,0 +1,107 @@
+import argparse
+import gc
+import random
+import tracemalloc
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from apis.users.repository import UserRepository
+
+FIRST_NAMES = [
+    "Juan", "María", "Carlos", "Ana", "Luis", "Laura", "Jorge", "Sofía", "Diego", "Lucía",
+    "Martín", "Valentina", "Pablo", "Camila", "Javier", "Florencia", "Andrés", "Julieta",
+    "Sebastián", "Agustina", "Nicolás", "Paula", "Federico", "Carolina", "Matías", "Romina",
+]
+SURNAMES = [
+    "Pérez", "González", "Rodríguez", "Fernández", "López", "Martínez", "García", "Sánchez",
+    "Romero", "Sosa", "Torres", "Álvarez", "Ruiz", "Ramírez", "Flores", "Acosta", "Benítez",
+    "Medina", "Herrera", "Suárez", "Aguirre", "Giménez", "Gutiérrez", "Pereyra", "Molina",
+]
+STREETS = ["Av. Corrientes", "Av. Santa Fe", "Calle Florida", "Av. Rivadavia", "Av. Cabildo", "Calle Lavalle"]
+CITIES = ["Buenos Aires", "Córdoba", "Rosario", "Mendoza", "La Plata", "Mar del Plata"]
+
+
+def fresh(value: str) -> str:
+    # Every decoded request carries its own string objects, never shared ones
+    return (value + " ")[:-1]
+
+
+def generate_users(count: int, seed: int = 7):
+    rng = random.Random(seed)
+    for index in range(count):
+        yield {
+            "name": fresh(rng.choice(FIRST_NAMES)),
+            "surname": fresh(rng.choice(SURNAMES)),
+            "dni": str(20_000_000 + index),
+            "address": f"{rng.choice(STREETS)} {rng.randint(1, 9999)}, {rng.choice(CITIES)}",
+        }
+
+
+def legacy_store(count: int):
+    # The original layout: one dict per user with ISO-8601 timestamps
+    users = []
+    now = datetime.now(ZoneInfo("America/Argentina/Buenos_Aires"))
+    for index, data in enumerate(generate_users(count)):
+        users.append({
+            "id": index + 1,
+            **data,
+            "created_at": now.isoformat(),
+            "updated_at": now.isoformat(),
+        })
+    return users
+
+
+def legacy_indexed_store(count: int):
+    # Dict records plus the id map and value -> id-set indexes
+    users = legacy_store(count)
+    by_id = {user["id"]: user for user in users}
+    indexes = {field: {} for field in UserRepository.INDEXED_FIELDS}
+    for user in users:
+        for field, index in indexes.items():
+            index.setdefault(str(user[field]), set()).add(user["id"])
+    return users, by_id, indexes
+
+
+def compact_store(count: int):
+    repo = UserRepository()
+    repo.clear()
+    now = repo._to_micros(repo.get_argentina_time())
+    with repo._lock:
+        for data in generate_users(count):
+            repo._append_row(data, now, now)
+    return repo
+
+
+def measure(builder, count: int) -> int:
+    gc.collect()
+    tracemalloc.start()
+    store = builder(count)
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del store
+    gc.collect()
+    return current
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resident memory per user for each UserRepository layout")
+    parser.add_argument("--users", type=int, default=200_000)
+    args = parser.parse_args()
+
+    results = {
+        "legacy dict records": measure(legacy_store, args.users),
+        "legacy dict records + indexes": measure(legacy_indexed_store, args.users),
+        "compact columns + indexes": measure(compact_store, args.users),
+    }
+    compact = results["compact columns + indexes"]
+
+    print(f"Users: {args.users:,}")
+    for name, total in results.items():
+        print(f"{name:<32} {total / args.users:8.1f} B/user   {total / 2**20:9.1f} MiB   x{total / compact:.2f}")
+
+    UserRepository().clear()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+from typing import Any, Callable, Dict, List, Optional, Set
+from loguru import logger
+import time, threading
+
+SQS_MAX_BATCH_ENTRIES = 10
+SQS_MAX_BATCH_BYTES = 256 * 1024
+
+
+class SQSBatchWriter:
+    def __init__(
+        self,
+        client: Callable[[], Any],
+        operation: str,
+        max_batch: int = SQS_MAX_BATCH_ENTRIES,
+        max_delay: float = 0.05,
+        send_when_idle: bool = False
+    ):
+        if operation not in ("delete", "send"):
+            raise ValueError(f"Unknown batch operation: {operation}")
+        
+        # client is resolved on every flush so a swapped SQS client is picked up
+        self._client = client
+        self.operation = operation
+        self.max_batch = min(max_batch, SQS_MAX_BATCH_ENTRIES)
+        self.max_delay = max_delay
+        # Latency over call count: an entry for a queue with nothing buffered and
+        # no call in flight goes out at once. Entries that arrive meanwhile are
+        # batched and sent as soon as that call returns (or at max_delay)
+        self.send_when_idle = send_when_idle
+        
+        # queue_url -> pending entries / their payload size / time the oldest was added
+        self._buffers: Dict[str, List[Dict]] = {}
+        self._sizes: Dict[str, int] = {}
+        self._oldest: Dict[str, float] = {}
+        # queue_urls with a send_when_idle call in flight
+        self._sending: Set[str] = set()
+        self._condition = threading.Condition()
+        self._flusher: Optional[threading.Thread] = None
+        self._running = False
+
+
+
+    def add(self, queue_url: str, entry: Dict):
+        size = self._entry_size(entry)
+        ready = []
+        
+        with self._condition:
+            idle = self.send_when_idle and queue_url not in self._sending and not self._buffers.get(queue_url)
+            if idle:
+                self._sending.add(queue_url)
+            else:
+                # A batch cannot exceed 256 KB in total, ship what we have first
+                if self._buffers.get(queue_url) and self._sizes[queue_url] + size > SQS_MAX_BATCH_BYTES:
+                    ready.append((queue_url, self._take(queue_url)))
+                
+                if queue_url not in self._buffers:
+                    self._buffers[queue_url] = []
+                    self._sizes[queue_url] = 0
+                    self._oldest[queue_url] = time.monotonic()
+                
+                self._buffers[queue_url].append(entry)
+                self._sizes[queue_url] += size
+                
+                if len(self._buffers[queue_url]) >= self.max_batch:
+                    ready.append((queue_url, self._take(queue_url)))
+                else:
+                    self._ensure_flusher()
+                    self._condition.notify()
+        
+        if idle:
+            self._send_while_busy(queue_url, [entry])
+        
+        for url, entries in ready:
+            self._send(url, entries)
+
+
+
+    def flush(self):
+        with self._condition:
+            ready = [(url, self._take(url)) for url in list(self._buffers)]
+        
+        for url, entries in ready:
+            self._send(url, entries)
+
+
+
+    def close(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        
+        if self._flusher is not None:
+            self._flusher.join(timeout=5)
+            self._flusher = None
+        
+        self.flush()
+
+
+
+    def _send_while_busy(self, queue_url: str, entries: List[Dict]):
+        # Sends, then ships whatever was buffered for the queue during the call
+        while entries:
+            self._send(queue_url, entries)
+            with self._condition:
+                entries = self._take(queue_url)
+                if not entries:
+                    self._sending.discard(queue_url)
+
+
+
+    def _entry_size(self, entry: Dict) -> int:
+        return len(entry.get("MessageBody", "")) if self.operation == "send" else 0
+
+
+
+    def _take(self, queue_url: str) -> List[Dict]:
+        self._sizes.pop(queue_url, None)
+        self._oldest.pop(queue_url, None)
+        return self._buffers.pop(queue_url, [])
+
+
+
+    def _ensure_flusher(self):
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        
+        self._running = True
+        self._flusher = threading.Thread(target=self._flush_loop, name=f"sqs-batch-{self.operation}", daemon=True)
+        self._flusher.start()
+
+
+
+    def _flush_loop(self):
+        while True:
+            with self._condition:
+                while self._running and not self._buffers:
+                    self._condition.wait()
+                
+                if not self._running:
+                    return
+                
+                now = time.monotonic()
+                deadline = min(self._oldest.values()) + self.max_delay
+                
+                if deadline > now:
+                    self._condition.wait(timeout=deadline - now)
+                    continue
+                
+                ready = [
+                    (url, self._take(url))
+                    for url, oldest in list(self._oldest.items())
+                    if oldest + self.max_delay <= now
+                ]
+            
+            for url, entries in ready:
+                self._send(url, entries)
+
+
+
+    def _send(self, queue_url: str, entries: List[Dict]):
+        if not entries:
+            return
+        
+        batch = [{"Id": str(index), **entry} for index, entry in enumerate(entries)]
+        
+        try:
+            if self.operation == "delete":
+                result = self._client().delete_message_batch(QueueUrl=queue_url, Entries=batch)
+            else:
+                result = self._client().send_message_batch(QueueUrl=queue_url, Entries=batch)
+        except Exception as ex:
+            logger.error(f"Batch {self.operation} failed, retrying {len(entries)} entries one by one: {str(ex)}")
+            for entry in entries:
+                self._send_single(queue_url, entry)
+            return
+        
+        for failed in result.get("Failed", []):
+            entry = entries[int(failed["Id"])]
+            
+            # Sender faults (bad receipt handle, oversized body...) will fail again
+            if failed.get("SenderFault"):
+                logger.error(f"Batch {self.operation} entry rejected - {failed.get('Code')}: {failed.get('Message')}")
+                continue
+            
+            self._send_single(queue_url, entry)
+        
+        logger.debug(f"Batch {self.operation} - queue: {queue_url} - entries: {len(entries)} - failed: {len(result.get('Failed', []))}")
+
+
+
+    def _send_single(self, queue_url: str, entry: Dict):
+        try:
+            if self.operation == "delete":
+                self._client().delete_message(QueueUrl=queue_url, ReceiptHandle=entry["ReceiptHandle"])
+            else:
+                self._client().send_message(QueueUrl=queue_url, **entry)
+        except Exception as ex:
+            logger.error(f"Error on single {self.operation} retry: {str(ex)}")
@@ -0,0 +1,104 @@
+from typing import Any, Dict, List, Optional, Tuple
+import base64, json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+# SNS/SQS message attribute carrying the codec of the body
+CODEC_ATTRIBUTE = "codec"
+DEFAULT_CODEC = "json"
+
+
+class CodecError(ValueError):
+    pass
+
+
+class JsonCodec:
+    name = "json"
+
+    def encode(self, value: Any) -> str:
+        return json.dumps(value)
+
+    def decode(self, body: str) -> Any:
+        try:
+            return json.loads(body)
+        except json.JSONDecodeError as ex:
+            raise CodecError(str(ex)) from ex
+
+
+class OrjsonCodec:
+    # Same wire format as JsonCodec, so either side can read the other
+    name = "orjson"
+
+    def encode(self, value: Any) -> str:
+        return orjson.dumps(value).decode()
+
+    def decode(self, body: str) -> Any:
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError as ex:
+            raise CodecError(str(ex)) from ex
+
+
+class MsgpackCodec:
+    # SNS/SQS bodies must be text, so the binary msgpack frame travels as base64
+    name = "msgpack-b64"
+
+    def encode(self, value: Any) -> str:
+        return base64.b64encode(msgpack.packb(value, use_bin_type=True)).decode("ascii")
+
+    def decode(self, body: str) -> Any:
+        try:
+            return msgpack.unpackb(base64.b64decode(body, validate=True), raw=False)
+        except (ValueError, msgpack.ExtraData, msgpack.FormatError, msgpack.StackError) as ex:
+            raise CodecError(str(ex)) from ex
+
+
+_CODECS: Dict[str, Any] = {JsonCodec.name: JsonCodec()}
+if orjson is not None:
+    _CODECS[OrjsonCodec.name] = OrjsonCodec()
+if msgpack is not None:
+    _CODECS[MsgpackCodec.name] = MsgpackCodec()
+
+# Plain JSON (untagged bodies, SNS envelopes) is read with the fastest parser available
+fast_json = _CODECS.get(OrjsonCodec.name, _CODECS[JsonCodec.name])
+
+
+def available_codecs() -> List[str]:
+    return list(_CODECS)
+
+
+def get_codec(name: Optional[str]) -> Any:
+    codec = _CODECS.get(name or DEFAULT_CODEC)
+    if codec is None:
+        raise CodecError(f"Codec not available: {name}. Available: {available_codecs()}")
+    return codec
+
+
+def codec_attributes(codec: Any) -> Dict[str, Dict[str, str]]:
+    return {CODEC_ATTRIBUTE: {"DataType": "String", "StringValue": codec.name}}
+
+
+def decode_message(message: Dict) -> Tuple[Dict, str]:
+    # Returns the decoded body and the codec it came in. Handles raw delivery
+    # (codec in the SQS attributes) and SNS envelopes (codec inside the envelope).
+    attribute = message.get("MessageAttributes", {}).get(CODEC_ATTRIBUTE)
+    if attribute is not None:
+        name = attribute.get("StringValue")
+        return get_codec(name).decode(message["Body"]), name
+    
+    body = fast_json.decode(message["Body"])
+    
+    if isinstance(body, dict) and isinstance(body.get("Message"), str):
+        name = body.get("MessageAttributes", {}).get(CODEC_ATTRIBUTE, {}).get("Value", DEFAULT_CODEC)
+        codec = fast_json if name == DEFAULT_CODEC else get_codec(name)
+        return codec.decode(body["Message"]), name
+    
+    return body, DEFAULT_CODEC
@@ -1,7 +1,11 @@
-import json
-import boto3
-from typing import Dict, Any, Callable
+import boto3, threading, time
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from types import GeneratorType
+from typing import Dict, Any, Callable, Iterator, List, Optional
 from loguru import logger
+from core.executor import HandlerExecutor, OrderingKey
+from core.batching import SQSBatchWriter
+from core.codec import DEFAULT_CODEC, CodecError, get_codec, codec_attributes, decode_message
 
 # AWS LocalStack Configuration
 AWS_REGION = 'sa-east-1'
@@ -9,10 +13,39 @@ ENDPOINT_URL = 'http://localhost:4566'
 AWS_ACCESS_KEY = 'test'
 AWS_SECRET_KEY = 'test'
 
+_END = object()
+
+
+def build_response(correlation_id: str, data: Any, status: str = "OK", chunk: Optional[Dict[str, Any]] = None) -> Dict:
+    response = {
+        "correlation_id": correlation_id,
+        "data": data,
+        "status": status
+    }
+    if chunk is not None:
+        response["chunk"] = chunk
+    return response
+
+
+class Lane:
+    # One queue polled by the consumer, with its own handler concurrency limit
+    def __init__(self, name: str, queue_url: str, executor: HandlerExecutor):
+        self.name = name
+        self.queue_url = queue_url
+        self.executor = executor
+
 
 class Consumer:
-    def __init__(self, queue_url: str, response_queue_url: str = None):
-        self.sqs = boto3.client(
+    def __init__(
+        self,
+        queue_url: str,
+        response_queue_url: str = None,
+        execution_mode: str = "sync",
+        max_in_flight: int = 10,
+        ordering_keys: Dict[str, Callable[[Dict[str, Any]], Optional[OrderingKey]]] = None,
+        sqs_client: Any = None
+    ):
+        self.sqs = sqs_client or boto3.client(
             'sqs',
             region_name=AWS_REGION,
             endpoint_url=ENDPOINT_URL,
@@ -25,87 +58,259 @@ class Consumer:
         
         self.MAX_NUMBER_MESSAGES = 10
         self.POLLING_TIME = 5
+        self.ACK_MAX_DELAY = 0.1
+        self.RESPONSE_MAX_DELAY = 0.01
+        self.EXPIRED_LOG_INTERVAL = 60
+        
+        # event_type -> function returning the key whose messages must run in order,
+        # or a list of keys for a message that must run in order with each of them
+        self.ordering_keys = ordering_keys or {}
+        self.executor = HandlerExecutor(mode=execution_mode, max_in_flight=max_in_flight)
+        
+        # RPCs dropped unexecuted because their deadline had passed, by event type.
+        # Lanes count them from their own threads; the totals are logged at most
+        # every EXPIRED_LOG_INTERVAL seconds while drops keep happening
+        self.expired: Dict[str, int] = {}
+        self._expired_lock = threading.Lock()
+        self._expired_logged_at: Optional[float] = None
+        
+        # queue_url is the first lane; add_lane() adds more. With several lanes each
+        # one long-polls on its own thread (_pollers), one poll in flight per lane
+        self.lanes: List[Lane] = [Lane("default", queue_url, self.executor)]
+        self._pollers: Optional[ThreadPoolExecutor] = None
+        self._polls: Dict[str, Future] = {}
+        
+        # Acks and replies go out as DeleteMessageBatch / SendMessageBatch calls,
+        # flushed at 10 entries or after a short delay, whichever comes first.
+        # A caller waits on each reply, so one that finds the writer idle is sent
+        # at once; replies only wait for each other while a send is in flight
+        self._acks = SQSBatchWriter(lambda: self.sqs, "delete", max_delay=self.ACK_MAX_DELAY)
+        self._responses = SQSBatchWriter(lambda: self.sqs, "send", max_delay=self.RESPONSE_MAX_DELAY, send_when_idle=True)
 
 
 
-    def delete_message(self, receipt_handle: str):
-        self.sqs.delete_message(
-            QueueUrl=self.queue_url,
-            ReceiptHandle=receipt_handle
-        )
+    def ack(self, receipt_handle: str, queue_url: Optional[str] = None):
+        self._acks.add(queue_url or self.queue_url, {"ReceiptHandle": receipt_handle})
+
+
 
+    def add_lane(self, name: str, queue_url: str, max_in_flight: int = 10) -> Lane:
+        # A second queue (e.g. fire-and-forget events next to RPCs) whose handlers
+        # never take more than max_in_flight slots, so it cannot starve the others
+        if self._pollers is not None:
+            raise RuntimeError("Lanes must be added before the consumer starts polling")
+        lane = Lane(name, queue_url, HandlerExecutor(mode=self.executor.mode, max_in_flight=max_in_flight))
+        self.lanes.append(lane)
+        return lane
 
 
-    def send_response(self, correlation_id: str, data: Any, status: str = "OK"):
-        if not self.response_queue_url:
+
+    def send_response(
+        self,
+        correlation_id: str,
+        data: Any,
+        status: str = "OK",
+        codec: str = DEFAULT_CODEC,
+        chunk: Optional[Dict[str, Any]] = None,
+        reply_to: Optional[str] = None
+    ):
+        # reply_to is the requesting publisher's own queue; older publishers
+        # don't send one and get the shared response queue
+        queue_url = reply_to or self.response_queue_url
+        if not queue_url:
             logger.warning("No response queue URL configured")
             return
         
-        response_message = {
-            "correlation_id": correlation_id,
-            "data": data,
-            "status": status
-        }
+        encoder = get_codec(codec)
+        self._responses.add(queue_url, {
+            "MessageBody": encoder.encode(build_response(correlation_id, data, status, chunk)),
+            "MessageAttributes": codec_attributes(encoder)
+        })
         
-        self.sqs.send_message(
-            QueueUrl=self.response_queue_url,
-            MessageBody=json.dumps(response_message)
-        )
+        logger.success(f"Response queued - correlation_id: {correlation_id}")
+
+
+
+    def send_stream(self, correlation_id: str, chunks: Iterator[Any], codec: str = DEFAULT_CODEC, reply_to: Optional[str] = None):
+        # Handlers that yield send one reply per item, tagged {"seq", "last"} so the
+        # publisher can put them back in order; a failure ends the stream with an ERROR chunk
+        seq = 0
+        try:
+            current = next(chunks, _END)
+            if current is _END:
+                current = None
+            while True:
+                following = next(chunks, _END)
+                self.send_response(correlation_id, current, codec=codec, chunk={"seq": seq, "last": following is _END}, reply_to=reply_to)
+                if following is _END:
+                    return
+                current = following
+                seq += 1
+        except Exception as ex:
+            logger.error(f"Error streaming response - correlation_id: {correlation_id} - {str(ex)}")
+            self.send_response(
+                correlation_id, {"error": str(ex)}, status="ERROR", codec=codec, chunk={"seq": seq, "last": True}, reply_to=reply_to
+            )
+
+
+
+    def consume(self, event_handlers: Dict[str, Callable]) -> Optional[int]:
+        # Returns how many messages were received, None if nothing was polled
+        try:
+            if len(self.lanes) == 1:
+                return self._consume_lane(self.lanes[0], event_handlers)
+            return self._consume_lanes(event_handlers)
+                    
+        except Exception as ex:
+            import traceback
+            logger.error(f"Consume error: {traceback.format_exc()}")
+            return None
+
+
+
+    def close(self, timeout: float = 30):
+        if self._pollers is not None:
+            # Polls in flight end within POLLING_TIME
+            self._pollers.shutdown(wait=True)
+            self._polls = {}
+        for lane in self.lanes:
+            lane.executor.shutdown(timeout=timeout)
+        self._responses.close()
+        self._acks.close()
+
+
+
+    def _consume_lane(self, lane: Lane, event_handlers: Dict[str, Callable]) -> Optional[int]:
+        # Only take what we can run: while handlers are busy the next long-poll
+        # asks for fewer messages instead of letting them sit invisible
+        capacity = lane.executor.wait_for_capacity(timeout=self.POLLING_TIME)
+        if capacity == 0:
+            return None
+        return self._poll(lane, event_handlers, capacity, self.POLLING_TIME)
+
+
+
+    def _consume_lanes(self, event_handlers: Dict[str, Callable]) -> int:
+        # Every lane long-polls independently, so an idle RPC lane never holds up
+        # events (and the other way round); returns once any lane's poll is back,
+        # after starting a new poll for it on the next call
+        if self._pollers is None:
+            self._pollers = ThreadPoolExecutor(max_workers=len(self.lanes), thread_name_prefix="consumer-lane")
         
-        logger.success(f"Response sent - correlation_id: {correlation_id}")
+        for lane in self.lanes:
+            if lane.name not in self._polls:
+                self._polls[lane.name] = self._pollers.submit(self._consume_lane, lane, event_handlers)
+        
+        done, _ = wait(self._polls.values(), timeout=self.POLLING_TIME, return_when=FIRST_COMPLETED)
+        
+        received = 0
+        for name, future in list(self._polls.items()):
+            if future in done:
+                del self._polls[name]
+                received += future.result() or 0
+        return received
 
 
 
-    def _parse_message(self, body: Dict) -> Dict:
+    def _poll(self, lane: Lane, event_handlers: Dict[str, Callable], capacity: int, wait_seconds: float) -> int:
+        result = self.sqs.receive_message(
+            QueueUrl=lane.queue_url,
+            MaxNumberOfMessages=min(self.MAX_NUMBER_MESSAGES, capacity),
+            WaitTimeSeconds=wait_seconds,
+            MessageAttributeNames=["All"]
+        )
+        
+        messages = result.get("Messages", [])
+        for message in messages:
+            self._dispatch(message, event_handlers, lane)
         
-        if "Message" in body and isinstance(body["Message"], str):
-            return json.loads(body["Message"])
-        return body
+        return len(messages)
 
 
 
-    def consume(self, event_handlers: Dict[str, Callable]):
+    def _dispatch(self, message: Dict, event_handlers: Dict[str, Callable], lane: Optional[Lane] = None):
+        lane = lane or self.lanes[0]
+        receipt_handle = message["ReceiptHandle"]
+        
         try:
-            result = self.sqs.receive_message(
-                QueueUrl=self.queue_url,
-                MaxNumberOfMessages=self.MAX_NUMBER_MESSAGES,
-                WaitTimeSeconds=self.POLLING_TIME
+            # Raw delivery is decoded once; SNS envelopes still need the inner Message
+            parsed, codec = decode_message(message)
+            
+            event_type = parsed.get("event_type")
+            correlation_id = parsed.get("correlation_id")
+            reply_to = parsed.get("reply_to")
+            deadline = parsed.get("deadline")
+            payload = parsed.get("payload", {})
+            
+            logger.info(f"Message received - Event: {event_type} - Correlation ID: {correlation_id}")
+            
+            # The caller already got a timeout: running the handler would only
+            # produce a reply nobody reads. Compared against this host's clock
+            if deadline is not None and time.time() > deadline:
+                logger.debug(f"Dropping expired RPC - Event: {event_type} - Correlation ID: {correlation_id}")
+                self._count_expired(event_type)
+                self.ack(receipt_handle, lane.queue_url)
+                return
+            
+            handler = event_handlers.get(event_type)
+            
+            if not handler:
+                logger.debug(f"No handler for event_type: {event_type}")
+                self.ack(receipt_handle, lane.queue_url)
+                return
+            
+            key_function = self.ordering_keys.get(event_type)
+            key = key_function(payload) if key_function else None
+            
+            # execute the handler
+            lane.executor.submit(
+                handler,
+                payload,
+                on_done=lambda data, error: self._complete(
+                    event_type, correlation_id, reply_to, receipt_handle, codec, data, error, lane.queue_url
+                ),
+                key=key
             )
             
-            for message in result.get("Messages", []):
-                receipt_handle = message["ReceiptHandle"]
-                
-                try:
-                    body = json.loads(message["Body"])
-                    
-                    parsed = self._parse_message(body)
-                    
-                    event_type = parsed.get("event_type")
-                    correlation_id = parsed.get("correlation_id")
-                    payload = parsed.get("payload", {})
-                    
-                    logger.info(f"Message received - Event: {event_type} - Correlation ID: {correlation_id}")
-                    
-                    # execute the handler
-                    handler = event_handlers.get(event_type)
-                    
-                    if handler:
-                        response_data = handler(payload)
-                        
-                        if "_RPC" in event_type and self.response_queue_url:
-                            self.send_response(correlation_id, response_data)
-                    else:
-                        logger.debug(f"No handler for event_type: {event_type}")
-                    
-                    self.delete_message(receipt_handle)
-                    
-                except json.JSONDecodeError as jex:
-                    logger.error(f"Error decoding message: {str(jex)}")
-                    self.delete_message(receipt_handle)
-                except Exception as ex:
-                    logger.error(f"Error processing message: {str(ex)}")
-                    self.delete_message(receipt_handle)
-                    
+        except CodecError as cex:
+            logger.error(f"Error decoding message: {str(cex)}")
+            self.ack(receipt_handle, lane.queue_url)
         except Exception as ex:
-            import traceback
-            logger.error(f"Consume error: {traceback.format_exc()}")
\ No newline at end of file
+            logger.error(f"Error processing message: {str(ex)}")
+            self.ack(receipt_handle, lane.queue_url)
+
+
+
+    def _count_expired(self, event_type: str):
+        with self._expired_lock:
+            self.expired[event_type] = self.expired.get(event_type, 0) + 1
+            now = time.monotonic()
+            if self._expired_logged_at is not None and now - self._expired_logged_at < self.EXPIRED_LOG_INTERVAL:
+                return
+            self._expired_logged_at = now
+            totals = dict(self.expired)
+        logger.warning(f"Expired RPCs dropped so far: {totals} - callers timed out before they were received")
+
+
+
+    def _complete(
+        self,
+        event_type: str,
+        correlation_id: str,
+        reply_to: Optional[str],
+        receipt_handle: str,
+        codec: str,
+        data: Any,
+        error: Optional[BaseException],
+        queue_url: Optional[str] = None
+    ):
+        try:
+            if error is not None:
+                logger.error(f"Error processing message: {str(error)}")
+            elif "_RPC" in event_type and (reply_to or self.response_queue_url):
+                if isinstance(data, GeneratorType):
+                    self.send_stream(correlation_id, data, codec=codec, reply_to=reply_to)
+                else:
+                    self.send_response(correlation_id, data, codec=codec, reply_to=reply_to)
+        finally:
+            self.ack(receipt_handle, queue_url)
@@ -0,0 +1,190 @@
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional, Tuple, Union
+from loguru import logger
+import asyncio, inspect, threading
+
+EXECUTION_MODES = ("sync", "thread", "process", "asyncio")
+
+# on_done(result, error) -> None
+DoneCallback = Callable[[Any, Optional[BaseException]], None]
+
+# One ordering key, or a list of them for a message that touches several
+OrderingKey = Union[Hashable, List[Hashable]]
+
+
+class _Task:
+    __slots__ = ("keys", "handler", "payload", "on_done")
+
+    def __init__(self, keys: Tuple[Hashable, ...], handler: Callable, payload: Dict[str, Any], on_done: DoneCallback):
+        self.keys = keys
+        self.handler = handler
+        self.payload = payload
+        self.on_done = on_done
+
+
+class HandlerExecutor:
+    def __init__(self, mode: str = "thread", max_in_flight: int = 10):
+        if mode not in EXECUTION_MODES:
+            raise ValueError(f"Unknown execution mode: {mode}. Expected one of {EXECUTION_MODES}")
+        
+        self.mode = mode
+        self.max_in_flight = max_in_flight
+        
+        # Only started handlers count: tasks waiting behind a busy key take no
+        # capacity, so they do not hold back messages with other keys
+        self._in_flight = 0
+        self._condition = threading.Condition()
+        
+        # key -> tasks holding it, in arrival order. The head holds the key; a
+        # task starts once it is the head of every one of its keys
+        self._key_queues: Dict[Hashable, Deque[_Task]] = {}
+        
+        self._pool = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[threading.Thread] = None
+        
+        if mode == "thread":
+            self._pool = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="consumer-handler")
+        elif mode == "process":
+            # Handlers and payloads must be picklable, and any state they mutate
+            # lives in the worker process: meant for pure, CPU-bound handlers
+            self._pool = ProcessPoolExecutor(max_workers=max_in_flight)
+        elif mode == "asyncio":
+            self._loop = asyncio.new_event_loop()
+            self._loop_thread = threading.Thread(target=self._loop.run_forever, name="consumer-asyncio", daemon=True)
+            self._loop_thread.start()
+
+
+
+    def available(self) -> int:
+        with self._condition:
+            return max(self.max_in_flight - self._in_flight, 0)
+
+
+
+    def in_flight(self) -> int:
+        with self._condition:
+            return self._in_flight
+
+
+
+    def wait_for_capacity(self, timeout: float) -> int:
+        with self._condition:
+            self._condition.wait_for(lambda: self._in_flight < self.max_in_flight, timeout=timeout)
+            return max(self.max_in_flight - self._in_flight, 0)
+
+
+
+    def submit(self, handler: Callable, payload: Dict[str, Any], on_done: DoneCallback, key: Optional[OrderingKey] = None):
+        if key is None:
+            keys = ()
+        elif isinstance(key, list):
+            keys = tuple(dict.fromkeys(key))
+        else:
+            keys = (key,)
+        task = _Task(keys, handler, payload, on_done)
+        
+        with self._condition:
+            for k in keys:
+                self._key_queues.setdefault(k, deque()).append(task)
+            
+            if not self._ready(task):
+                return
+            self._in_flight += 1
+        
+        self._start(task)
+
+
+
+    def shutdown(self, timeout: float = 30):
+        with self._condition:
+            drained = self._condition.wait_for(lambda: self._in_flight == 0, timeout=timeout)
+        
+        if not drained:
+            logger.warning(f"Executor shutdown with {self.in_flight()} handlers still in flight")
+        
+        if self._pool is not None:
+            self._pool.shutdown(wait=drained)
+        
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop_thread.join(timeout=5)
+
+
+
+    def _ready(self, task: _Task) -> bool:
+        return all(self._key_queues[k][0] is task for k in task.keys)
+
+
+
+    def _start(self, task: _Task):
+        if self.mode == "thread":
+            self._pool.submit(self._run_inline, task)
+        elif self.mode == "process":
+            try:
+                future = self._pool.submit(task.handler, task.payload)
+            except Exception as ex:
+                self._finish(task, None, ex)
+                return
+            future.add_done_callback(lambda f: self._finish(task, None if f.exception() else f.result(), f.exception()))
+        elif self.mode == "asyncio":
+            asyncio.run_coroutine_threadsafe(self._run_async(task), self._loop)
+        else:
+            self._run_inline(task)
+
+
+
+    def _run_inline(self, task: _Task):
+        try:
+            result = task.handler(task.payload)
+        except Exception as ex:
+            self._finish(task, None, ex)
+            return
+        self._finish(task, result, None)
+
+
+
+    async def _run_async(self, task: _Task):
+        loop = asyncio.get_running_loop()
+        result, error = None, None
+        
+        try:
+            if inspect.iscoroutinefunction(task.handler):
+                result = await task.handler(task.payload)
+            else:
+                result = await loop.run_in_executor(None, task.handler, task.payload)
+        except Exception as ex:
+            error = ex
+        
+        # Completion does broker I/O, keep it off the event loop
+        await loop.run_in_executor(None, self._finish, task, result, error)
+
+
+
+    def _finish(self, task: _Task, result: Any, error: Optional[BaseException]):
+        try:
+            task.on_done(result, error)
+        except Exception as ex:
+            logger.error(f"Error completing handler: {str(ex)}")
+        
+        next_tasks = []
+        
+        with self._condition:
+            self._in_flight -= 1
+            
+            for k in task.keys:
+                queue = self._key_queues[k]
+                queue.popleft()
+                if not queue:
+                    del self._key_queues[k]
+                elif self._ready(queue[0]) and queue[0] not in next_tasks:
+                    next_tasks.append(queue[0])
+            
+            # Counted before the lock is released, so shutdown() never sees
+            # zero in flight while tasks are still waiting for a key
+            self._in_flight += len(next_tasks)
+            self._condition.notify_all()
+        
+        for next_task in next_tasks:
+            self._start(next_task)
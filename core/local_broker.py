@@ -0,0 +1,427 @@
+from collections import deque
+from hashlib import md5
+from typing import Dict, Any, List, Optional, Tuple
+from uuid import uuid4
+from botocore.exceptions import ClientError
+import json, random, threading, time
+
+# In-process stand-in for the SNS/SQS subset used by Publisher and Consumer.
+# Pass broker.sns_client() / broker.sqs_client() where a boto3 client is expected.
+
+DEFAULT_VISIBILITY_TIMEOUT = 30
+MAX_BATCH_ENTRIES = 10
+
+
+def queue_name(queue_url: str) -> str:
+    # LocalStack answers the same queue under several hostnames, so queues are
+    # addressed by the last path segment only
+    return queue_url.rstrip("/").rsplit("/", 1)[-1]
+
+
+def queue_arn(name: str) -> str:
+    return f"arn:aws:sqs:sa-east-1:000000000000:{name}"
+
+
+def _matches(filter_policy: Optional[Dict], attributes: Dict) -> bool:
+    # The subset of SNS attribute filter policies the services install: every key
+    # must match one of its values, either an exact string or {"exists": bool}
+    if not filter_policy:
+        return True
+    
+    for name, allowed in filter_policy.items():
+        attribute = attributes.get(name)
+        value = attribute.get("StringValue") if attribute else None
+        if not any(
+            (rule.get("exists") == (attribute is not None)) if isinstance(rule, dict) else (rule == value)
+            for rule in allowed
+        ):
+            return False
+    return True
+
+
+def _client_error(code: str, message: str, operation: str) -> ClientError:
+    return ClientError({"Error": {"Code": code, "Message": message}}, operation)
+
+
+class _Queue:
+    def __init__(self, name: str, visibility_timeout: float):
+        self.name = name
+        self.visibility_timeout = visibility_timeout
+        self.visible: deque = deque()
+        # receipt_handle -> (message, visible again at)
+        self.in_flight: Dict[str, Tuple[Dict, float]] = {}
+        self.condition = threading.Condition()
+
+
+
+    def send(self, body: str, attributes: Optional[Dict] = None) -> str:
+        message = {
+            "MessageId": str(uuid4()),
+            "Body": body,
+            "MD5OfBody": md5(body.encode()).hexdigest(),
+            "MessageAttributes": attributes or {}
+        }
+        with self.condition:
+            self.visible.append(message)
+            self.condition.notify()
+        return message["MessageId"]
+
+
+
+    def receive(self, max_messages: int, wait_seconds: float, visibility_timeout: Optional[float]) -> List[Dict]:
+        deadline = time.monotonic() + wait_seconds
+        timeout = self.visibility_timeout if visibility_timeout is None else visibility_timeout
+
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                self._expire(now)
+
+                if self.visible:
+                    break
+
+                # Wake up in time for the next in-flight message to reappear
+                remaining = deadline - now
+                if self.in_flight:
+                    remaining = min(remaining, min(until for _, until in self.in_flight.values()) - now)
+                if deadline - now <= 0:
+                    return []
+                self.condition.wait(max(remaining, 0.001))
+
+            received = []
+            while self.visible and len(received) < max_messages:
+                message = self.visible.popleft()
+                receipt_handle = str(uuid4())
+                self.in_flight[receipt_handle] = (message, now + timeout)
+                received.append({**message, "ReceiptHandle": receipt_handle})
+            return received
+
+
+
+    def delete(self, receipt_handle: str):
+        # Like SQS, deleting an unknown or already expired handle is not an error
+        with self.condition:
+            self.in_flight.pop(receipt_handle, None)
+
+
+
+    def purge(self):
+        with self.condition:
+            self.visible.clear()
+            self.in_flight.clear()
+
+
+
+    def _expire(self, now: float):
+        expired = [handle for handle, (_, until) in self.in_flight.items() if until <= now]
+        for handle in expired:
+            message, _ = self.in_flight.pop(handle)
+            self.visible.append(message)
+
+
+
+    def depth(self) -> Tuple[int, int]:
+        with self.condition:
+            return len(self.visible), len(self.in_flight)
+
+
+class LocalBroker:
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        failure_rate: float = 0.0,
+        visibility_timeout: float = DEFAULT_VISIBILITY_TIMEOUT,
+        seed: Optional[int] = None
+    ):
+        # Every API call sleeps latency + uniform(0, jitter) seconds and fails
+        # with probability failure_rate, to mimic a remote broker
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.visibility_timeout = visibility_timeout
+
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self._queues: Dict[str, _Queue] = {}
+        # topic_arn -> [{"queue", "raw", "filter_policy"}]
+        self._subscriptions: Dict[str, List[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+
+
+    def create_queue(self, name: str) -> str:
+        with self._lock:
+            self._queues.setdefault(name, _Queue(name, self.visibility_timeout))
+        return f"http://localhost:4566/000000000000/{name}"
+
+
+
+    def delete_queue(self, queue_url: str):
+        with self._lock:
+            queue = self._queues.pop(queue_name(queue_url), None)
+        if queue is None:
+            raise _client_error(
+                "AWS.SimpleQueueService.NonExistentQueue",
+                f"The specified queue does not exist: {queue_url}",
+                "DeleteQueue"
+            )
+
+
+
+    def create_topic(self, name: str) -> str:
+        topic_arn = f"arn:aws:sns:sa-east-1:000000000000:{name}"
+        with self._lock:
+            self._subscriptions.setdefault(topic_arn, [])
+        return topic_arn
+
+
+
+    def subscribe(self, topic_arn: str, queue_url: str, raw: bool = True, filter_policy: Optional[Dict] = None) -> str:
+        name = queue_name(queue_url)
+        with self._lock:
+            self._subscriptions.setdefault(topic_arn, []).append({"queue": name, "raw": raw, "filter_policy": filter_policy})
+        return f"{topic_arn}:{name}"
+
+
+
+    def subscriptions(self, topic_arn: str) -> List[Dict[str, Any]]:
+        if topic_arn not in self._subscriptions:
+            raise _client_error("NotFound", f"Topic does not exist: {topic_arn}", "ListSubscriptionsByTopic")
+        return [
+            {
+                "SubscriptionArn": f"{topic_arn}:{subscription['queue']}",
+                "TopicArn": topic_arn,
+                "Protocol": "sqs",
+                "Endpoint": queue_arn(subscription["queue"])
+            }
+            for subscription in self._subscriptions[topic_arn]
+        ]
+
+
+
+    def set_filter_policy(self, subscription_arn: str, filter_policy: Optional[Dict]):
+        topic_arn, _, name = subscription_arn.rpartition(":")
+        for subscription in self._subscriptions.get(topic_arn, []):
+            if subscription["queue"] == name:
+                subscription["filter_policy"] = filter_policy
+                return
+        raise _client_error("NotFound", f"Subscription does not exist: {subscription_arn}", "SetSubscriptionAttributes")
+
+
+
+    def queue(self, queue_url: str, operation: str = "ReceiveMessage") -> _Queue:
+        queue = self._queues.get(queue_name(queue_url))
+        if queue is None:
+            raise _client_error(
+                "AWS.SimpleQueueService.NonExistentQueue",
+                f"The specified queue does not exist: {queue_url}",
+                operation
+            )
+        return queue
+
+
+
+    def depth(self, queue_url: str) -> Tuple[int, int]:
+        # (visible, in flight) messages
+        return self.queue(queue_url).depth()
+
+
+
+    def sns_client(self) -> "LocalSNSClient":
+        return LocalSNSClient(self)
+
+
+
+    def sqs_client(self) -> "LocalSQSClient":
+        return LocalSQSClient(self)
+
+
+
+    def fan_out(self, topic_arn: str, message: str, attributes: Optional[Dict]) -> str:
+        if topic_arn not in self._subscriptions:
+            raise _client_error("NotFound", f"Topic does not exist: {topic_arn}", "Publish")
+
+        message_id = str(uuid4())
+        for subscription in list(self._subscriptions[topic_arn]):
+            queue = self._queues.get(subscription["queue"])
+            if queue is None or not _matches(subscription["filter_policy"], attributes or {}):
+                continue
+            if subscription["raw"]:
+                queue.send(message, attributes)
+            else:
+                queue.send(json.dumps(self._envelope(topic_arn, message_id, message, attributes)))
+        return message_id
+
+
+
+    def simulate_call(self, operation: str):
+        with self._random_lock:
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+            failed = self.failure_rate > 0 and self._random.random() < self.failure_rate
+
+        if delay > 0:
+            time.sleep(delay)
+        if failed:
+            raise _client_error("ServiceUnavailable", "Injected failure", operation)
+
+
+
+    def _envelope(self, topic_arn: str, message_id: str, message: str, attributes: Optional[Dict]) -> Dict:
+        return {
+            "Type": "Notification",
+            "MessageId": message_id,
+            "TopicArn": topic_arn,
+            "Message": message,
+            "MessageAttributes": {
+                name: {"Type": value.get("DataType", "String"), "Value": value.get("StringValue")}
+                for name, value in (attributes or {}).items()
+            }
+        }
+
+
+class LocalSNSClient:
+    def __init__(self, broker: LocalBroker):
+        self.broker = broker
+
+
+
+    def publish(self, TopicArn: str, Message: str, MessageAttributes: Optional[Dict] = None, **kwargs) -> Dict:
+        self.broker.simulate_call("Publish")
+        return {"MessageId": self.broker.fan_out(TopicArn, Message, MessageAttributes)}
+
+
+
+    def list_subscriptions_by_topic(self, TopicArn: str, **kwargs) -> Dict:
+        self.broker.simulate_call("ListSubscriptionsByTopic")
+        return {"Subscriptions": self.broker.subscriptions(TopicArn)}
+
+
+
+    def set_subscription_attributes(self, SubscriptionArn: str, AttributeName: str, AttributeValue: str, **kwargs) -> Dict:
+        self.broker.simulate_call("SetSubscriptionAttributes")
+        if AttributeName != "FilterPolicy":
+            raise _client_error("InvalidParameter", f"Unsupported attribute: {AttributeName}", "SetSubscriptionAttributes")
+        self.broker.set_filter_policy(SubscriptionArn, json.loads(AttributeValue) if AttributeValue else None)
+        return {}
+
+
+
+    def publish_batch(self, TopicArn: str, PublishBatchRequestEntries: List[Dict], **kwargs) -> Dict:
+        if len(PublishBatchRequestEntries) > MAX_BATCH_ENTRIES:
+            raise _client_error("TooManyEntriesInBatchRequest", "At most 10 entries per batch", "PublishBatch")
+
+        self.broker.simulate_call("PublishBatch")
+        successful = []
+        for entry in PublishBatchRequestEntries:
+            message_id = self.broker.fan_out(TopicArn, entry["Message"], entry.get("MessageAttributes"))
+            successful.append({"Id": entry["Id"], "MessageId": message_id})
+        return {"Successful": successful, "Failed": []}
+
+
+class LocalSQSClient:
+    def __init__(self, broker: LocalBroker):
+        self.broker = broker
+
+
+
+    def create_queue(self, QueueName: str, Attributes: Optional[Dict] = None, **kwargs) -> Dict:
+        # Like SQS, creating an existing queue returns it
+        self.broker.simulate_call("CreateQueue")
+        return {"QueueUrl": self.broker.create_queue(QueueName)}
+
+
+
+    def delete_queue(self, QueueUrl: str, **kwargs) -> Dict:
+        self.broker.simulate_call("DeleteQueue")
+        self.broker.delete_queue(QueueUrl)
+        return {}
+
+
+
+    def get_queue_attributes(self, QueueUrl: str, AttributeNames: Optional[List[str]] = None, **kwargs) -> Dict:
+        self.broker.simulate_call("GetQueueAttributes")
+        queue = self.broker.queue(QueueUrl, "GetQueueAttributes")
+        visible, in_flight = queue.depth()
+        return {"Attributes": {
+            "QueueArn": queue_arn(queue.name),
+            "ApproximateNumberOfMessages": str(visible),
+            "ApproximateNumberOfMessagesNotVisible": str(in_flight)
+        }}
+
+
+
+    def send_message(self, QueueUrl: str, MessageBody: str, MessageAttributes: Optional[Dict] = None, **kwargs) -> Dict:
+        self.broker.simulate_call("SendMessage")
+        queue = self.broker.queue(QueueUrl, "SendMessage")
+        return {"MessageId": queue.send(MessageBody, MessageAttributes)}
+
+
+
+    def send_message_batch(self, QueueUrl: str, Entries: List[Dict], **kwargs) -> Dict:
+        self._check_batch(Entries, "SendMessageBatch")
+        self.broker.simulate_call("SendMessageBatch")
+        queue = self.broker.queue(QueueUrl, "SendMessageBatch")
+        successful = [
+            {"Id": entry["Id"], "MessageId": queue.send(entry["MessageBody"], entry.get("MessageAttributes"))}
+            for entry in Entries
+        ]
+        return {"Successful": successful, "Failed": []}
+
+
+
+    def receive_message(
+        self,
+        QueueUrl: str,
+        MaxNumberOfMessages: int = 1,
+        WaitTimeSeconds: float = 0,
+        VisibilityTimeout: Optional[float] = None,
+        MessageAttributeNames: Optional[List[str]] = None,
+        **kwargs
+    ) -> Dict:
+        self.broker.simulate_call("ReceiveMessage")
+        queue = self.broker.queue(QueueUrl, "ReceiveMessage")
+        messages = queue.receive(min(MaxNumberOfMessages, MAX_BATCH_ENTRIES), WaitTimeSeconds, VisibilityTimeout)
+
+        for message in messages:
+            attributes = message.pop("MessageAttributes")
+            if MessageAttributeNames and attributes:
+                wanted = set(MessageAttributeNames)
+                message["MessageAttributes"] = {
+                    name: value for name, value in attributes.items()
+                    if "All" in wanted or ".*" in wanted or name in wanted
+                }
+
+        return {"Messages": messages} if messages else {}
+
+
+
+    def delete_message(self, QueueUrl: str, ReceiptHandle: str, **kwargs) -> Dict:
+        self.broker.simulate_call("DeleteMessage")
+        self.broker.queue(QueueUrl, "DeleteMessage").delete(ReceiptHandle)
+        return {}
+
+
+
+    def delete_message_batch(self, QueueUrl: str, Entries: List[Dict], **kwargs) -> Dict:
+        self._check_batch(Entries, "DeleteMessageBatch")
+        self.broker.simulate_call("DeleteMessageBatch")
+        queue = self.broker.queue(QueueUrl, "DeleteMessageBatch")
+        for entry in Entries:
+            queue.delete(entry["ReceiptHandle"])
+        return {"Successful": [{"Id": entry["Id"]} for entry in Entries], "Failed": []}
+
+
+
+    def purge_queue(self, QueueUrl: str, **kwargs) -> Dict:
+        self.broker.simulate_call("PurgeQueue")
+        self.broker.queue(QueueUrl, "PurgeQueue").purge()
+        return {}
+
+
+
+    def _check_batch(self, entries: List[Dict], operation: str):
+        if not entries:
+            raise _client_error("EmptyBatchRequest", "The batch request doesn't contain any entries", operation)
+        if len(entries) > MAX_BATCH_ENTRIES:
+            raise _client_error("TooManyEntriesInBatchRequest", "At most 10 entries per batch", operation)
@@ -0,0 +1,111 @@
+from typing import Dict, Any, List, Optional, Set, Tuple
+from loguru import logger
+import asyncio
+
+
+class RPCBatcher:
+    # Collects concurrent single-item RPCs for up to `max_delay` seconds or
+    # `max_items` items and sends them as one batch RPC ({"items_key": [...]}),
+    # then hands every caller the result of its own item. Larger windows mean
+    # fewer broker round trips but more added latency per request.
+
+    def __init__(
+        self,
+        batch_event_type: str,
+        items_key: str = "users",
+        result_key: str = "user",
+        max_items: int = 50,
+        max_delay: float = 0.005
+    ):
+        self.batch_event_type = batch_event_type
+        self.items_key = items_key
+        self.result_key = result_key
+        self.max_items = max_items
+        self.max_delay = max_delay
+
+        self._pending: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._publisher: Any = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Strong references so batches in flight are not garbage collected
+        self._sending: Set[asyncio.Task] = set()
+
+        self.batches = 0
+        self.items = 0
+
+
+
+    async def call(self, publisher: Any, item: Dict[str, Any]) -> Dict:
+        # Same result shape as publisher.call_rpc() for the single-item RPC
+        loop = asyncio.get_running_loop()
+
+        # Futures from another (finished) event loop can never be resolved here
+        if self._loop is not loop:
+            self._pending = []
+            self._timer = None
+            self._loop = loop
+
+        future = loop.create_future()
+        self._pending.append((item, future))
+        self._publisher = publisher
+
+        if len(self._pending) >= self.max_items:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self.flush)
+
+        return await future
+
+
+
+    def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        task = asyncio.get_running_loop().create_task(self._send(self._publisher, batch))
+        self._sending.add(task)
+        task.add_done_callback(self._sending.discard)
+
+
+
+    async def _send(self, publisher: Any, batch: List[Tuple[Dict[str, Any], asyncio.Future]]):
+        self.batches += 1
+        self.items += len(batch)
+        logger.debug(f"Sending batch RPC - Event: {self.batch_event_type} - items: {len(batch)}")
+
+        try:
+            response = await publisher.call_rpc(
+                event_type=self.batch_event_type,
+                payload={self.items_key: [item for item, _ in batch]}
+            )
+        except Exception as ex:
+            logger.error(f"Error sending batch RPC: {str(ex)}")
+            response = {"success": False, "error": str(ex)}
+
+        for index, (_, future) in enumerate(batch):
+            # Callers that gave up (e.g. a disconnected client) are skipped
+            if not future.done():
+                future.set_result(self._item_result(response, index))
+
+
+
+    def _item_result(self, response: Dict, index: int) -> Dict:
+        if not response.get("success"):
+            return response
+
+        data = response.get("data") or {}
+        if "error" in data:
+            return {**response, "data": {"error": data["error"]}}
+
+        results = data.get("results") or []
+        result = results[index] if index < len(results) else None
+        if result is None:
+            return {**response, "data": {"error": f"Missing result for batch item {index}"}}
+        if "error" in result:
+            return {**response, "data": {"error": result["error"]}}
+        return {**response, "data": result.get(self.result_key)}
@@ -0,0 +1,321 @@
+from typing import Callable, Iterator, List, Optional, Tuple
+from array import array
+from loguru import logger
+import os, mmap, glob, struct, zlib, threading
+
+FSYNC_POLICIES = ("always", "group", "off")
+
+# WAL frame: payload length, crc32 of (lsn + op + payload), lsn, op
+RECORD_HEADER = struct.Struct("<IIQB")
+# Snapshot file: magic, lsn, body length, crc32 of body. Bodies hold raw
+# arrays in native byte order, snapshots are not portable across platforms.
+SNAPSHOT_MAGIC = b"BNSNAP01"
+SNAPSHOT_HEADER = struct.Struct("<8sQQI")
+
+
+class CorruptDataError(Exception):
+    pass
+
+
+class WriteAheadLog:
+    def __init__(self, directory: str, name: str, fsync: str = "group", group_interval: float = 0.05):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync}. Expected one of {FSYNC_POLICIES}")
+        
+        self.directory = directory
+        self.name = name
+        self.fsync = fsync
+        self.group_interval = group_interval
+        self.last_lsn = 0
+        
+        self._file = None
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._syncer: Optional[threading.Thread] = None
+        
+        os.makedirs(directory, exist_ok=True)
+
+
+
+    def segments(self) -> List[Tuple[int, str]]:
+        found = []
+        for path in glob.glob(os.path.join(self.directory, f"{self.name}-*.wal")):
+            start = os.path.basename(path)[len(self.name) + 1:-len(".wal")]
+            if start.isdigit():
+                found.append((int(start), path))
+        return sorted(found)
+
+
+
+    def replay(self, after_lsn: int = 0) -> Iterator[Tuple[int, int, bytes]]:
+        segments = self.segments()
+        
+        for position, (_, path) in enumerate(segments):
+            is_last = position == len(segments) - 1
+            
+            with open(path, "rb") as file:
+                data = file.read()
+            
+            offset = 0
+            while offset + RECORD_HEADER.size <= len(data):
+                length, crc, lsn, op = RECORD_HEADER.unpack_from(data, offset)
+                end = offset + RECORD_HEADER.size + length
+                payload = data[offset + RECORD_HEADER.size:end]
+                
+                if end > len(data) or zlib.crc32(data[offset + 8:end]) != crc:
+                    break
+                
+                self.last_lsn = max(self.last_lsn, lsn)
+                if lsn > after_lsn:
+                    yield lsn, op, payload
+                offset = end
+            
+            if offset != len(data):
+                if not is_last:
+                    raise CorruptDataError(f"Corrupt record in {path} at offset {offset}")
+                # A torn write from a crash: drop it so new records follow valid ones
+                logger.warning(f"Truncating torn WAL tail - {path} at offset {offset}")
+                with open(path, "r+b") as file:
+                    file.truncate(offset)
+
+
+
+    def open(self, last_lsn: int):
+        self.last_lsn = max(self.last_lsn, last_lsn)
+        segments = self.segments()
+        
+        if segments:
+            self._file = open(segments[-1][1], "ab")
+        else:
+            self._open_segment(self.last_lsn + 1)
+        
+        if self.fsync == "group":
+            self._syncer = threading.Thread(target=self._sync_loop, name=f"wal-sync-{self.name}", daemon=True)
+            self._syncer.start()
+
+
+
+    def append(self, op: int, payload: bytes) -> int:
+        with self._lock:
+            self.last_lsn += 1
+            body = struct.pack("<QB", self.last_lsn, op) + payload
+            self._file.write(struct.pack("<II", len(payload), zlib.crc32(body)) + body)
+            self._file.flush()
+            
+            if self.fsync == "always":
+                os.fsync(self._file.fileno())
+            else:
+                self._dirty = True
+            
+            return self.last_lsn
+
+
+
+    def rotate(self) -> int:
+        # Starts a new segment after the current lsn and returns that lsn
+        with self._lock:
+            self._sync()
+            self._file.close()
+            self._open_segment(self.last_lsn + 1)
+            return self.last_lsn
+
+
+
+    def remove_segments_before(self, lsn: int):
+        segments = self.segments()
+        for index, (start, path) in enumerate(segments[:-1]):
+            next_start = segments[index + 1][0]
+            if next_start - 1 <= lsn:
+                os.remove(path)
+
+
+
+    def close(self):
+        self._closed.set()
+        if self._syncer is not None:
+            self._syncer.join(timeout=5)
+        
+        with self._lock:
+            if self._file is not None:
+                self._sync()
+                self._file.close()
+                self._file = None
+
+
+
+    def _open_segment(self, start_lsn: int):
+        path = os.path.join(self.directory, f"{self.name}-{start_lsn:020d}.wal")
+        self._file = open(path, "ab")
+        _fsync_directory(self.directory)
+
+
+
+    def _sync(self):
+        if self._dirty and self.fsync != "off":
+            os.fsync(self._file.fileno())
+        self._dirty = False
+
+
+
+    def _sync_loop(self):
+        while not self._closed.wait(self.group_interval):
+            with self._lock:
+                if self._file is not None:
+                    self._sync()
+
+
+class DurableStore:
+    def __init__(self, directory: str, name: str, fsync: str = "group", snapshot_every: int = 10000, group_interval: float = 0.05):
+        self.directory = directory
+        self.name = name
+        self.snapshot_every = snapshot_every
+        self.wal = WriteAheadLog(directory, name, fsync=fsync, group_interval=group_interval)
+        
+        self._since_snapshot = 0
+        self._snapshotter: Optional[threading.Thread] = None
+
+
+
+    def recover(self, load_snapshot: Callable[[memoryview], None], apply: Callable[[int, bytes], None]) -> int:
+        snapshot_lsn = self._load_newest_snapshot(load_snapshot)
+        
+        replayed = 0
+        for _, op, payload in self.wal.replay(after_lsn=snapshot_lsn):
+            apply(op, payload)
+            replayed += 1
+        
+        self.wal.open(snapshot_lsn)
+        self._since_snapshot = replayed
+        logger.info(f"Recovered {self.name} - snapshot lsn: {snapshot_lsn} - replayed WAL records: {replayed}")
+        return replayed
+
+
+
+    def append(self, op: int, payload: bytes) -> int:
+        self._since_snapshot += 1
+        return self.wal.append(op, payload)
+
+
+
+    def should_snapshot(self) -> bool:
+        busy = self._snapshotter is not None and self._snapshotter.is_alive()
+        return self._since_snapshot >= self.snapshot_every and not busy
+
+
+
+    def snapshot(self, body: bytes, background: bool = True):
+        # Must be called under the owner's write lock so body matches the lsn
+        if self._snapshotter is not None:
+            self._snapshotter.join()
+        
+        lsn = self.wal.rotate()
+        self._since_snapshot = 0
+        
+        if background:
+            self._snapshotter = threading.Thread(target=self._write_snapshot, args=(lsn, body), name=f"snapshot-{self.name}", daemon=True)
+            self._snapshotter.start()
+        else:
+            self._write_snapshot(lsn, body)
+
+
+
+    def close(self):
+        if self._snapshotter is not None:
+            self._snapshotter.join()
+        self.wal.close()
+
+
+
+    def _snapshots(self) -> List[Tuple[int, str]]:
+        found = []
+        for path in glob.glob(os.path.join(self.directory, f"{self.name}-*.snap")):
+            lsn = os.path.basename(path)[len(self.name) + 1:-len(".snap")]
+            if lsn.isdigit():
+                found.append((int(lsn), path))
+        return sorted(found)
+
+
+
+    def _write_snapshot(self, lsn: int, body: bytes):
+        path = os.path.join(self.directory, f"{self.name}-{lsn:020d}.snap")
+        temporary = path + ".tmp"
+        
+        with open(temporary, "wb") as file:
+            file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, lsn, len(body), zlib.crc32(body)))
+            file.write(body)
+            file.flush()
+            if self.wal.fsync != "off":
+                os.fsync(file.fileno())
+        
+        os.replace(temporary, path)
+        if self.wal.fsync != "off":
+            _fsync_directory(self.directory)
+        
+        # Only now is the history before lsn redundant
+        for old_lsn, old_path in self._snapshots():
+            if old_lsn < lsn:
+                os.remove(old_path)
+        self.wal.remove_segments_before(lsn)
+        
+        logger.info(f"Snapshot written - {self.name} - lsn: {lsn} - {len(body)} bytes")
+
+
+
+    def _load_newest_snapshot(self, load_snapshot: Callable[[memoryview], None]) -> int:
+        for lsn, path in reversed(self._snapshots()):
+            try:
+                with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    magic, header_lsn, length, crc = SNAPSHOT_HEADER.unpack_from(mapped, 0)
+                    view = memoryview(mapped)[SNAPSHOT_HEADER.size:SNAPSHOT_HEADER.size + length]
+                    try:
+                        if magic != SNAPSHOT_MAGIC or header_lsn != lsn or len(view) != length or zlib.crc32(view) != crc:
+                            raise CorruptDataError(f"Invalid snapshot {path}")
+                        load_snapshot(view)
+                    finally:
+                        view.release()
+                return lsn
+            except (CorruptDataError, ValueError, struct.error) as ex:
+                logger.error(f"Skipping snapshot {path}: {str(ex)}")
+        
+        return 0
+
+
+def pack_blobs(blobs: List[bytes]) -> bytes:
+    lengths = array("I", (len(blob) for blob in blobs))
+    return struct.pack("<Q", len(lengths)) + lengths.tobytes() + b"".join(blobs)
+
+
+def unpack_blobs(view: memoryview, offset: int) -> Tuple[List[bytes], int]:
+    (count,) = struct.unpack_from("<Q", view, offset)
+    offset += 8
+    
+    lengths = array("I")
+    lengths.frombytes(view[offset:offset + count * lengths.itemsize])
+    offset += count * lengths.itemsize
+    
+    blobs = []
+    for length in lengths:
+        blobs.append(bytes(view[offset:offset + length]))
+        offset += length
+    return blobs, offset
+
+
+def unpack_array(typecode: str, view: memoryview, offset: int, count: int) -> Tuple[array, int]:
+    values = array(typecode)
+    end = offset + count * values.itemsize
+    values.frombytes(view[offset:end])
+    return values, end
+
+
+def _fsync_directory(directory: str):
+    try:
+        descriptor = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(descriptor)
+    except OSError:
+        pass
+    finally:
+        os.close(descriptor)
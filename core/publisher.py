@@ -1,7 +1,13 @@
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait as wait_futures
+from functools import partial
 from uuid import uuid4
 from loguru import logger
-from typing import Dict, Any
-import json, time, boto3
+from typing import Dict, Any, AsyncIterator, Callable, List, Optional, Tuple
+import os, re, socket, time, asyncio, threading, boto3
+
+from core.codec import DEFAULT_CODEC, CodecError, get_codec, codec_attributes, decode_message
+from core.routing import event_type_attributes
+from core.resilience import CIRCUIT_OPEN, CircuitBreaker, HedgePolicy, LatencyTracker
 
 # AWS LocalStack Configuration demo
 AWS_REGION = 'sa-east-1'
@@ -9,16 +15,73 @@ ENDPOINT_URL = 'http://localhost:4566'
 AWS_ACCESS_KEY = 'test'
 AWS_SECRET_KEY = 'test'
 
+# SNS PublishBatch takes at most 10 entries per call
+SNS_MAX_BATCH_ENTRIES = 10
+
+# Private response queues: one per gateway instance, replies are kept 5 minutes at most
+PRIVATE_QUEUE_PREFIX = "beeneu-gateway-"
+PRIVATE_QUEUE_RETENTION = 300
+
 RESPONSE_QUEUE = "http://sqs.sa-east-1.localhost.localstack.cloud:4566/000000000000/beeneu-response-queue"
 TOPIC_ARN = "arn:aws:sns:sa-east-1:000000000000:beeneu-topic"
 
+def build_message(
+    event_type: str,
+    payload: Dict[str, Any],
+    correlation_id: str,
+    reply_to: Optional[str] = None,
+    deadline: Optional[float] = None
+) -> Dict:
+    message = {
+        "event_type": event_type,
+        "correlation_id": correlation_id,
+        "payload": payload
+    }
+    # RPC requests name the queue their reply must go to, and the moment
+    # (epoch seconds) after which nobody is waiting for it any more
+    if reply_to:
+        message["reply_to"] = reply_to
+    if deadline is not None:
+        message["deadline"] = deadline
+    return message
+
+_default_publisher: Optional["Publisher"] = None
+_default_async_publisher: Optional["AsyncPublisher"] = None
+
 def default_publisher_service() -> "Publisher":
-    return Publisher(topic_arn=TOPIC_ARN, 
-                     response_queue_url=RESPONSE_QUEUE)
+    # A single Publisher per process: every RPC reply lands on the same
+    # response queue, so there must be only one listener draining it.
+    global _default_publisher
+    if _default_publisher is None:
+        _default_publisher = Publisher(topic_arn=TOPIC_ARN, 
+                                       response_queue_url=RESPONSE_QUEUE)
+    return _default_publisher
 
-class Publisher:
-    def __init__(self, topic_arn: str, response_queue_url: str = None):
-        self.sns = boto3.client(
+def default_async_publisher_service() -> "AsyncPublisher":
+    global _default_async_publisher
+    if _default_async_publisher is None:
+        _default_async_publisher = AsyncPublisher(topic_arn=TOPIC_ARN,
+                                                  response_queue_url=RESPONSE_QUEUE)
+    return _default_async_publisher
+
+async def shutdown_publisher_services():
+    if _default_async_publisher is not None:
+        await _default_async_publisher.close()
+    if _default_publisher is not None:
+        _default_publisher.close()
+
+
+class BasePublisher:
+    def __init__(
+        self,
+        topic_arn: str,
+        response_queue_url: str = None,
+        codec: str = DEFAULT_CODEC,
+        sns_client: Any = None,
+        sqs_client: Any = None
+    ):
+        # Injected clients (e.g. core.local_broker) replace the LocalStack ones
+        self.sns = sns_client or boto3.client(
             'sns',
             region_name=AWS_REGION,
             endpoint_url=ENDPOINT_URL,
@@ -26,7 +89,7 @@ class Publisher:
             aws_secret_access_key=AWS_SECRET_KEY
         )
         
-        self.sqs = boto3.client(
+        self.sqs = sqs_client or boto3.client(
             'sqs',
             region_name=AWS_REGION,
             endpoint_url=ENDPOINT_URL,
@@ -36,28 +99,310 @@ class Publisher:
         
         self.topic_arn = topic_arn
         self.response_queue_url = response_queue_url
+        # Consumers reply in the codec of the request, so this picks both directions
+        self.codec = get_codec(codec)
+        # Upper bound for an RPC wait; once enough replies have been seen the
+        # wait per event type adapts to its observed latency (LatencyTracker)
         self.TIMEOUT = 10
         self.POLLING_TIME = 2
         self.MAX_MESSAGES = 10
+        
+        # Per event type: after BREAKER_FAILURES consecutive timeouts RPCs fail at
+        # once for BREAKER_RESET seconds, then a single probe is let through
+        self.BREAKER_FAILURES = 5
+        self.BREAKER_RESET = 5.0
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.latencies = LatencyTracker()
+        
+        # Set to a HedgePolicy to duplicate slow idempotent reads (settings.rpc_hedging)
+        self.hedging: Optional[HedgePolicy] = None
+        
+        # Called with (event_type, payload) after every successful publish
+        self._publish_listeners: List[Callable[[str, Dict[str, Any]], None]] = []
+        
+        # Set while this instance replies through a queue of its own
+        self._private_queue_url: Optional[str] = None
+        self._shared_response_queue_url: Optional[str] = None
 
 
 
-    def publish(self, event_type: str, payload: Dict[str, Any]) -> Dict:
-        correlation_id = str(uuid4())
+    def create_private_response_queue(self, name: Optional[str] = None) -> str:
+        # Creates (or claims, when `name` already exists) a response queue only this
+        # instance polls; RPCs then carry it as reply_to. Call before the first RPC.
+        if self._private_queue_url is not None:
+            return self._private_queue_url
+        
+        if name is None:
+            host = re.sub(r"[^A-Za-z0-9_-]", "-", socket.gethostname())[:32]
+            name = f"{PRIVATE_QUEUE_PREFIX}{host}-{os.getpid()}-{uuid4().hex[:8]}"
+        
+        response = self.sqs.create_queue(
+            QueueName=name,
+            Attributes={"MessageRetentionPeriod": str(PRIVATE_QUEUE_RETENTION)}
+        )
         
-        message = {
-            "event_type": event_type,
+        self._shared_response_queue_url = self.response_queue_url
+        self._private_queue_url = self.response_queue_url = response["QueueUrl"]
+        logger.info(f"Private response queue ready - queue: {self._private_queue_url}")
+        return self._private_queue_url
+
+
+
+    def delete_private_response_queue(self):
+        queue_url, self._private_queue_url = self._private_queue_url, None
+        if queue_url is None:
+            return
+        
+        self.response_queue_url = self._shared_response_queue_url
+        try:
+            self.sqs.delete_queue(QueueUrl=queue_url)
+            logger.info(f"Private response queue deleted - queue: {queue_url}")
+        except Exception as ex:
+            logger.error(f"Error deleting private response queue {queue_url}: {str(ex)}")
+
+
+
+    def add_publish_listener(self, listener: Callable[[str, Dict[str, Any]], None]):
+        self._publish_listeners.append(listener)
+
+
+
+    def _notify_published(self, event_type: str, payload: Dict[str, Any]):
+        for listener in self._publish_listeners:
+            try:
+                listener(event_type, payload)
+            except Exception as ex:
+                logger.error(f"Publish listener error: {str(ex)}")
+
+
+
+    def _rpc_message(self, event_type: str, payload: Dict[str, Any], correlation_id: str, timeout: float) -> Dict:
+        return build_message(
+            event_type, payload, correlation_id,
+            reply_to=self.response_queue_url,
+            deadline=time.time() + timeout
+        )
+
+
+
+    def _breaker(self, event_type: str) -> CircuitBreaker:
+        breaker = self.breakers.get(event_type)
+        if breaker is None:
+            breaker = self.breakers.setdefault(
+                event_type,
+                CircuitBreaker(event_type, failure_threshold=self.BREAKER_FAILURES, reset_timeout=self.BREAKER_RESET)
+            )
+        return breaker
+
+
+
+    def _rpc_timeout(self, event_type: str) -> float:
+        return self.latencies.timeout(event_type, ceiling=self.TIMEOUT)
+
+
+
+    def _circuit_open_result(self, event_type: str) -> Dict:
+        breaker = self._breaker(event_type)
+        logger.warning(f"Circuit open, RPC rejected - Event: {event_type}")
+        return {
+            "success": False,
+            "error": f"{event_type} is unavailable, retry later",
+            "status": CIRCUIT_OPEN,
+            "retry_after": breaker.retry_after()
+        }
+
+
+
+    def _hedge_delay(self, event_type: str, timeout: float) -> Optional[float]:
+        if self.hedging is None:
+            return None
+        delay = self.hedging.delay(event_type, self.latencies)
+        return delay if delay is not None and delay < timeout else None
+
+
+
+    def _hedge(self, message: Dict):
+        # Same correlation id: the first reply resolves the call and the listener
+        # drops the other one as unknown
+        if not self.hedging.acquire():
+            return
+        try:
+            self._sns_publish(message)
+            logger.info(f"Hedged RPC published - Event: {message['event_type']} - Correlation ID: {message['correlation_id']}")
+        except Exception as ex:
+            logger.error(f"Error publishing hedged request: {str(ex)}")
+
+
+
+    def _rpc_replied(self, event_type: str, started: float):
+        self.latencies.record(event_type, time.monotonic() - started)
+        self._breaker(event_type).record_success()
+
+
+
+    def _rpc_timed_out(self, event_type: str, correlation_id: str, timeout: float) -> Dict:
+        # The reply is later than `timeout` if it comes at all; counting it as that
+        # long raises the next estimate instead of letting it stay too tight
+        self.latencies.record(event_type, timeout)
+        self._breaker(event_type).record_failure()
+        return self._timeout_result(correlation_id, timeout)
+
+
+
+    def _message_attributes(self, message: Dict) -> Dict:
+        # codec for decoding, event_type for subscription filter policies
+        return {**codec_attributes(self.codec), **event_type_attributes(message["event_type"])}
+
+
+
+    def _sns_publish(self, message: Dict):
+        return self.sns.publish(
+            TopicArn=self.topic_arn,
+            Message=self.codec.encode(message),
+            MessageAttributes=self._message_attributes(message)
+        )
+
+
+
+    def _sns_publish_batch(self, messages: List[Dict]) -> List[Dict]:
+        # One PublishBatch call; returns the Failed entries, whose Id is the index in messages
+        response = self.sns.publish_batch(
+            TopicArn=self.topic_arn,
+            PublishBatchRequestEntries=[
+                {"Id": str(index), "Message": self.codec.encode(message), "MessageAttributes": self._message_attributes(message)}
+                for index, message in enumerate(messages)
+            ]
+        )
+        return response.get("Failed", [])
+
+
+
+    def _batch_groups(self, events: List[Tuple[str, Dict[str, Any]]]) -> List[List[Dict]]:
+        messages = [
+            build_message(event_type, payload, str(uuid4()))
+            for event_type, payload in events
+        ]
+        return [
+            messages[start:start + SNS_MAX_BATCH_ENTRIES]
+            for start in range(0, len(messages), SNS_MAX_BATCH_ENTRIES)
+        ]
+
+
+
+    def _batch_result(self, groups: List[List[Dict]], outcomes: List[Any]) -> Dict:
+        # outcomes[i] is the Failed list of groups[i], or the exception its call raised
+        failed = []
+        for messages, outcome in zip(groups, outcomes):
+            if isinstance(outcome, Exception):
+                logger.error(f"Error publishing batch: {str(outcome)}")
+                failed.extend({"event_type": message["event_type"], "error": str(outcome)} for message in messages)
+                continue
+            
+            errors = {int(entry["Id"]): entry.get("Message") or entry.get("Code") for entry in outcome}
+            for index, message in enumerate(messages):
+                if index in errors:
+                    logger.error(f"Error publishing message - Event: {message['event_type']} - {errors[index]}")
+                    failed.append({"event_type": message["event_type"], "error": errors[index]})
+                else:
+                    self._notify_published(message["event_type"], message["payload"])
+        
+        published = sum(len(messages) for messages in groups) - len(failed)
+        logger.success(f"Batch published - {published} messages in {len(groups)} calls")
+        return {"success": not failed, "published": published, "failed": failed}
+
+
+
+    def _receive_responses(self) -> List[Dict]:
+        response = self.sqs.receive_message(
+            QueueUrl=self.response_queue_url,
+            MaxNumberOfMessages=self.MAX_MESSAGES,
+            WaitTimeSeconds=self.POLLING_TIME,
+            MessageAttributeNames=["All"]
+        )
+        return response.get("Messages", [])
+
+
+
+    def _parse_response(self, message: Dict) -> Optional[Tuple[str, Dict]]:
+        try:
+            body, _ = decode_message(message)
+        except CodecError as cex:
+            logger.error(f"Error decoding message: {str(cex)}")
+            return None
+        
+        correlation_id = body.get("correlation_id")
+        
+        result = {
+            "success": True,
             "correlation_id": correlation_id,
-            "payload": payload
+            "data": body.get("data"),
+            "status": body.get("status", "OK")
+        }
+        if "chunk" in body:
+            result["chunk"] = body["chunk"]
+        
+        return correlation_id, result
+
+
+
+    def _timeout_result(self, correlation_id: str, timeout: float) -> Dict:
+        logger.warning(f"Timeout waiting for response - correlation_id: {correlation_id}")
+        return {
+            "success": False,
+            "error": f"Timeout after {timeout:g} seconds",
+            "correlation_id": correlation_id
         }
+
+
+
+    def _delete_batch(self, receipt_handles: List[str]):
+        for start in range(0, len(receipt_handles), self.MAX_MESSAGES):
+            chunk = receipt_handles[start:start + self.MAX_MESSAGES]
+            
+            try:
+                result = self.sqs.delete_message_batch(
+                    QueueUrl=self.response_queue_url,
+                    Entries=[
+                        {"Id": str(index), "ReceiptHandle": handle}
+                        for index, handle in enumerate(chunk)
+                    ]
+                )
+                
+                for failed in result.get("Failed", []):
+                    logger.error(f"Error deleting response - Id: {failed.get('Id')} - {failed.get('Message')}")
+            except Exception as ex:
+                logger.error(f"Error deleting responses: {str(ex)}")
+
+
+class Publisher(BasePublisher):
+    def __init__(
+        self,
+        topic_arn: str,
+        response_queue_url: str = None,
+        codec: str = DEFAULT_CODEC,
+        sns_client: Any = None,
+        sqs_client: Any = None
+    ):
+        super().__init__(topic_arn, response_queue_url, codec, sns_client, sqs_client)
+        
+        # correlation_id -> Future resolved by the response listener
+        self._pending: Dict[str, Future] = {}
+        self._pending_lock = threading.Lock()
+        self._listener: Optional[threading.Thread] = None
+        self._listener_lock = threading.Lock()
+        self._running = False
+
+
+
+    def publish(self, event_type: str, payload: Dict[str, Any]) -> Dict:
+        correlation_id = str(uuid4())
+        message = build_message(event_type, payload, correlation_id)
         
         try:
-            response = self.sns.publish(
-                TopicArn=self.topic_arn,
-                Message=json.dumps(message)
-            )
+            self._sns_publish(message)
             
             logger.success(f"Message published - Event: {event_type} - Correlation ID: {correlation_id}")
+            self._notify_published(event_type, payload)
             
             return {
                 "success": True,
@@ -72,82 +417,399 @@ class Publisher:
 
 
 
+    def publish_batch(self, events: List[Tuple[str, Dict[str, Any]]]) -> Dict:
+        # (event_type, payload) pairs, published SNS_MAX_BATCH_ENTRIES per call
+        groups = self._batch_groups(events)
+        outcomes = []
+        for messages in groups:
+            try:
+                outcomes.append(self._sns_publish_batch(messages))
+            except Exception as ex:
+                outcomes.append(ex)
+        return self._batch_result(groups, outcomes)
+
+
+
     def call_rpc(self, event_type: str, payload: Dict[str, Any]) -> Dict:
         if not self.response_queue_url:
             return {"success": False, "error": "No response queue URL configured"}
         
+        if not self._breaker(event_type).allow():
+            return self._circuit_open_result(event_type)
+        
+        self._ensure_listener()
+        
         correlation_id = str(uuid4())
+        timeout = self._rpc_timeout(event_type)
+        message = self._rpc_message(event_type, payload, correlation_id, timeout)
         
-        message = {
-            "event_type": event_type,
-            "correlation_id": correlation_id,
-            "payload": payload
-        }
+        # Register before publishing so a fast reply can never beat us to it
+        future = Future()
+        with self._pending_lock:
+            self._pending[correlation_id] = future
         
+        started = time.monotonic()
         try:
-            self.sns.publish(
-                TopicArn=self.topic_arn,
-                Message=json.dumps(message)
-            )
+            self._sns_publish(message)
             
             logger.success(f"RPC Message published - Event: {event_type} - Correlation ID: {correlation_id}")
         except Exception as ex:
             logger.error(f"Error publishing message: {str(ex)}")
+            self._discard(correlation_id)
             return {"success": False, "error": str(ex)}
         
         logger.info(f"Waiting for response - correlation_id: {correlation_id}")
         
-        # Polling to wait for response
-        return self._wait_for_response(correlation_id)
+        hedge_delay = self._hedge_delay(event_type, timeout)
+        try:
+            if hedge_delay is not None and not wait_futures([future], timeout=hedge_delay).done:
+                self._hedge(message)
+            result = future.result(timeout=max(started + timeout - time.monotonic(), 0))
+        except FutureTimeoutError:
+            self._discard(correlation_id)
+            return self._rpc_timed_out(event_type, correlation_id, timeout)
+        
+        self._rpc_replied(event_type, started)
+        return result
+
+
+
+    def close(self):
+        self._running = False
+        listener = self._listener
+        if listener is not None:
+            listener.join(timeout=self.POLLING_TIME + 1)
+        self._listener = None
+        self.delete_private_response_queue()
+
+
+
+    def _discard(self, correlation_id: str):
+        with self._pending_lock:
+            self._pending.pop(correlation_id, None)
+
 
 
+    def _ensure_listener(self):
+        if self._listener is not None and self._listener.is_alive():
+            return
+        
+        with self._listener_lock:
+            if self._listener is not None and self._listener.is_alive():
+                return
+            
+            self._running = True
+            self._listener = threading.Thread(
+                target=self._listen,
+                name="publisher-response-listener",
+                daemon=True
+            )
+            self._listener.start()
+
 
-    def _wait_for_response(self, correlation_id: str) -> Dict:
-        start_time = time.time()
+
+    def _listen(self):
+        logger.info(f"Response listener started - queue: {self.response_queue_url}")
         
-        while time.time() - start_time < self.TIMEOUT:
+        while self._running:
             try:
-                response = self.sqs.receive_message(
-                    QueueUrl=self.response_queue_url,
-                    MaxNumberOfMessages=self.MAX_MESSAGES,
-                    WaitTimeSeconds=self.POLLING_TIME
-                )
+                messages = self._receive_responses()
+            except Exception as ex:
+                logger.error(f"Polling error: {str(ex)}")
+                time.sleep(1)
+                continue
+            
+            for message in messages:
+                self._dispatch(message)
+            
+            # Every reply is deleted, including late ones nobody waits for anymore,
+            # so they never come back after the visibility timeout
+            self._delete_batch([message["ReceiptHandle"] for message in messages])
+        
+        logger.info("Response listener stopped")
+
+
+
+    def _dispatch(self, message: Dict):
+        parsed = self._parse_response(message)
+        if parsed is None:
+            return
+        
+        correlation_id, result = parsed
+        
+        with self._pending_lock:
+            future = self._pending.pop(correlation_id, None)
+        
+        if future is None:
+            logger.debug(f"Discarding response without waiter - correlation_id: {correlation_id}")
+            return
+        
+        logger.success(f"Response received - correlation_id: {correlation_id}")
+        future.set_result(result)
+
+
+class AsyncPublisher(BasePublisher):
+    def __init__(
+        self,
+        topic_arn: str,
+        response_queue_url: str = None,
+        codec: str = DEFAULT_CODEC,
+        sns_client: Any = None,
+        sqs_client: Any = None
+    ):
+        super().__init__(topic_arn, response_queue_url, codec, sns_client, sqs_client)
+        self.MAX_WORKERS = 16
+        
+        # boto3 is blocking: SDK calls run on these pools so the event loop never
+        # waits on the network. The long-poll gets its own thread so it can never
+        # starve publishes.
+        self._executor = ThreadPoolExecutor(max_workers=self.MAX_WORKERS, thread_name_prefix="publisher-io")
+        self._poll_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="publisher-poll")
+        
+        # correlation_id -> asyncio.Future resolved by the response dispatcher
+        self._pending: Dict[str, asyncio.Future] = {}
+        # correlation_id -> queue of chunk replies for stream_rpc
+        self._streams: Dict[str, asyncio.Queue] = {}
+        self._listener: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+
+    async def publish(self, event_type: str, payload: Dict[str, Any]) -> Dict:
+        correlation_id = str(uuid4())
+        message = build_message(event_type, payload, correlation_id)
+        
+        try:
+            await self._run(self._sns_publish, message)
+            
+            logger.success(f"Message published - Event: {event_type} - Correlation ID: {correlation_id}")
+            self._notify_published(event_type, payload)
+            
+            return {
+                "success": True,
+                "correlation_id": correlation_id
+            }
+        except Exception as ex:
+            logger.error(f"Error publishing message: {str(ex)}")
+            return {
+                "success": False,
+                "error": str(ex)
+            }
+
+
+
+    async def publish_batch(self, events: List[Tuple[str, Dict[str, Any]]]) -> Dict:
+        # (event_type, payload) pairs, published SNS_MAX_BATCH_ENTRIES per call,
+        # with the calls running concurrently on the I/O pool
+        groups = self._batch_groups(events)
+        outcomes = await asyncio.gather(
+            *(self._run(self._sns_publish_batch, messages) for messages in groups),
+            return_exceptions=True
+        )
+        return self._batch_result(groups, list(outcomes))
+
+
+
+    async def call_rpc(self, event_type: str, payload: Dict[str, Any]) -> Dict:
+        if not self.response_queue_url:
+            return {"success": False, "error": "No response queue URL configured"}
+        
+        if not self._breaker(event_type).allow():
+            return self._circuit_open_result(event_type)
+        
+        self._ensure_listener()
+        
+        correlation_id = str(uuid4())
+        timeout = self._rpc_timeout(event_type)
+        message = self._rpc_message(event_type, payload, correlation_id, timeout)
+        
+        future = asyncio.get_running_loop().create_future()
+        self._pending[correlation_id] = future
+        
+        # The entry goes however the wait ends, a cancelled caller included
+        try:
+            started = time.monotonic()
+            try:
+                await self._run(self._sns_publish, message)
+                
+                logger.success(f"RPC Message published - Event: {event_type} - Correlation ID: {correlation_id}")
+            except Exception as ex:
+                logger.error(f"Error publishing message: {str(ex)}")
+                return {"success": False, "error": str(ex)}
+            
+            logger.info(f"Waiting for response - correlation_id: {correlation_id}")
+            
+            hedge_delay = self._hedge_delay(event_type, timeout)
+            try:
+                if hedge_delay is not None:
+                    done, _ = await asyncio.wait({future}, timeout=hedge_delay)
+                    if not done:
+                        await self._run(self._hedge, message)
+                result = await asyncio.wait_for(future, timeout=max(started + timeout - time.monotonic(), 0))
+            except asyncio.TimeoutError:
+                return self._rpc_timed_out(event_type, correlation_id, timeout)
+        finally:
+            self._pending.pop(correlation_id, None)
+        
+        self._rpc_replied(event_type, started)
+        return result
+
+
+
+    async def stream_rpc(self, event_type: str, payload: Dict[str, Any]) -> AsyncIterator[Dict]:
+        # Yields each chunk reply ({"seq", "last"} tagged) in order as it arrives;
+        # TIMEOUT applies to the wait for every next chunk, the breaker to the first
+        if not self.response_queue_url:
+            yield {"success": False, "error": "No response queue URL configured"}
+            return
+        
+        breaker = self._breaker(event_type)
+        if not breaker.allow():
+            yield self._circuit_open_result(event_type)
+            return
+        
+        self._ensure_listener()
+        
+        correlation_id = str(uuid4())
+        message = self._rpc_message(event_type, payload, correlation_id, self.TIMEOUT)
+        
+        chunks: asyncio.Queue = asyncio.Queue()
+        self._streams[correlation_id] = chunks
+        
+        # As in call_rpc, the entry goes however the stream ends: the caller may
+        # stop reading or be cancelled mid-stream
+        try:
+            try:
+                await self._run(self._sns_publish, message)
+                logger.success(f"Stream RPC Message published - Event: {event_type} - Correlation ID: {correlation_id}")
+            except Exception as ex:
+                logger.error(f"Error publishing message: {str(ex)}")
+                yield {"success": False, "error": str(ex)}
+                return
+            
+            # SQS may reorder replies, so early chunks wait here for their turn
+            early: Dict[int, Dict] = {}
+            expected = 0
+            
+            while True:
+                try:
+                    result = await asyncio.wait_for(chunks.get(), timeout=self.TIMEOUT)
+                except asyncio.TimeoutError:
+                    if expected == 0 and not early:
+                        breaker.record_failure()
+                    yield self._timeout_result(correlation_id, self.TIMEOUT)
+                    return
                 
-                for message in response.get("Messages", []):
-                    receipt_handle = message["ReceiptHandle"]
-                    
-                    try:
-                        body = json.loads(message["Body"])
-                        msg_correlation_id = body.get("correlation_id")
-                        
-                        if msg_correlation_id == correlation_id:
-                            self.sqs.delete_message(
-                                QueueUrl=self.response_queue_url,
-                                ReceiptHandle=receipt_handle
-                            )
-                            
-                            logger.success(f"Response received - correlation_id: {correlation_id}")
-                            
-                            return {
-                                "success": True,
-                                "correlation_id": correlation_id,
-                                "data": body.get("data"),
-                                "status": body.get("status", "OK")
-                            }
-                    
-                    except json.JSONDecodeError as jex:
-                        logger.error(f"Error decoding message: {str(jex)}")
-                        self.sqs.delete_message(
-                            QueueUrl=self.response_queue_url,
-                            ReceiptHandle=receipt_handle
-                        )
-                        
+                if expected == 0 and not early:
+                    breaker.record_success()
+                
+                chunk = result.get("chunk") or {"seq": expected, "last": True}
+                early[chunk["seq"]] = result
+                
+                while expected in early:
+                    result = early.pop(expected)
+                    expected += 1
+                    yield result
+                    if (result.get("chunk") or {"last": True})["last"]:
+                        return
+        finally:
+            self._streams.pop(correlation_id, None)
+
+
+
+    async def stop_listener(self):
+        # The next RPC starts a new one, on whatever loop it runs on
+        listener = self._listener
+        self._listener = None
+        
+        if listener is not None and not listener.done():
+            listener.cancel()
+            try:
+                await listener
+            except (asyncio.CancelledError, RuntimeError):
+                pass
+
+
+
+    async def close(self):
+        await self.stop_listener()
+        
+        if self._private_queue_url is not None:
+            await self._run(self.delete_private_response_queue)
+        
+        self._executor.shutdown(wait=False)
+        self._poll_executor.shutdown(wait=False)
+
+
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+
+
+    def _ensure_listener(self):
+        loop = asyncio.get_running_loop()
+        
+        if self._listener is not None and not self._listener.done() and self._loop is loop:
+            return
+        
+        # A new event loop (e.g. a restarted server) invalidates the old task and
+        # every future created on it
+        if self._loop is not loop:
+            self._pending.clear()
+            self._streams.clear()
+        
+        self._loop = loop
+        self._listener = loop.create_task(self._listen())
+
+
+
+    async def _listen(self):
+        loop = asyncio.get_running_loop()
+        logger.info(f"Async response listener started - queue: {self.response_queue_url}")
+        
+        while True:
+            try:
+                messages = await loop.run_in_executor(self._poll_executor, self._receive_responses)
+            except asyncio.CancelledError:
+                logger.info("Async response listener stopped")
+                raise
             except Exception as ex:
                 logger.error(f"Polling error: {str(ex)}")
+                await asyncio.sleep(1)
+                continue
+            
+            for message in messages:
+                self._dispatch(message)
+            
+            if messages:
+                # Deletes are not awaited so the next long-poll starts right away
+                loop.run_in_executor(
+                    self._executor,
+                    self._delete_batch,
+                    [message["ReceiptHandle"] for message in messages]
+                )
+
+
+
+    def _dispatch(self, message: Dict):
+        parsed = self._parse_response(message)
+        if parsed is None:
+            return
         
-        logger.warning(f"Timeout waiting for response - correlation_id: {correlation_id}")
-        return {
-            "success": False,
-            "error": f"Timeout after {self.TIMEOUT} seconds",
-            "correlation_id": correlation_id
-        }
\ No newline at end of file
+        correlation_id, result = parsed
+        
+        stream = self._streams.get(correlation_id)
+        if stream is not None:
+            stream.put_nowait(result)
+            return
+        
+        future = self._pending.pop(correlation_id, None)
+        
+        if future is None or future.done():
+            logger.debug(f"Discarding response without waiter - correlation_id: {correlation_id}")
+            return
+        
+        logger.success(f"Response received - correlation_id: {correlation_id}")
+        future.set_result(result)
@@ -0,0 +1,207 @@
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional
+from loguru import logger
+import math, threading, time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Reply status of an RPC refused by an open breaker (the routers answer 503)
+CIRCUIT_OPEN = "CIRCUIT_OPEN"
+
+
+def is_circuit_open(result: Dict) -> bool:
+    return result.get("status") == CIRCUIT_OPEN
+
+
+class CircuitBreaker:
+    # Closed until `failure_threshold` consecutive timeouts, then open: calls fail
+    # at once for `reset_timeout` seconds. After that it is half-open and lets a
+    # single probe through; a reply closes it again, another timeout re-opens it.
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 5.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.state = CLOSED
+        self.failures = 0
+        self.rejected = 0
+        self._opened_at = 0.0
+        # When the current half-open probe was let through, None if there is none
+        self._probe_started: Optional[float] = None
+        self._lock = threading.Lock()
+
+
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+
+            now = time.monotonic()
+            if self.state == OPEN and now - self._opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self._probe_started = None
+                logger.info(f"Circuit half-open - Event: {self.name}")
+
+            # A probe whose caller went away never reports back; retry after a while
+            if self.state == HALF_OPEN and (
+                self._probe_started is None or now - self._probe_started >= self.reset_timeout
+            ):
+                self._probe_started = now
+                return True
+
+            self.rejected += 1
+            return False
+
+
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info(f"Circuit closed - Event: {self.name}")
+            self.state = CLOSED
+            self.failures = 0
+            self._probe_started = None
+
+
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                logger.warning(f"Circuit open - Event: {self.name} - consecutive timeouts: {self.failures}")
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+                self._probe_started = None
+
+
+
+    def retry_after(self) -> float:
+        # Seconds until the next probe may go through
+        with self._lock:
+            if self.state != OPEN:
+                return 0.0
+            return max(self.reset_timeout - (time.monotonic() - self._opened_at), 0.0)
+
+
+class LatencyTracker:
+    # Recent reply latencies per event type. The timeout for an event type is
+    # `factor` times the `percentile` latency of the last `window` replies,
+    # clamped to [floor, ceiling]; the ceiling is used until `min_samples` replies
+    # have been seen. Recomputed every `refresh` samples, not on every call.
+
+    def __init__(
+        self,
+        window: int = 500,
+        percentile: float = 99.0,
+        factor: float = 3.0,
+        min_samples: int = 20,
+        floor: float = 1.0,
+        refresh: int = 10
+    ):
+        self.window = window
+        self.percentile = percentile
+        self.factor = factor
+        self.min_samples = min_samples
+        self.floor = floor
+        self.refresh = refresh
+
+        self._samples: Dict[str, Deque[float]] = {}
+        self._since_refresh: Dict[str, int] = {}
+        self._estimates: Dict[str, float] = {}
+        # Sorted copy of the window as of the last refresh, for latency_at()
+        self._ordered: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+
+
+    def record(self, event_type: str, latency: float):
+        with self._lock:
+            samples = self._samples.get(event_type)
+            if samples is None:
+                samples = self._samples[event_type] = deque(maxlen=self.window)
+            samples.append(latency)
+
+            count = self._since_refresh.get(event_type, 0) + 1
+            if count >= self.refresh and len(samples) >= self.min_samples:
+                ordered = self._ordered[event_type] = sorted(samples)
+                self._estimates[event_type] = _nearest_rank(ordered, self.percentile) * self.factor
+                count = 0
+            self._since_refresh[event_type] = count
+
+
+
+    def timeout(self, event_type: str, ceiling: float) -> float:
+        estimate = self._estimates.get(event_type)
+        if estimate is None:
+            return ceiling
+        return min(max(estimate, self.floor), ceiling)
+
+
+
+    def latency_at(self, event_type: str, percentile: float) -> Optional[float]:
+        # None until the event type has min_samples replies
+        ordered = self._ordered.get(event_type)
+        if not ordered:
+            return None
+        return _nearest_rank(ordered, percentile)
+
+
+class HedgePolicy:
+    # Opt-in hedging for idempotent RPCs. When an RPC of one of `event_types` has
+    # had no reply after the `percentile` latency of its event type, the same
+    # request (same correlation id) is published once more and the first reply
+    # wins. Every eligible RPC earns `budget` hedges, up to `burst` saved, so
+    # hedges stay below that fraction of the traffic even when everything is slow.
+
+    def __init__(
+        self,
+        event_types: Iterable[str],
+        percentile: float = 95.0,
+        budget: float = 0.05,
+        burst: float = 10.0,
+        min_delay: float = 0.005
+    ):
+        self.event_types = frozenset(event_types)
+        self.percentile = percentile
+        self.budget = budget
+        self.burst = burst
+        self.min_delay = min_delay
+
+        self.hedged = 0
+        self.over_budget = 0
+        self._tokens = 0.0
+        self._lock = threading.Lock()
+
+
+
+    def delay(self, event_type: str, latencies: LatencyTracker) -> Optional[float]:
+        # Seconds to wait before hedging this RPC, None if it must not be hedged
+        if event_type not in self.event_types:
+            return None
+        latency = latencies.latency_at(event_type, self.percentile)
+        if latency is None:
+            return None
+
+        with self._lock:
+            self._tokens = min(self._tokens + self.budget, self.burst)
+        return max(latency, self.min_delay)
+
+
+
+    def acquire(self) -> bool:
+        with self._lock:
+            # Tolerance for the rounding of repeated budget additions (0.1 * 10 < 1)
+            if self._tokens >= 1 - 1e-9:
+                self._tokens = max(self._tokens - 1, 0.0)
+                self.hedged += 1
+                return True
+            self.over_budget += 1
+            return False
+
+
+def _nearest_rank(ordered: List[float], percentile: float) -> float:
+    return ordered[max(math.ceil(percentile / 100 * len(ordered)) - 1, 0)]
@@ -0,0 +1,175 @@
+from typing import Dict, Any, Iterable, List, Optional
+from loguru import logger
+import json, boto3
+
+# AWS LocalStack Configuration demo
+AWS_REGION = 'sa-east-1'
+ENDPOINT_URL = 'http://localhost:4566'
+AWS_ACCESS_KEY = 'test'
+AWS_SECRET_KEY = 'test'
+
+# Publishers tag every message with its event_type and lane as SNS message
+# attributes; subscriptions filter on them so each queue only carries what its
+# consumer handles, with RPCs and fire-and-forget events on separate queues
+EVENT_TYPE_ATTRIBUTE = "event_type"
+LANE_ATTRIBUTE = "lane"
+
+RPC_LANE = "rpc"
+EVENT_LANE = "event"
+
+
+def lane_for(event_type: str) -> str:
+    # Same rule the consumer uses to decide whether a reply is expected
+    return RPC_LANE if "_RPC" in event_type else EVENT_LANE
+
+
+def split_lanes(event_types: Iterable[str]) -> Dict[str, List[str]]:
+    lanes: Dict[str, List[str]] = {RPC_LANE: [], EVENT_LANE: []}
+    for event_type in event_types:
+        lanes[lane_for(event_type)].append(event_type)
+    return lanes
+
+
+def event_type_attributes(event_type: str) -> Dict[str, Dict[str, str]]:
+    return {
+        EVENT_TYPE_ATTRIBUTE: {"DataType": "String", "StringValue": event_type},
+        LANE_ATTRIBUTE: {"DataType": "String", "StringValue": lane_for(event_type)},
+    }
+
+
+def lane_filter_policy(lane: str) -> Dict[str, Any]:
+    # Lane only, for subscriptions created before their service has started
+    # (localstack-init, LocalCluster); untagged messages go to the RPC lane
+    return {LANE_ATTRIBUTE: [RPC_LANE, {"exists": False}] if lane == RPC_LANE else [lane]}
+
+
+def filter_policy(event_types: Iterable[str], lane: Optional[str] = None) -> Dict[str, Any]:
+    # Untagged messages (publishers from before the attributes existed) still go
+    # to every single-lane queue, and to the RPC lane only when lanes are split
+    policy: Dict[str, Any] = {EVENT_TYPE_ATTRIBUTE: sorted(set(event_types))}
+    if lane is None or lane == RPC_LANE:
+        policy[EVENT_TYPE_ATTRIBUTE].append({"exists": False})
+    if lane is not None:
+        policy.update(lane_filter_policy(lane))
+    return policy
+
+
+def apply_filter_policy(
+    topic_arn: str,
+    queue_url: str,
+    event_types: Iterable[str],
+    sns_client: Any = None,
+    sqs_client: Any = None,
+    lane: Optional[str] = None
+) -> bool:
+    # Installs the policy on the topic's subscription(s) for queue_url; False if
+    # there was nothing to update or the broker refused, the queue then keeps
+    # receiving every message and the consumer skips the ones it cannot handle
+    sns = sns_client or _client("sns")
+    sqs = sqs_client or _client("sqs")
+    policy = json.dumps(filter_policy(event_types, lane))
+
+    try:
+        subscription_arns = _queue_subscriptions(sns, sqs, topic_arn, queue_url)
+        for subscription_arn in subscription_arns:
+            sns.set_subscription_attributes(
+                SubscriptionArn=subscription_arn,
+                AttributeName="FilterPolicy",
+                AttributeValue=policy
+            )
+    except Exception as ex:
+        logger.warning(f"Could not apply filter policy to {queue_url}: {str(ex)}")
+        return False
+
+    if not subscription_arns:
+        logger.warning(f"No subscription of {topic_arn} delivers to {queue_url}, filter policy not applied")
+        return False
+
+    logger.info(f"Filter policy applied - queue: {queue_url} - {policy}")
+    return True
+
+
+def apply_lane_policies(
+    topic_arn: str,
+    queue_url: str,
+    events_queue_url: str,
+    event_types: Iterable[str],
+    sns_client: Any = None,
+    sqs_client: Any = None
+) -> bool:
+    # queue_url becomes the RPC lane and events_queue_url the event lane; True
+    # only if both policies were applied
+    sns = sns_client or _client("sns")
+    sqs = sqs_client or _client("sqs")
+    lanes = split_lanes(event_types)
+
+    try:
+        has_event_lane = bool(_queue_subscriptions(sns, sqs, topic_arn, events_queue_url))
+    except Exception as ex:
+        logger.warning(f"Could not look up the event lane {events_queue_url}: {str(ex)}")
+        return False
+
+    if not has_event_lane:
+        # Single-queue deployment: nothing can be delivered twice, so queue_url
+        # keeps every event type and no event is dropped
+        logger.warning(f"No subscription of {topic_arn} delivers to {events_queue_url}, lanes not split")
+        apply_filter_policy(topic_arn, queue_url, event_types, sns, sqs)
+        return False
+
+    # Both subscriptions are lane-split when created (lane_filter_policy), so if
+    # the second call fails the queues still carry disjoint lanes: one of them is
+    # just not narrowed to this service's event types until the next apply
+    if not apply_filter_policy(topic_arn, queue_url, lanes[RPC_LANE], sns, sqs, lane=RPC_LANE):
+        return False
+    return apply_filter_policy(topic_arn, events_queue_url, lanes[EVENT_LANE], sns, sqs, lane=EVENT_LANE)
+
+
+def _queue_subscriptions(sns: Any, sqs: Any, topic_arn: str, queue_url: str) -> List[str]:
+    queue_arn = sqs.get_queue_attributes(QueueUrl=queue_url, AttributeNames=["QueueArn"])["Attributes"]["QueueArn"]
+    return [
+        subscription["SubscriptionArn"]
+        for subscription in _subscriptions(sns, topic_arn)
+        if subscription.get("Endpoint") == queue_arn
+    ]
+
+
+def _subscriptions(sns: Any, topic_arn: str):
+    kwargs = {"TopicArn": topic_arn}
+    while True:
+        page = sns.list_subscriptions_by_topic(**kwargs)
+        yield from page.get("Subscriptions", [])
+        if not page.get("NextToken"):
+            return
+        kwargs["NextToken"] = page["NextToken"]
+
+
+def _client(service: str) -> Any:
+    return boto3.client(
+        service,
+        region_name=AWS_REGION,
+        endpoint_url=ENDPOINT_URL,
+        aws_access_key_id=AWS_ACCESS_KEY,
+        aws_secret_access_key=AWS_SECRET_KEY
+    )
+
+
+def main(services: Optional[Dict[str, Any]] = None):
+    # Re-applies every service's policies without restarting them (make filter-policies)
+    from core.publisher import TOPIC_ARN
+
+    if services is None:
+        from apis.users import main as users_service
+        from apis.users.repository import UserRepository
+        from apis.statistics import main as statistics_service
+        from apis.statistics.repository import StatisticsRepository
+        services = {
+            users_service: users_service.build_event_handlers(UserRepository()),
+            statistics_service: statistics_service.build_event_handlers(StatisticsRepository()),
+        }
+
+    for service, event_types in services.items():
+        apply_lane_policies(TOPIC_ARN, service.QUEUE_URL, service.EVENTS_QUEUE_URL, event_types)
+
+
+if __name__ == "__main__":
+    main()
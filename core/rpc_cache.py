@@ -0,0 +1,111 @@
+from typing import Dict, Any, Set, Tuple
+from loguru import logger
+import asyncio, json, time
+
+
+class RPCCache:
+    # Read-through cache for idempotent RPCs: concurrent identical calls share
+    # one in-flight request (single-flight) and successful results are served
+    # for `ttl` seconds, so a polling storm costs one broker round trip per TTL.
+
+    def __init__(self, ttl: float = 1.0, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        # (event_type, payload) -> (expires_at, result)
+        self._entries: Dict[Tuple[str, str], Tuple[float, Dict]] = {}
+        self._in_flight: Dict[Tuple[str, str], asyncio.Task] = {}
+        # Bumped on invalidation so calls already in flight don't store stale results
+        self._generations: Dict[str, int] = {}
+        # published event_type -> RPC event_types it makes stale
+        self._invalidations: Dict[str, Set[str]] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+
+
+    async def call_rpc(self, publisher: Any, event_type: str, payload: Dict[str, Any]) -> Dict:
+        key = (event_type, json.dumps(payload, sort_keys=True, default=str))
+
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self.hits += 1
+            return entry[1]
+
+        loop = asyncio.get_running_loop()
+        task = self._in_flight.get(key)
+
+        # A task from another (finished) event loop can never be awaited here
+        if task is None or task.get_loop() is not loop:
+            self.misses += 1
+            task = loop.create_task(self._fetch(key, publisher, event_type, payload))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.coalesced += 1
+            logger.debug(f"Coalesced RPC - Event: {event_type}")
+
+        # Shielded: a caller that disconnects must not cancel the call for everyone else
+        return await asyncio.shield(task)
+
+
+
+    def invalidate_on(self, published_event_type: str, *rpc_event_types: str):
+        self._invalidations.setdefault(published_event_type, set()).update(rpc_event_types)
+
+
+
+    def on_publish(self, event_type: str, payload: Dict[str, Any]):
+        stale = self._invalidations.get(event_type)
+        if stale:
+            self.invalidate(*stale)
+
+
+
+    def invalidate(self, *event_types: str):
+        for event_type in event_types:
+            self._generations[event_type] = self._generations.get(event_type, 0) + 1
+        for key in [key for key in self._entries if key[0] in event_types]:
+            del self._entries[key]
+        # Calls already in flight may answer from before the change: their current
+        # callers still get that result, later callers start a fresh RPC
+        for key in [key for key in self._in_flight if key[0] in event_types]:
+            del self._in_flight[key]
+
+
+
+    def clear(self):
+        self._entries.clear()
+        self._in_flight.clear()
+        self._generations.clear()
+        self.hits = self.misses = self.coalesced = 0
+
+
+
+    async def _fetch(self, key: Tuple[str, str], publisher: Any, event_type: str, payload: Dict[str, Any]) -> Dict:
+        generation = self._generations.get(event_type, 0)
+        result = await publisher.call_rpc(event_type=event_type, payload=payload)
+
+        # Failures are shared with the coalesced callers but never cached
+        if result.get("success") and self._generations.get(event_type, 0) == generation:
+            self._store(key, result)
+        return result
+
+
+
+    def _store(self, key: Tuple[str, str], result: Dict):
+        if key not in self._entries and len(self._entries) >= self.max_entries:
+            now = time.monotonic()
+            for stale in [k for k, (expires_at, _) in self._entries.items() if expires_at <= now]:
+                del self._entries[stale]
+            if len(self._entries) >= self.max_entries:
+                del self._entries[next(iter(self._entries))]
+        self._entries[key] = (time.monotonic() + self.ttl, result)
+
+
+
+    def _forget(self, key: Tuple[str, str], task: asyncio.Task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
@@ -8,8 +8,16 @@ echo "--- Initializing SQS and SNS in $AWS_DEFAULT_REGION ---"
 awslocal sqs create-queue --queue-name users-queue
 awslocal sqs create-queue --queue-name statistics-queue
 
+# Event lanes: fire-and-forget events, polled after the RPC queues above
+awslocal sqs create-queue --queue-name users-events-queue
+awslocal sqs create-queue --queue-name statistics-events-queue
+
 awslocal sqs create-queue --queue-name beeneu-response-queue
 
+# Feeds the optional gateway statistics view (settings.statistics_view); short
+# retention so it never piles up while the view is disabled
+awslocal sqs create-queue --queue-name gateway-statistics-queue --attributes MessageRetentionPeriod=300
+
 awslocal sns create-topic --name beeneu-topic
 
 USERS_QUEUE_URL=$(awslocal sqs get-queue-url --queue-name users-queue --query 'QueueUrl' --output text)
@@ -18,22 +26,62 @@ USERS_QUEUE_ARN=$(awslocal sqs get-queue-attributes --queue-url "$USERS_QUEUE_UR
 STATISTICS_QUEUE_URL=$(awslocal sqs get-queue-url --queue-name statistics-queue --query 'QueueUrl' --output text)
 STATISTICS_QUEUE_ARN=$(awslocal sqs get-queue-attributes --queue-url "$STATISTICS_QUEUE_URL" --attribute-names QueueArn --query 'Attributes.QueueArn' --output text)
 
+USERS_EVENTS_QUEUE_URL=$(awslocal sqs get-queue-url --queue-name users-events-queue --query 'QueueUrl' --output text)
+USERS_EVENTS_QUEUE_ARN=$(awslocal sqs get-queue-attributes --queue-url "$USERS_EVENTS_QUEUE_URL" --attribute-names QueueArn --query 'Attributes.QueueArn' --output text)
+
+STATISTICS_EVENTS_QUEUE_URL=$(awslocal sqs get-queue-url --queue-name statistics-events-queue --query 'QueueUrl' --output text)
+STATISTICS_EVENTS_QUEUE_ARN=$(awslocal sqs get-queue-attributes --queue-url "$STATISTICS_EVENTS_QUEUE_URL" --attribute-names QueueArn --query 'Attributes.QueueArn' --output text)
+
 TOPIC_ARN=$(awslocal sns list-topics --query "Topics[?contains(TopicArn, 'beeneu-topic')].TopicArn" --output text)
 
 # Fan-out
+# Raw delivery: queues receive the published body and message attributes (codec)
+# as-is instead of an SNS JSON envelope that would need a second decode.
+# The service queues are split by lane from the start (RPCs and untagged messages
+# to <service>-queue, events to <service>-events-queue), so nothing published
+# before a service starts lands in both of its queues. At startup each service
+# also narrows them to the event types in its handler table (core/routing.py,
+# `make filter-policies`).
+RPC_LANE_ATTRIBUTES='{"RawMessageDelivery":"true","FilterPolicy":"{\"lane\":[\"rpc\",{\"exists\":false}]}"}'
+EVENT_LANE_ATTRIBUTES='{"RawMessageDelivery":"true","FilterPolicy":"{\"lane\":[\"event\"]}"}'
 
 awslocal sns subscribe \
     --topic-arn "$TOPIC_ARN" \
     --protocol sqs \
-    --notification-endpoint "$USERS_QUEUE_ARN"
+    --notification-endpoint "$USERS_QUEUE_ARN" \
+    --attributes "$RPC_LANE_ATTRIBUTES"
+
+awslocal sns subscribe \
+    --topic-arn "$TOPIC_ARN" \
+    --protocol sqs \
+    --notification-endpoint "$STATISTICS_QUEUE_ARN" \
+    --attributes "$RPC_LANE_ATTRIBUTES"
+
+awslocal sns subscribe \
+    --topic-arn "$TOPIC_ARN" \
+    --protocol sqs \
+    --notification-endpoint "$USERS_EVENTS_QUEUE_ARN" \
+    --attributes "$EVENT_LANE_ATTRIBUTES"
+
+awslocal sns subscribe \
+    --topic-arn "$TOPIC_ARN" \
+    --protocol sqs \
+    --notification-endpoint "$STATISTICS_EVENTS_QUEUE_ARN" \
+    --attributes "$EVENT_LANE_ATTRIBUTES"
+
+GATEWAY_STATISTICS_QUEUE_URL=$(awslocal sqs get-queue-url --queue-name gateway-statistics-queue --query 'QueueUrl' --output text)
+GATEWAY_STATISTICS_QUEUE_ARN=$(awslocal sqs get-queue-attributes --queue-url "$GATEWAY_STATISTICS_QUEUE_URL" --attribute-names QueueArn --query 'Attributes.QueueArn' --output text)
 
 awslocal sns subscribe \
     --topic-arn "$TOPIC_ARN" \
     --protocol sqs \
-    --notification-endpoint "$STATISTICS_QUEUE_ARN"
+    --notification-endpoint "$GATEWAY_STATISTICS_QUEUE_ARN" \
+    --attributes RawMessageDelivery=true
 
 echo "--- Infrastructure created ---"
 echo "Topic ARN: $TOPIC_ARN"
 echo "Users Queue URL: $USERS_QUEUE_URL"
 echo "Statistics Queue URL: $STATISTICS_QUEUE_URL"
+echo "Users Events Queue URL: $USERS_EVENTS_QUEUE_URL"
+echo "Statistics Events Queue URL: $STATISTICS_EVENTS_QUEUE_URL"
 awslocal sqs get-queue-url --queue-name beeneu-response-queue
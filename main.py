@@ -1,11 +1,47 @@
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from loguru import logger
-import settings, uvicorn
+import asyncio, settings, uvicorn
+
+from core.publisher import TOPIC_ARN, default_async_publisher_service, shutdown_publisher_services
+from core.routing import apply_filter_policy
+from core.resilience import HedgePolicy
+from apis.statistics.view import enable_statistics_view, disable_statistics_view
 
 from apis.users.router import router as users_router
 from apis.statistics.router import router as statistics_router
 
+@asynccontextmanager
+async def lifespan(api: FastAPI):
+    if settings.private_response_queue:
+        publisher = default_async_publisher_service()
+        await asyncio.to_thread(publisher.create_private_response_queue, settings.private_response_queue_name)
+    
+    if settings.rpc_hedging:
+        default_async_publisher_service().hedging = HedgePolicy(
+            settings.rpc_hedge_event_types,
+            percentile=settings.rpc_hedge_percentile,
+            budget=settings.rpc_hedge_budget
+        )
+    
+    seeding = None
+    if settings.statistics_view:
+        view = enable_statistics_view(settings.statistics_view_queue, max_staleness=settings.statistics_view_max_staleness)
+        publisher = default_async_publisher_service()
+        await asyncio.to_thread(
+            apply_filter_policy, TOPIC_ARN, settings.statistics_view_queue, view.event_handlers, publisher.sns, publisher.sqs
+        )
+        seeding = asyncio.create_task(view.seed(default_async_publisher_service()))
+    
+    yield
+    
+    if seeding is not None:
+        seeding.cancel()
+    await asyncio.to_thread(disable_statistics_view)
+    await shutdown_publisher_services()
+
+
 def init_app():
     logger.info(f"Starting {settings.project_name}")
 
@@ -13,7 +49,8 @@ def init_app():
         title=settings.project_name,
         version=settings.project_version,
         debug=settings.debug,
-        redirect_slashes=False
+        redirect_slashes=False,
+        lifespan=lifespan
     ) 
     
     api.add_middleware(
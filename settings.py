@@ -2,4 +2,35 @@ project_name = "Prueba técnica Beeneu"
 project_version = "0.0.1"
 debug = False
 origins = ["http://localhost:3000"]
-port = 8000
\ No newline at end of file
+port = 8000
+
+# Gateway-side statistics read model (apis/statistics/view.py): when enabled the
+# /statistics routes are answered from memory instead of an RPC
+statistics_view = False
+statistics_view_queue = "http://localhost:4566/000000000000/gateway-statistics-queue"
+statistics_view_max_staleness = 10.0
+
+# Dashboards poll the /statistics counters: identical concurrent calls share one
+# RPC (core/rpc_cache.py) and results are reused for statistics_cache_ttl seconds
+statistics_cache_ttl = 1.0
+
+# Gateway micro-batching (core/micro_batcher.py): concurrent /users/register and
+# /users/update calls are sent as one batch RPC per window of up to
+# micro_batch_max_items requests or micro_batch_max_delay seconds
+micro_batching = False
+micro_batch_max_items = 50
+micro_batch_max_delay = 0.005
+
+# Per-instance response queue: each gateway process creates its own and sends it as
+# reply_to, so several instances never steal each other's replies. Set a name to
+# claim a fixed queue (e.g. one per pod) instead of a generated one
+private_response_queue = False
+private_response_queue_name = None
+
+# Hedged reads (core/resilience.py HedgePolicy): an idempotent RPC still unanswered
+# after the rpc_hedge_percentile latency of its event type is sent once more and
+# the first reply wins; hedges stay below rpc_hedge_budget of those RPCs
+rpc_hedging = False
+rpc_hedge_event_types = ["LIST_USERS_RPC", "TOTAL_USERS_RPC", "TOTAL_UPDATES_RPC", "REGISTERED_LAST_24_RPC"]
+rpc_hedge_percentile = 95.0
+rpc_hedge_budget = 0.05
@@ -1,6 +1,6 @@
 import pytest
 from fastapi.testclient import TestClient
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, AsyncMock
 from datetime import datetime
 from zoneinfo import ZoneInfo
 import sys
@@ -36,6 +36,8 @@ def sample_user_with_id():
 @pytest.fixture
 def mock_publisher():
     mock = MagicMock()
+    mock.call_rpc = AsyncMock()
+    mock.publish = AsyncMock()
     mock.call_rpc.return_value = {
         "success": True,
         "data": {"id": 1, "name": "Test User"},
@@ -52,38 +54,46 @@ def mock_publisher():
 def reset_users_state():
     from apis.users.repository import UserRepository
     repo = UserRepository()
-    original_users = repo.users.copy()
-    original_count = repo._updates_count
+    original = repo.export_snapshot()
     
-    repo.users.clear()
+    repo.clear()
     repo._updates_count = 0
     
     yield
     
-    repo.users.clear()
-    repo.users.extend(original_users)
-    repo._updates_count = original_count
+    repo.import_snapshot(original)
 
 
 @pytest.fixture
 def reset_statistics_state():
-    from apis.statistics.repository import StatisticsRepository
+    from apis.statistics.repository import EpochSequences, StatisticsRepository
+    from apis.statistics.timeseries import RegistrationTimeline
     repo = StatisticsRepository()
     
     original_total_users = repo._total_users
     original_total_updates = repo._total_updates
-    original_timeline = repo._user_registration_timeline.copy()
+    original_timeline = repo._user_registration_timeline
+    original_sequences = (repo._registered, repo._updated)
     
     repo._total_users = 0
     repo._total_updates = 0
-    repo._user_registration_timeline.clear()
+    repo._user_registration_timeline = RegistrationTimeline()
+    repo._registered, repo._updated = EpochSequences(), EpochSequences()
     
     yield
     
     repo._total_users = original_total_users
     repo._total_updates = original_total_updates
-    repo._user_registration_timeline.clear()
-    repo._user_registration_timeline.extend(original_timeline)
+    repo._user_registration_timeline = original_timeline
+    repo._registered, repo._updated = original_sequences
+
+
+@pytest.fixture(autouse=True)
+def clear_statistics_cache():
+    from apis.statistics.router import statistics_cache
+    statistics_cache.clear()
+    yield
+    statistics_cache.clear()
 
 
 @pytest.fixture
@@ -0,0 +1,209 @@
+import asyncio
+import json
+import time
+import pytest
+import httpx
+from benchmarks import loadtest
+from benchmarks.cluster import LocalCluster
+from apis.users.event_dispatcher import EventHandlers
+from apis.users.repository import UserRepository
+from apis.users import router as users_router
+import settings
+
+
+async def wait_until(condition, timeout=3.0):
+    # Awaits condition() every 20 ms until it is true or timeout seconds pass
+    deadline = time.monotonic() + timeout
+    while not await condition():
+        if time.monotonic() >= deadline:
+            return False
+        await asyncio.sleep(0.02)
+    return True
+
+
+async def answers(client, url, expected, params=None):
+    return (await client.get(url, params=params)).json() == expected
+
+
+@pytest.fixture
+async def cluster_client(reset_users_state, reset_statistics_state):
+    async with LocalCluster(polling_time=0.1) as cluster:
+        transport = httpx.ASGITransport(app=cluster.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://gateway") as client:
+            yield client
+
+
+@pytest.mark.integration
+class TestLocalCluster:
+
+    async def test_register_list_update_and_statistics(self, cluster_client, sample_user):
+        registered = await cluster_client.post("/users/register", json=sample_user)
+        assert registered.status_code == 200
+        user_id = registered.json()["user"]["id"]
+
+        updated = await cluster_client.put("/users/update", json={"id": user_id, "address": "456 Side St"})
+        assert updated.status_code == 200
+
+        listed = await cluster_client.get("/users/", params={"dni": sample_user["dni"]})
+        assert listed.status_code == 200
+        assert [user["address"] for user in listed.json()["users"]] == ["456 Side St"]
+
+        # USER_REGISTERED_EVENT reaches the statistics service asynchronously
+        assert await wait_until(lambda: answers(cluster_client, "/statistics/total-users", {"total_users": 1}))
+
+        expected = {"total_users": 1, "total_updates": 1, "registered": {"1h": 1, "24h": 1}}
+        assert await wait_until(lambda: answers(cluster_client, "/statistics/summary", expected, {"windows": "1h,24h"}))
+
+
+    async def test_paging_and_streaming_users(self, cluster_client, monkeypatch):
+        monkeypatch.setattr(EventHandlers, "STREAM_CHUNK_SIZE", 7)
+        repository = UserRepository()
+        for index in range(30):
+            repository.create({"name": "Ana", "surname": "Sosa", "dni": str(index), "address": "Calle 1"})
+
+        ids, cursor = [], None
+        while True:
+            params = {"limit": 8, **({"cursor": cursor} if cursor else {})}
+            page = (await cluster_client.get("/users/", params=params)).json()
+            ids.extend(user["id"] for user in page["users"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        assert ids == list(range(1, 31))
+
+        streamed = await cluster_client.get("/users/stream")
+        assert streamed.status_code == 200
+        assert [json.loads(line)["id"] for line in streamed.text.splitlines()] == list(range(1, 31))
+
+
+    async def test_bulk_register_and_update_reach_statistics(self, cluster_client):
+        users = [{"name": "Ana", "surname": "Sosa", "dni": str(index), "address": "Calle 1"} for index in range(25)]
+        users[3] = {"name": "Ana"}
+
+        response = await cluster_client.post("/users/register/bulk", json={"users": users})
+        assert response.status_code == 200
+        assert (response.json()["created"], response.json()["failed"]) == (24, 1)
+
+        assert await wait_until(lambda: answers(cluster_client, "/statistics/total-users", {"total_users": 24}))
+
+        patches = [{"id": user_id, "address": "Calle 2"} for user_id in range(1, 11)] + [{"id": 999, "address": "x"}]
+        response = await cluster_client.put("/users/update/bulk", json={"users": patches})
+        assert (response.json()["updated"], response.json()["failed"]) == (10, 1)
+
+        assert await wait_until(lambda: answers(cluster_client, "/statistics/total-updates", {"total_updates": 10}))
+
+
+    async def test_micro_batched_registers_and_updates(self, cluster_client, sample_user, monkeypatch):
+        monkeypatch.setattr(settings, "micro_batching", True)
+        monkeypatch.setattr(users_router.register_batcher, "batches", 0)
+        monkeypatch.setattr(users_router.register_batcher, "max_delay", 0.02)
+
+        users = [{**sample_user, "dni": str(index)} for index in range(20)]
+        registered = await asyncio.gather(*(cluster_client.post("/users/register", json=user) for user in users))
+        assert all(response.status_code == 200 for response in registered)
+        assert sorted(response.json()["user"]["id"] for response in registered) == list(range(1, 21))
+        assert {response.json()["user"]["dni"] for response in registered} == {user["dni"] for user in users}
+        assert users_router.register_batcher.batches < 20
+
+        updated, missing = await asyncio.gather(
+            cluster_client.put("/users/update", json={"id": 1, "address": "Calle 2"}),
+            cluster_client.put("/users/update", json={"id": 999, "address": "Calle 2"})
+        )
+        assert updated.json()["user"]["address"] == "Calle 2"
+        assert missing.status_code == 404
+
+        assert await wait_until(lambda: answers(cluster_client, "/statistics/total-users", {"total_users": 20}))
+
+
+    async def test_micro_batched_updates_to_one_user_apply_in_reply_order(self, cluster_client, sample_user, monkeypatch):
+        monkeypatch.setattr(settings, "micro_batching", True)
+        # One item per batch, so each update is its own UPDATE_USERS_BATCH_RPC
+        monkeypatch.setattr(users_router.update_batcher, "max_items", 1)
+        await cluster_client.post("/users/register", json=sample_user)
+
+        updates = await asyncio.gather(*(
+            cluster_client.put("/users/update", json={"id": 1, "address": f"Calle {index}"}) for index in range(4)
+        ))
+        users = [response.json()["user"] for response in updates]
+
+        # The update stamped last is the one the users service applied last
+        assert len({user["updated_at"] for user in users}) == 4
+        latest = max(users, key=lambda user: user["updated_at"])
+        listed = await cluster_client.get("/users/", params={"dni": sample_user["dni"]})
+        assert listed.json()["users"][0]["address"] == latest["address"]
+
+
+    async def test_statistics_view_answers_from_memory(self, reset_users_state, reset_statistics_state, sample_user):
+        async with LocalCluster(polling_time=0.1, statistics_view=True) as cluster:
+            transport = httpx.ASGITransport(app=cluster.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://gateway") as client:
+                await client.post("/users/register", json=sample_user)
+
+                response = None
+
+                async def view_answers():
+                    nonlocal response
+                    response = await client.get("/statistics/total-users")
+                    return response.headers.get("X-Statistics-Source") == "view" and response.json()["total_users"] == 1
+
+                assert await wait_until(view_answers)
+
+        assert response.json() == {"total_users": 1}
+        assert response.headers["X-Statistics-Source"] == "view"
+        assert float(response.headers["X-Statistics-Staleness"]) < 1
+
+
+@pytest.mark.integration
+class TestLoadTestRun:
+
+    def test_end_to_end_run_writes_results(self, tmp_path, reset_users_state, reset_statistics_state, monkeypatch):
+        output = tmp_path / "results.json"
+        monkeypatch.setattr("sys.argv", [
+            "loadtest", "--requests", "40", "--concurrency", "4", "--preload", "5",
+            "--latency", "0", "--jitter", "0", "--output", str(output), "--verbose"
+        ])
+
+        loadtest.main()
+
+        result = json.loads(output.read_text())
+        assert result["overall"]["requests"] == 40
+        assert result["overall"]["errors"] == 0
+        assert set(result["endpoints"]) <= set(loadtest.ENDPOINTS)
+
+    def test_micro_batching_run(self, tmp_path, reset_users_state, reset_statistics_state, monkeypatch):
+        # Restored afterwards: loadtest.main() overwrites them from its flags
+        monkeypatch.setattr(settings, "micro_batching", False)
+        for batcher in (users_router.register_batcher, users_router.update_batcher):
+            monkeypatch.setattr(batcher, "max_items", batcher.max_items)
+            monkeypatch.setattr(batcher, "max_delay", batcher.max_delay)
+        output = tmp_path / "results.json"
+        monkeypatch.setattr("sys.argv", [
+            "loadtest", "--requests", "40", "--concurrency", "8", "--preload", "5", "--mix", "register=1,update=1",
+            "--micro-batching", "--batch-items", "4", "--batch-delay", "0.005",
+            "--latency", "0", "--jitter", "0", "--output", str(output), "--verbose"
+        ])
+
+        loadtest.main()
+
+        result = json.loads(output.read_text())
+        assert result["overall"]["errors"] == 0
+        assert result["config"]["micro_batching"] == {"enabled": True, "max_items": 4, "max_delay": 0.005}
+
+    def test_replay_file(self, tmp_path, reset_users_state, reset_statistics_state, monkeypatch):
+        replay = tmp_path / "requests.jsonl"
+        replay.write_text("\n".join([
+            json.dumps({"endpoint": "register", "method": "POST", "path": "/users/register",
+                        "json": {"name": "Ana", "surname": "Sosa", "dni": "1", "address": "Calle 1"}}),
+            json.dumps({"method": "GET", "path": "/statistics/total-users"}),
+        ]))
+        output = tmp_path / "results.json"
+        monkeypatch.setattr("sys.argv", [
+            "loadtest", "--requests", "4", "--concurrency", "1", "--replay", str(replay),
+            "--latency", "0", "--jitter", "0", "--output", str(output), "--verbose"
+        ])
+
+        loadtest.main()
+
+        result = json.loads(output.read_text())
+        assert result["endpoints"]["register"]["requests"] == 2
+        assert result["endpoints"]["/statistics/total-users"]["requests"] == 2
@@ -46,6 +46,20 @@ class TestTotalUsersEndpoint:
         
         assert response.status_code == 500
         assert "Statistics service unavailable" in response.json()["detail"]
+    
+    def test_get_total_users_circuit_open(self, test_client, mock_publisher):
+        mock_publisher.call_rpc.return_value = {
+            "success": False,
+            "error": "TOTAL_USERS_RPC is unavailable, retry later",
+            "status": "CIRCUIT_OPEN",
+            "retry_after": 2.4
+        }
+        
+        with patch('apis.statistics.router.publisher', mock_publisher):
+            response = test_client.get("/statistics/total-users")
+        
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "3"
 
 
 @pytest.mark.integration
@@ -140,3 +154,127 @@ class TestRegisteredLast24hEndpoint:
 
 
 
+
+
+@pytest.mark.integration
+class TestStatisticsCache:
+
+    def test_repeated_polls_reuse_one_rpc(self, test_client, mock_publisher):
+        mock_publisher.call_rpc.return_value = {"success": True, "data": {"total_users": 7}}
+
+        with patch('apis.statistics.router.publisher', mock_publisher):
+            responses = [test_client.get("/statistics/total-users") for _ in range(5)]
+
+        assert [response.json()["total_users"] for response in responses] == [7] * 5
+        mock_publisher.call_rpc.assert_called_once()
+
+    def test_registration_invalidates_total_users(self, test_client, mock_publisher):
+        from apis.statistics.router import statistics_cache
+        mock_publisher.call_rpc.return_value = {"success": True, "data": {"total_users": 7}}
+
+        with patch('apis.statistics.router.publisher', mock_publisher):
+            test_client.get("/statistics/total-users")
+            statistics_cache.on_publish("USER_REGISTERED_EVENT", {"id": 8})
+            mock_publisher.call_rpc.return_value = {"success": True, "data": {"total_users": 8}}
+            response = test_client.get("/statistics/total-users")
+
+        assert response.json()["total_users"] == 8
+        assert mock_publisher.call_rpc.call_count == 2
+
+
+@pytest.mark.integration
+class TestSummaryEndpoint:
+    
+    def test_get_summary_success(self, test_client, mock_publisher):
+        mock_publisher.call_rpc.return_value = {
+            "success": True,
+            "data": {"total_users": 5, "total_updates": 2, "registered": {"1h": 1, "7d": 5}}
+        }
+        
+        with patch('apis.statistics.router.publisher', mock_publisher):
+            response = test_client.get("/statistics/summary?windows=1h,7d,1h")
+        
+        assert response.status_code == 200
+        assert response.json() == {"total_users": 5, "total_updates": 2, "registered": {"1h": 1, "7d": 5}}
+        mock_publisher.call_rpc.assert_called_once_with(
+            event_type="STATISTICS_SUMMARY_RPC",
+            payload={"windows": ["1h", "7d"]}
+        )
+    
+    def test_get_summary_default_window(self, test_client, mock_publisher):
+        mock_publisher.call_rpc.return_value = {
+            "success": True,
+            "data": {"total_users": 0, "total_updates": 0, "registered": {"24h": 0}}
+        }
+        
+        with patch('apis.statistics.router.publisher', mock_publisher):
+            response = test_client.get("/statistics/summary")
+        
+        assert response.status_code == 200
+        mock_publisher.call_rpc.assert_called_once_with(
+            event_type="STATISTICS_SUMMARY_RPC",
+            payload={"windows": ["24h"]}
+        )
+    
+    @pytest.mark.parametrize("windows", ["5y", "0h", "45d", ",", ",".join(f"{n}h" for n in range(1, 12))])
+    def test_get_summary_invalid_windows(self, test_client, mock_publisher, windows):
+        with patch('apis.statistics.router.publisher', mock_publisher):
+            response = test_client.get("/statistics/summary", params={"windows": windows})
+        
+        assert response.status_code == 400
+        mock_publisher.call_rpc.assert_not_called()
+    
+    def test_get_summary_rpc_failure(self, test_client, mock_publisher):
+        mock_publisher.call_rpc.return_value = {"success": False, "error": "Timeout after 10 seconds"}
+        
+        with patch('apis.statistics.router.publisher', mock_publisher):
+            response = test_client.get("/statistics/summary")
+        
+        assert response.status_code == 500
+        assert "Timeout" in response.json()["detail"]
+
+
+@pytest.fixture
+def fresh_view(monkeypatch):
+    from apis.statistics import view as view_module
+    view = MagicMock()
+    view.repository = view_module.StatisticsRepository.detached()
+    view.repository.increment_total_users()
+    view.repository.increment_total_updates()
+    view.max_staleness = 10.0
+    view.staleness.return_value = 0.25
+    view.is_fresh.side_effect = lambda: view_module.StatisticsView.is_fresh(view)
+    monkeypatch.setattr(view_module, "_statistics_view", view)
+    return view
+
+
+@pytest.mark.integration
+class TestStatisticsViewRoutes:
+    
+    @pytest.mark.parametrize("path, expected", [
+        ("/statistics/total-users", {"total_users": 1}),
+        ("/statistics/total-updates", {"total_updates": 1}),
+        ("/statistics/registered-last-24h", {"registered_last_24h": 1}),
+        ("/statistics/summary?windows=1h", {"total_users": 1, "total_updates": 1, "registered": {"1h": 1}}),
+    ])
+    def test_served_from_view_without_rpc(self, test_client, mock_publisher, fresh_view, path, expected):
+        with patch('apis.statistics.router.publisher', mock_publisher):
+            response = test_client.get(path)
+        
+        assert response.status_code == 200
+        assert response.json() == expected
+        assert response.headers["X-Statistics-Source"] == "view"
+        assert response.headers["X-Statistics-Staleness"] == "0.250"
+        mock_publisher.call_rpc.assert_not_called()
+    
+    @pytest.mark.parametrize("staleness", [None, 30.0])
+    def test_unseeded_or_stale_view_falls_back_to_rpc(self, test_client, mock_publisher, fresh_view, staleness):
+        fresh_view.staleness.return_value = staleness
+        mock_publisher.call_rpc.return_value = {"success": True, "data": {"total_users": 42}}
+        
+        with patch('apis.statistics.router.publisher', mock_publisher):
+            response = test_client.get("/statistics/total-users")
+        
+        assert response.json()["total_users"] == 42
+        assert "X-Statistics-Source" not in response.headers
+        mock_publisher.call_rpc.assert_called_once()
@@ -1,5 +1,6 @@
+import json
 import pytest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 from fastapi.testclient import TestClient
 
 @pytest.mark.integration
@@ -52,7 +53,7 @@ class TestListUsersEndpoint:
         ]
         mock_publisher.call_rpc.return_value = {
             "success": True,
-            "data": mock_users
+            "data": {"users": mock_users, "next_cursor": None}
         }
         
         with patch('apis.users.router.publisher', mock_publisher):
@@ -60,8 +61,8 @@ class TestListUsersEndpoint:
         
         assert response.status_code == 200
         data = response.json()
-        assert "users" in data
         assert len(data["users"]) == 2
+        assert data["next_cursor"] is None
         
         mock_publisher.call_rpc.assert_called_once_with(
             event_type="LIST_USERS_RPC",
@@ -72,7 +73,7 @@ class TestListUsersEndpoint:
         mock_users = [{"id": 1, "name": "John", "surname": "Doe"}]
         mock_publisher.call_rpc.return_value = {
             "success": True,
-            "data": mock_users
+            "data": {"users": mock_users, "next_cursor": None}
         }
         
         with patch('apis.users.router.publisher', mock_publisher):
@@ -88,7 +89,7 @@ class TestListUsersEndpoint:
     def test_list_users_with_multiple_filters(self, test_client, mock_publisher):
         mock_publisher.call_rpc.return_value = {
             "success": True,
-            "data": []
+            "data": {"users": [], "next_cursor": None}
         }
         
         with patch('apis.users.router.publisher', mock_publisher):
@@ -111,6 +112,20 @@ class TestListUsersEndpoint:
             response = test_client.get("/users/")
         
         assert response.status_code == 500
+    
+    def test_list_users_circuit_open(self, test_client, mock_publisher):
+        mock_publisher.call_rpc.return_value = {
+            "success": False,
+            "error": "LIST_USERS_RPC is unavailable, retry later",
+            "status": "CIRCUIT_OPEN",
+            "retry_after": 0.5
+        }
+        
+        with patch('apis.users.router.publisher', mock_publisher):
+            response = test_client.get("/users/")
+        
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
 
 
 @pytest.mark.integration
@@ -139,6 +154,16 @@ class TestUpdateUserEndpoint:
         )
         
     
+    def test_update_user_keeps_sequence_fields_for_the_event_only(self, test_client, mock_publisher):
+        updated_user = {"id": 1, "name": "Jane", "surname": "Doe", "update_seq": 7, "users_epoch": 42}
+        mock_publisher.call_rpc.return_value = {"success": True, "data": updated_user}
+        
+        with patch('apis.users.router.publisher', mock_publisher):
+            response = test_client.put("/users/update", json={"id": 1, "name": "Jane"})
+        
+        assert response.json()["user"] == {"id": 1, "name": "Jane", "surname": "Doe"}
+        mock_publisher.publish.assert_called_once_with(event_type="USER_UPDATED_EVENT", payload=updated_user)
+    
     def test_update_user_missing_id(self, test_client, mock_publisher):
         update_payload = {"name": "Jane"}
         
@@ -194,3 +219,246 @@ class TestUpdateUserEndpoint:
             event_type="UPDATE_USER_RPC",
             payload=update_payload
         )
+
+
+@pytest.mark.integration
+class TestListUsersPagingEndpoint:
+    
+    def test_paged_list_returns_next_cursor(self, test_client, mock_publisher):
+        mock_publisher.call_rpc.return_value = {
+            "success": True,
+            "data": {"users": [{"id": 1}], "next_cursor": "abc"}
+        }
+        
+        with patch('apis.users.router.publisher', mock_publisher):
+            response = test_client.get("/users/", params={"limit": 1})
+        
+        assert response.status_code == 200
+        assert response.json() == {"users": [{"id": 1}], "next_cursor": "abc"}
+        mock_publisher.call_rpc.assert_called_once_with(
+            event_type="LIST_USERS_RPC",
+            payload={"name": None, "surname": None, "dni": None, "limit": 1, "cursor": None}
+        )
+    
+    def test_invalid_cursor_returns_400(self, test_client, mock_publisher):
+        mock_publisher.call_rpc.return_value = {
+            "success": True,
+            "data": {"error": "Validation error: invalid cursor"}
+        }
+        
+        with patch('apis.users.router.publisher', mock_publisher):
+            response = test_client.get("/users/", params={"cursor": "bad"})
+        
+        assert response.status_code == 400
+    
+    def test_limit_out_of_range_returns_422(self, test_client, mock_publisher):
+        with patch('apis.users.router.publisher', mock_publisher):
+            response = test_client.get("/users/", params={"limit": 0})
+        
+        assert response.status_code == 422
+        mock_publisher.call_rpc.assert_not_called()
+
+
+@pytest.mark.integration
+class TestStreamUsersEndpoint:
+    
+    def streaming(self, mock_publisher, chunks):
+        async def stream_rpc(event_type, payload):
+            for chunk in chunks:
+                yield chunk
+        mock_publisher.stream_rpc = stream_rpc
+    
+    def test_stream_returns_ndjson(self, test_client, mock_publisher):
+        self.streaming(mock_publisher, [
+            {"success": True, "data": {"users": [{"id": 1}, {"id": 2}]}},
+            {"success": True, "data": {"users": [{"id": 3}]}}
+        ])
+        
+        with patch('apis.users.router.publisher', mock_publisher):
+            response = test_client.get("/users/stream")
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        assert [json.loads(line)["id"] for line in response.text.splitlines()] == [1, 2, 3]
+    
+    def test_stream_first_chunk_error_returns_status(self, test_client, mock_publisher):
+        self.streaming(mock_publisher, [{"success": False, "error": "Timeout waiting for response"}])
+        
+        with patch('apis.users.router.publisher', mock_publisher):
+            response = test_client.get("/users/stream")
+        
+        assert response.status_code == 500
+        assert "Timeout" in response.json()["detail"]
+    
+    def test_stream_error_after_first_chunk_becomes_error_line(self, test_client, mock_publisher):
+        self.streaming(mock_publisher, [
+            {"success": True, "data": {"users": [{"id": 1}]}},
+            {"success": True, "data": {"error": "boom"}}
+        ])
+        
+        with patch('apis.users.router.publisher', mock_publisher):
+            response = test_client.get("/users/stream")
+        
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert lines == [{"id": 1}, {"error": "boom"}]
+
+
+@pytest.mark.integration
+class TestListUsersProjectionEndpoint:
+    
+    def test_fields_are_sent_as_list(self, test_client, mock_publisher):
+        mock_publisher.call_rpc.return_value = {
+            "success": True,
+            "data": {"users": [{"id": 1, "dni": "111"}], "next_cursor": None}
+        }
+        
+        with patch('apis.users.router.publisher', mock_publisher):
+            response = test_client.get("/users/", params={"fields": "id, dni"})
+        
+        assert response.status_code == 200
+        assert response.json() == {"users": [{"id": 1, "dni": "111"}], "next_cursor": None}
+        mock_publisher.call_rpc.assert_called_once_with(
+            event_type="LIST_USERS_RPC",
+            payload={"name": None, "surname": None, "dni": None, "fields": ["id", "dni"]}
+        )
+    
+    def test_count_only(self, test_client, mock_publisher):
+        mock_publisher.call_rpc.return_value = {"success": True, "data": {"count": 42}}
+        
+        with patch('apis.users.router.publisher', mock_publisher):
+            response = test_client.get("/users/", params={"name": "John", "count_only": "true"})
+        
+        assert response.json() == {"count": 42}
+        assert mock_publisher.call_rpc.call_args.kwargs["payload"]["count_only"] is True
+    
+    @pytest.mark.parametrize("fields", ["password", "id,secret", ","])
+    def test_invalid_fields_return_400_without_rpc(self, test_client, mock_publisher, fields):
+        with patch('apis.users.router.publisher', mock_publisher):
+            response = test_client.get("/users/", params={"fields": fields})
+        
+        assert response.status_code == 400
+        mock_publisher.call_rpc.assert_not_called()
+
+
+@pytest.mark.integration
+class TestRegisterUsersBulkEndpoint:
+    
+    def test_bulk_register_publishes_follow_ups_in_batch(self, test_client, sample_user, mock_publisher):
+        mock_publisher.publish_batch = AsyncMock(return_value={"success": True, "published": 2, "failed": []})
+        mock_publisher.call_rpc.return_value = {
+            "success": True,
+            "data": {
+                "created": 1,
+                "failed": 1,
+                "results": [{"index": 0, "user": {**sample_user, "id": 1}}, {"index": 1, "error": "Validation error: name"}]
+            }
+        }
+        
+        with patch('apis.users.router.publisher', mock_publisher):
+            response = test_client.post("/users/register/bulk", json={"users": [sample_user, {"name": ""}]})
+        
+        assert response.status_code == 200
+        assert response.json()["created"] == 1
+        assert response.json()["failed"] == 1
+        mock_publisher.call_rpc.assert_called_once_with(
+            event_type="REGISTER_USERS_BATCH_RPC",
+            payload={"users": [sample_user, {"name": ""}]}
+        )
+        mock_publisher.publish_batch.assert_awaited_once_with([
+            ("USER_REGISTERED_EVENT", {**sample_user, "id": 1}),
+            ("SEND_EMAIL", {"name": sample_user["name"], "surname": sample_user["surname"]})
+        ])
+        mock_publisher.publish.assert_not_called()
+    
+    def test_nothing_created_publishes_nothing(self, test_client, sample_user, mock_publisher):
+        mock_publisher.publish_batch = AsyncMock()
+        mock_publisher.call_rpc.return_value = {
+            "success": True,
+            "data": {"created": 0, "failed": 1, "results": [{"index": 0, "error": "Validation error"}]}
+        }
+        
+        with patch('apis.users.router.publisher', mock_publisher):
+            response = test_client.post("/users/register/bulk", json={"users": [{}]})
+        
+        assert response.status_code == 200
+        mock_publisher.publish_batch.assert_not_called()
+    
+    def test_rpc_failure_returns_500(self, test_client, sample_user, mock_publisher):
+        mock_publisher.call_rpc.return_value = {"success": False, "error": "Timeout after 10 seconds"}
+        
+        with patch('apis.users.router.publisher', mock_publisher):
+            response = test_client.post("/users/register/bulk", json={"users": [sample_user]})
+        
+        assert response.status_code == 500
+    
+    @pytest.mark.parametrize("users", [[], [{"name": "x"}] * 501])
+    def test_batch_size_limits(self, test_client, mock_publisher, users):
+        with patch('apis.users.router.publisher', mock_publisher):
+            response = test_client.post("/users/register/bulk", json={"users": users})
+        
+        assert response.status_code == 422
+        mock_publisher.call_rpc.assert_not_called()
+
+
+@pytest.mark.integration
+class TestUpdateUsersBulkEndpoint:
+    
+    def test_bulk_update_publishes_events_in_batch(self, test_client, mock_publisher):
+        mock_publisher.publish_batch = AsyncMock(return_value={"success": True, "published": 1, "failed": []})
+        mock_publisher.call_rpc.return_value = {
+            "success": True,
+            "data": {
+                "updated": 1,
+                "failed": 1,
+                "results": [{"index": 0, "user": {"id": 1, "address": "Calle 9"}}, {"index": 1, "error": "User with id 7 not found"}]
+            }
+        }
+        patches = [{"id": 1, "address": "Calle 9"}, {"id": 7, "address": "Calle 9"}]
+        
+        with patch('apis.users.router.publisher', mock_publisher):
+            response = test_client.put("/users/update/bulk", json={"users": patches})
+        
+        assert response.status_code == 200
+        assert (response.json()["updated"], response.json()["failed"]) == (1, 1)
+        mock_publisher.call_rpc.assert_called_once_with(event_type="UPDATE_USERS_BATCH_RPC", payload={"users": patches})
+        mock_publisher.publish_batch.assert_awaited_once_with([("USER_UPDATED_EVENT", {"id": 1, "address": "Calle 9"})])
+    
+    def test_validation_error_returns_400(self, test_client, mock_publisher):
+        mock_publisher.call_rpc.return_value = {"success": True, "data": {"error": "Validation error: users"}}
+        
+        with patch('apis.users.router.publisher', mock_publisher):
+            response = test_client.put("/users/update/bulk", json={"users": [{"id": 1}]})
+        
+        assert response.status_code == 400
+
+
+@pytest.mark.integration
+class TestMicroBatchedEndpoints:
+    
+    def test_register_goes_through_batch_rpc(self, test_client, sample_user, mock_publisher, monkeypatch):
+        monkeypatch.setattr("settings.micro_batching", True)
+        mock_publisher.call_rpc.return_value = {
+            "success": True,
+            "data": {"created": 1, "failed": 0, "results": [{"index": 0, "user": {**sample_user, "id": 1}}]}
+        }
+        
+        with patch('apis.users.router.publisher', mock_publisher):
+            response = test_client.post("/users/register", json=sample_user)
+        
+        assert response.status_code == 200
+        assert response.json()["user"]["id"] == 1
+        mock_publisher.call_rpc.assert_called_once_with(event_type="REGISTER_USERS_BATCH_RPC", payload={"users": [sample_user]})
+        assert mock_publisher.publish.call_count == 2
+    
+    def test_item_error_maps_to_status(self, test_client, mock_publisher, monkeypatch):
+        monkeypatch.setattr("settings.micro_batching", True)
+        mock_publisher.call_rpc.return_value = {
+            "success": True,
+            "data": {"updated": 0, "failed": 1, "results": [{"index": 0, "error": "User with id 9 not found"}]}
+        }
+        
+        with patch('apis.users.router.publisher', mock_publisher):
+            response = test_client.put("/users/update", json={"id": 9, "address": "x"})
+        
+        assert response.status_code == 404
+        mock_publisher.publish.assert_not_called()
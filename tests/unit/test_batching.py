@@ -0,0 +1,117 @@
+import threading
+import time
+import pytest
+from unittest.mock import MagicMock
+from core.batching import SQSBatchWriter
+
+
+@pytest.fixture
+def sqs():
+    client = MagicMock()
+    client.delete_message_batch.return_value = {"Successful": [], "Failed": []}
+    client.send_message_batch.return_value = {"Successful": [], "Failed": []}
+    return client
+
+
+@pytest.mark.unit
+class TestSQSBatchWriter:
+
+    def test_flushes_when_batch_is_full(self, sqs):
+        writer = SQSBatchWriter(lambda: sqs, "delete", max_delay=60)
+
+        for i in range(10):
+            writer.add("q", {"ReceiptHandle": f"rh-{i}"})
+
+        entries = sqs.delete_message_batch.call_args.kwargs["Entries"]
+        assert [entry["Id"] for entry in entries] == [str(i) for i in range(10)]
+        writer.close()
+
+    def test_flushes_after_deadline(self, sqs):
+        writer = SQSBatchWriter(lambda: sqs, "send", max_delay=0.02)
+
+        writer.add("q", {"MessageBody": "hello"})
+        time.sleep(0.2)
+
+        sqs.send_message_batch.assert_called_once_with(QueueUrl="q", Entries=[{"Id": "0", "MessageBody": "hello"}])
+        writer.close()
+
+    def test_batches_are_per_queue(self, sqs):
+        writer = SQSBatchWriter(lambda: sqs, "send", max_delay=60)
+
+        writer.add("q1", {"MessageBody": "a"})
+        writer.add("q2", {"MessageBody": "b"})
+        writer.close()
+
+        queues = sorted(call.kwargs["QueueUrl"] for call in sqs.send_message_batch.call_args_list)
+        assert queues == ["q1", "q2"]
+
+    def test_retryable_failures_are_resent_individually(self, sqs):
+        sqs.send_message_batch.return_value = {
+            "Successful": [{"Id": "0"}],
+            "Failed": [
+                {"Id": "1", "SenderFault": False, "Code": "InternalError"},
+                {"Id": "2", "SenderFault": True, "Code": "InvalidMessageContents"},
+            ]
+        }
+        writer = SQSBatchWriter(lambda: sqs, "send", max_delay=60)
+
+        for body in ("a", "b", "c"):
+            writer.add("q", {"MessageBody": body})
+        writer.flush()
+
+        sqs.send_message.assert_called_once_with(QueueUrl="q", MessageBody="b")
+
+    def test_failed_batch_call_falls_back_to_single_calls(self, sqs):
+        sqs.delete_message_batch.side_effect = Exception("throttled")
+        writer = SQSBatchWriter(lambda: sqs, "delete", max_delay=60)
+
+        writer.add("q", {"ReceiptHandle": "rh-0"})
+        writer.add("q", {"ReceiptHandle": "rh-1"})
+        writer.flush()
+
+        assert sqs.delete_message.call_count == 2
+
+    def test_oversized_batch_is_split(self, sqs):
+        writer = SQSBatchWriter(lambda: sqs, "send", max_delay=60)
+        body = "x" * (100 * 1024)
+
+        for _ in range(3):
+            writer.add("q", {"MessageBody": body})
+        writer.flush()
+
+        sizes = [len(call.kwargs["Entries"]) for call in sqs.send_message_batch.call_args_list]
+        assert sizes == [2, 1]
+
+    def test_send_when_idle_goes_out_at_once(self, sqs):
+        writer = SQSBatchWriter(lambda: sqs, "send", max_delay=60, send_when_idle=True)
+
+        writer.add("q", {"MessageBody": "hello"})
+
+        sqs.send_message_batch.assert_called_once_with(QueueUrl="q", Entries=[{"Id": "0", "MessageBody": "hello"}])
+        writer.close()
+
+    def test_send_when_idle_batches_entries_added_during_a_send(self, sqs):
+        writer = SQSBatchWriter(lambda: sqs, "send", max_delay=60, send_when_idle=True)
+        sending, release = threading.Event(), threading.Event()
+
+        def send_message_batch(QueueUrl, Entries):
+            if not sending.is_set():
+                sending.set()
+                release.wait(2)
+            return {"Successful": [], "Failed": []}
+
+        sqs.send_message_batch.side_effect = send_message_batch
+        first = threading.Thread(target=writer.add, args=("q", {"MessageBody": "a"}))
+        first.start()
+        assert sending.wait(2)
+
+        writer.add("q", {"MessageBody": "b"})
+        writer.add("q", {"MessageBody": "c"})
+        assert sqs.send_message_batch.call_count == 1
+
+        release.set()
+        first.join(2)
+
+        bodies = [[entry["MessageBody"] for entry in call.kwargs["Entries"]] for call in sqs.send_message_batch.call_args_list]
+        assert bodies == [["a"], ["b", "c"]]
+        writer.close()
@@ -0,0 +1,79 @@
+import json
+import pytest
+from core.codec import (
+    CODEC_ATTRIBUTE, CodecError, available_codecs, codec_attributes, decode_message, get_codec
+)
+
+USER = {"id": 1, "name": "María", "surname": "Pérez", "dni": "20345678", "address": "Av. Corrientes 1234", "active": None}
+
+
+@pytest.mark.unit
+class TestCodecs:
+
+    @pytest.mark.parametrize("name", available_codecs())
+    def test_round_trip(self, name):
+        codec = get_codec(name)
+
+        body = codec.encode({"users": [USER, USER]})
+
+        assert isinstance(body, str)
+        assert codec.decode(body) == {"users": [USER, USER]}
+
+    @pytest.mark.parametrize("name", available_codecs())
+    def test_invalid_body_raises_codec_error(self, name):
+        with pytest.raises(CodecError):
+            get_codec(name).decode("{not valid")
+
+    def test_unknown_codec(self):
+        with pytest.raises(CodecError):
+            get_codec("protobuf")
+
+    def test_json_codecs_share_wire_format(self):
+        pytest.importorskip("orjson")
+
+        assert get_codec("orjson").decode(get_codec("json").encode(USER)) == USER
+        assert json.loads(get_codec("orjson").encode(USER)) == USER
+
+
+@pytest.mark.unit
+class TestDecodeMessage:
+
+    def test_untagged_body_is_json(self):
+        body, codec = decode_message({"Body": json.dumps(USER)})
+
+        assert body == USER
+        assert codec == "json"
+
+    @pytest.mark.parametrize("name", available_codecs())
+    def test_raw_delivery_uses_attribute(self, name):
+        codec = get_codec(name)
+        message = {"Body": codec.encode(USER), "MessageAttributes": codec_attributes(codec)}
+
+        assert decode_message(message) == (USER, name)
+
+    @pytest.mark.parametrize("name", available_codecs())
+    def test_sns_envelope_uses_envelope_attribute(self, name):
+        codec = get_codec(name)
+        envelope = {
+            "Type": "Notification",
+            "Message": codec.encode(USER),
+            "MessageAttributes": {CODEC_ATTRIBUTE: {"Type": "String", "Value": name}}
+        }
+
+        assert decode_message({"Body": json.dumps(envelope)}) == (USER, name)
+
+    def test_legacy_envelope_without_attributes(self):
+        envelope = {"Message": json.dumps(USER)}
+
+        assert decode_message({"Body": json.dumps(envelope)}) == (USER, "json")
+
+    def test_benchmark_samples_use_the_real_message_shapes(self, reset_users_state):
+        from benchmarks.codec import sample_messages
+
+        event, reply = sample_messages(3).values()
+
+        assert event["event_type"] == "USER_REGISTERED_EVENT"
+        assert (event["payload"]["id"], "users_epoch" in event["payload"]) == (1, True)
+        assert set(reply) == {"correlation_id", "data", "status"}
+        assert [user["id"] for user in reply["data"]["users"]] == [1, 2, 3]
+        assert reply["data"]["next_cursor"] is None
@@ -0,0 +1,393 @@
+import json
+import threading
+import time
+import pytest
+from unittest.mock import MagicMock, patch
+from core.consumer import Consumer
+from core.local_broker import LocalBroker
+from core.codec import available_codecs, codec_attributes, get_codec
+
+
+def deleted_handles(consumer):
+    return [
+        entry["ReceiptHandle"]
+        for call in consumer.sqs.delete_message_batch.call_args_list
+        for entry in call.kwargs["Entries"]
+    ]
+
+
+def sqs_message(event_type, payload, correlation_id="cid", receipt_handle="rh"):
+    body = {"event_type": event_type, "correlation_id": correlation_id, "payload": payload}
+    return {"Body": json.dumps(body), "ReceiptHandle": receipt_handle}
+
+
+@pytest.fixture
+def make_consumer():
+    consumers = []
+
+    def factory(messages, **kwargs):
+        consumer = Consumer(queue_url="http://queue/users", response_queue_url="http://queue/response", **kwargs)
+        consumer.sqs = MagicMock()
+        consumer.sqs.receive_message.return_value = {"Messages": messages}
+        consumer.sqs.delete_message_batch.return_value = {"Successful": [], "Failed": []}
+        consumer.sqs.send_message_batch.return_value = {"Successful": [], "Failed": []}
+        consumers.append(consumer)
+        return consumer
+
+    yield factory
+
+    for consumer in consumers:
+        consumer.close(timeout=2)
+
+
+@pytest.mark.unit
+class TestConsumer:
+
+    def test_rpc_handler_sends_response_and_deletes(self, make_consumer):
+        consumer = make_consumer([sqs_message("TOTAL_USERS_RPC", {}, correlation_id="abc")])
+
+        consumer.consume({"TOTAL_USERS_RPC": lambda payload: {"total_users": 3}})
+        consumer.close(timeout=2)
+
+        call = consumer.sqs.send_message_batch.call_args
+        assert call.kwargs["QueueUrl"] == "http://queue/response"
+        sent = json.loads(call.kwargs["Entries"][0]["MessageBody"])
+        assert sent == {"correlation_id": "abc", "data": {"total_users": 3}, "status": "OK"}
+        assert deleted_handles(consumer) == ["rh"]
+
+    def test_event_without_handler_is_deleted(self, make_consumer):
+        consumer = make_consumer([sqs_message("UNKNOWN_EVENT", {})])
+
+        consumer.consume({})
+        consumer.close(timeout=2)
+
+        assert deleted_handles(consumer) == ["rh"]
+        consumer.sqs.send_message_batch.assert_not_called()
+
+    def test_sns_envelope_is_unwrapped(self, make_consumer):
+        inner = {"event_type": "SEND_EMAIL", "correlation_id": "x", "payload": {"name": "John"}}
+        consumer = make_consumer([{"Body": json.dumps({"Message": json.dumps(inner)}), "ReceiptHandle": "rh"}])
+        handler = MagicMock(return_value=None)
+
+        consumer.consume({"SEND_EMAIL": handler})
+
+        handler.assert_called_once_with({"name": "John"})
+
+    def test_consume_returns_while_handlers_run(self, make_consumer):
+        release = threading.Event()
+        messages = [sqs_message("SEND_EMAIL", {}, receipt_handle=f"rh-{i}") for i in range(3)]
+        consumer = make_consumer(messages, execution_mode="thread", max_in_flight=5)
+
+        consumer.consume({"SEND_EMAIL": lambda payload: release.wait(2)})
+
+        assert consumer.executor.in_flight() == 3
+        assert deleted_handles(consumer) == []
+
+        release.set()
+        consumer.close(timeout=2)
+        assert sorted(deleted_handles(consumer)) == ["rh-0", "rh-1", "rh-2"]
+
+    def test_receive_is_limited_to_free_capacity(self, make_consumer):
+        release = threading.Event()
+        consumer = make_consumer([sqs_message("SEND_EMAIL", {}, receipt_handle="rh-0")], execution_mode="thread", max_in_flight=3)
+
+        consumer.consume({"SEND_EMAIL": lambda payload: release.wait(2)})
+        consumer.consume({"SEND_EMAIL": lambda payload: release.wait(2)})
+
+        assert consumer.sqs.receive_message.call_args.kwargs["MaxNumberOfMessages"] == 2
+        release.set()
+
+    def test_ordering_key_serializes_same_user(self, make_consumer):
+        order = []
+        messages = [sqs_message("UPDATE_USER_RPC", {"id": 1, "step": i}, receipt_handle=f"rh-{i}") for i in range(4)]
+        consumer = make_consumer(
+            messages,
+            execution_mode="thread",
+            max_in_flight=4,
+            ordering_keys={"UPDATE_USER_RPC": lambda payload: ("user", payload["id"])}
+        )
+
+        consumer.consume({"UPDATE_USER_RPC": lambda payload: order.append(payload["step"])})
+        consumer.close(timeout=2)
+
+        assert order == [0, 1, 2, 3]
+
+    def test_single_and_batch_user_updates_run_in_arrival_order(self, make_consumer):
+        from apis.users.main import ORDERING_KEYS
+        order = []
+        messages = [
+            sqs_message("UPDATE_USERS_BATCH_RPC", {"users": [{"id": 1, "step": 0}, {"id": 2, "step": 0}]}, receipt_handle="rh-0"),
+            sqs_message("UPDATE_USER_RPC", {"id": 1, "step": 1}, receipt_handle="rh-1"),
+            sqs_message("UPDATE_USERS_BATCH_RPC", {"users": [{"id": 1, "step": 2}]}, receipt_handle="rh-2"),
+        ]
+        consumer = make_consumer(messages, execution_mode="thread", max_in_flight=3, ordering_keys=ORDERING_KEYS)
+
+        def handle(payload):
+            time.sleep(0.05 if payload.get("users", [payload])[0]["step"] == 0 else 0)
+            order.extend(user["step"] for user in payload.get("users", [payload]))
+
+        consumer.consume({"UPDATE_USER_RPC": handle, "UPDATE_USERS_BATCH_RPC": handle})
+        consumer.close(timeout=2)
+
+        assert order == [0, 0, 1, 2]
+
+
+@pytest.mark.unit
+class TestConsumerBatching:
+
+    def test_ten_acks_share_one_batch_call(self, make_consumer):
+        messages = [sqs_message("SEND_EMAIL", {}, receipt_handle=f"rh-{i}") for i in range(10)]
+        consumer = make_consumer(messages)
+
+        consumer.consume({"SEND_EMAIL": lambda payload: None})
+
+        consumer.sqs.delete_message_batch.assert_called_once()
+        consumer.sqs.delete_message.assert_not_called()
+        assert len(deleted_handles(consumer)) == 10
+
+    def test_partial_batch_flushed_after_deadline(self, make_consumer):
+        consumer = make_consumer([sqs_message("SEND_EMAIL", {})])
+
+        consumer.consume({"SEND_EMAIL": lambda payload: None})
+
+        time.sleep(consumer.ACK_MAX_DELAY + 0.2)
+        assert deleted_handles(consumer) == ["rh"]
+
+
+@pytest.mark.unit
+class TestConsumerCodecs:
+
+    def test_reply_uses_request_codec(self, make_consumer):
+        if "msgpack-b64" not in available_codecs():
+            pytest.skip("msgpack not installed")
+        codec = get_codec("msgpack-b64")
+        request = {"event_type": "TOTAL_USERS_RPC", "correlation_id": "abc", "payload": {}}
+        message = {"Body": codec.encode(request), "ReceiptHandle": "rh", "MessageAttributes": codec_attributes(codec)}
+        consumer = make_consumer([message])
+
+        consumer.consume({"TOTAL_USERS_RPC": lambda payload: {"total_users": 3}})
+        consumer.close(timeout=2)
+
+        entry = consumer.sqs.send_message_batch.call_args.kwargs["Entries"][0]
+        assert entry["MessageAttributes"] == codec_attributes(codec)
+        assert codec.decode(entry["MessageBody"])["data"] == {"total_users": 3}
+
+    def test_undecodable_message_is_deleted(self, make_consumer):
+        consumer = make_consumer([{"Body": "{broken", "ReceiptHandle": "rh"}])
+        handler = MagicMock()
+
+        consumer.consume({"SEND_EMAIL": handler})
+        consumer.close(timeout=2)
+
+        handler.assert_not_called()
+        assert deleted_handles(consumer) == ["rh"]
+
+
+@pytest.mark.unit
+class TestConsumerStreaming:
+
+    def sent_messages(self, consumer):
+        return [
+            json.loads(entry["MessageBody"])
+            for call in consumer.sqs.send_message_batch.call_args_list
+            for entry in call.kwargs["Entries"]
+        ]
+
+    def test_generator_handler_sends_tagged_chunks(self, make_consumer):
+        consumer = make_consumer([sqs_message("LIST_USERS_STREAM_RPC", {}, correlation_id="abc")])
+
+        def handler(payload):
+            yield {"users": [1, 2]}
+            yield {"users": [3]}
+
+        consumer.consume({"LIST_USERS_STREAM_RPC": handler})
+        consumer.close(timeout=2)
+
+        sent = self.sent_messages(consumer)
+        assert [message["chunk"] for message in sent] == [{"seq": 0, "last": False}, {"seq": 1, "last": True}]
+        assert [message["data"] for message in sent] == [{"users": [1, 2]}, {"users": [3]}]
+        assert deleted_handles(consumer) == ["rh"]
+
+    def test_empty_generator_sends_single_last_chunk(self, make_consumer):
+        consumer = make_consumer([sqs_message("LIST_USERS_STREAM_RPC", {})])
+
+        consumer.consume({"LIST_USERS_STREAM_RPC": lambda payload: (item for item in [])})
+        consumer.close(timeout=2)
+
+        assert self.sent_messages(consumer) == [
+            {"correlation_id": "cid", "data": None, "status": "OK", "chunk": {"seq": 0, "last": True}}
+        ]
+
+    def test_failure_mid_stream_ends_with_error_chunk(self, make_consumer):
+        consumer = make_consumer([sqs_message("LIST_USERS_STREAM_RPC", {})])
+
+        def handler(payload):
+            yield {"users": [1]}
+            raise RuntimeError("boom")
+
+        consumer.consume({"LIST_USERS_STREAM_RPC": handler})
+        consumer.close(timeout=2)
+
+        sent = self.sent_messages(consumer)
+        assert sent[-1]["status"] == "ERROR"
+        assert sent[-1]["data"] == {"error": "boom"}
+        assert sent[-1]["chunk"]["last"] is True
+
+
+@pytest.mark.unit
+class TestConsumerReplyTo:
+
+    def reply_queues(self, consumer):
+        return [call.kwargs["QueueUrl"] for call in consumer.sqs.send_message_batch.call_args_list]
+
+    def test_reply_goes_to_reply_to(self, make_consumer):
+        body = {"event_type": "TOTAL_USERS_RPC", "correlation_id": "cid", "payload": {}, "reply_to": "http://queue/gateway-1"}
+        consumer = make_consumer([{"Body": json.dumps(body), "ReceiptHandle": "rh"}])
+
+        consumer.consume({"TOTAL_USERS_RPC": lambda payload: {"total_users": 1}})
+        consumer.close(timeout=2)
+
+        assert self.reply_queues(consumer) == ["http://queue/gateway-1"]
+
+    def test_without_reply_to_uses_shared_queue(self, make_consumer):
+        consumer = make_consumer([sqs_message("TOTAL_USERS_RPC", {})])
+
+        consumer.consume({"TOTAL_USERS_RPC": lambda payload: {"total_users": 1}})
+        consumer.close(timeout=2)
+
+        assert self.reply_queues(consumer) == ["http://queue/response"]
+
+    def test_reply_to_without_configured_response_queue(self, make_consumer):
+        body = {"event_type": "TOTAL_USERS_RPC", "correlation_id": "cid", "payload": {}, "reply_to": "http://queue/gateway-1"}
+        consumer = make_consumer([{"Body": json.dumps(body), "ReceiptHandle": "rh"}])
+        consumer.response_queue_url = None
+
+        consumer.consume({"TOTAL_USERS_RPC": lambda payload: {"total_users": 1}})
+        consumer.close(timeout=2)
+
+        assert self.reply_queues(consumer) == ["http://queue/gateway-1"]
+
+
+@pytest.mark.unit
+class TestConsumerDeadlines:
+
+    def rpc_message(self, deadline):
+        body = {"event_type": "TOTAL_USERS_RPC", "correlation_id": "cid", "payload": {}, "deadline": deadline}
+        return {"Body": json.dumps(body), "ReceiptHandle": "rh"}
+
+    def test_expired_rpc_is_dropped_without_running(self, make_consumer):
+        handler = MagicMock(return_value={"total_users": 1})
+        consumer = make_consumer([self.rpc_message(time.time() - 1)])
+
+        consumer.consume({"TOTAL_USERS_RPC": handler})
+        consumer.close(timeout=2)
+
+        handler.assert_not_called()
+        consumer.sqs.send_message_batch.assert_not_called()
+        assert deleted_handles(consumer) == ["rh"]
+        assert consumer.expired == {"TOTAL_USERS_RPC": 1}
+
+    def test_expired_totals_are_logged_at_most_once_per_interval(self, make_consumer):
+        consumer = make_consumer([self.rpc_message(time.time() - 1) for _ in range(3)])
+
+        with patch("core.consumer.logger") as logger:
+            consumer.consume({"TOTAL_USERS_RPC": MagicMock()})
+            consumer.EXPIRED_LOG_INTERVAL = 0
+            consumer._count_expired("TOTAL_USERS_RPC")
+        consumer.close(timeout=2)
+
+        totals = [call.args[0] for call in logger.warning.call_args_list if "Expired RPCs" in call.args[0]]
+        assert len(totals) == 2
+        assert "{'TOTAL_USERS_RPC': 4}" in totals[-1]
+
+    def test_rpc_within_deadline_runs(self, make_consumer):
+        handler = MagicMock(return_value={"total_users": 1})
+        consumer = make_consumer([self.rpc_message(time.time() + 10), sqs_message("TOTAL_USERS_RPC", {}, receipt_handle="rh-old")])
+
+        consumer.consume({"TOTAL_USERS_RPC": handler})
+        consumer.close(timeout=2)
+
+        assert handler.call_count == 2
+        assert consumer.expired == {}
+
+
+@pytest.mark.unit
+class TestConsumerLanes:
+
+    @pytest.fixture
+    def lanes(self):
+        # Users consumer with an event lane, both queues on an in-process broker
+        broker = LocalBroker()
+        rpc_queue = broker.create_queue("users-queue")
+        events_queue = broker.create_queue("users-events-queue")
+        consumer = Consumer(
+            queue_url=rpc_queue, response_queue_url=broker.create_queue("response"),
+            execution_mode="thread", max_in_flight=10, sqs_client=broker.sqs_client()
+        )
+        consumer.add_lane("event", events_queue, max_in_flight=2)
+        consumer.POLLING_TIME = 2
+        yield broker, consumer, rpc_queue, events_queue
+        consumer.close(timeout=2)
+
+    def send(self, broker, queue_url, event_type, receipt="x"):
+        body = {"event_type": event_type, "correlation_id": receipt, "payload": {}}
+        broker.sqs_client().send_message(QueueUrl=queue_url, MessageBody=json.dumps(body))
+
+    def test_events_are_not_held_up_by_an_idle_rpc_lane(self, lanes):
+        broker, consumer, _, events_queue = lanes
+        handled = threading.Event()
+        running = True
+
+        def loop():
+            while running:
+                consumer.consume({"SEND_EMAIL": lambda payload: handled.set()})
+
+        thread = threading.Thread(target=loop, daemon=True)
+        thread.start()
+        time.sleep(0.2)
+        sent = time.monotonic()
+        self.send(broker, events_queue, "SEND_EMAIL")
+
+        assert handled.wait(consumer.POLLING_TIME)
+        assert time.monotonic() - sent < consumer.POLLING_TIME / 4
+        running = False
+        thread.join(timeout=consumer.POLLING_TIME + 1)
+
+    def test_event_lane_has_its_own_concurrency_limit(self, lanes):
+        broker, consumer, rpc_queue, events_queue = lanes
+        release = threading.Event()
+        for index in range(4):
+            self.send(broker, events_queue, "SEND_EMAIL", f"event-{index}")
+        self.send(broker, rpc_queue, "TOTAL_USERS_RPC", "rpc")
+        answered = threading.Event()
+        handlers = {"SEND_EMAIL": lambda payload: release.wait(2), "TOTAL_USERS_RPC": lambda payload: answered.set()}
+
+        deadline = time.monotonic() + 2
+        while not (answered.is_set() and consumer.lanes[1].executor.in_flight() == 2) and time.monotonic() < deadline:
+            consumer.consume(handlers)
+
+        # Two events run, two wait in their queue; the RPC went through regardless
+        assert answered.is_set()
+        assert consumer.lanes[1].executor.in_flight() == 2
+        assert broker.depth(events_queue)[0] == 2
+        release.set()
+
+    def test_acks_go_to_the_lane_queue(self, make_consumer):
+        consumer = make_consumer([], execution_mode="thread")
+        consumer.add_lane("event", "http://queue/users-events")
+        queues = {"http://queue/users-events": [sqs_message("SEND_EMAIL", {}, receipt_handle="rh-event")]}
+        consumer.sqs.receive_message.side_effect = lambda **kwargs: {"Messages": queues.pop(kwargs["QueueUrl"], [])}
+        consumer.POLLING_TIME = 0.1
+
+        consumer.consume({"SEND_EMAIL": lambda payload: None})
+        consumer.close(timeout=2)
+
+        assert [call.kwargs["QueueUrl"] for call in consumer.sqs.delete_message_batch.call_args_list] == ["http://queue/users-events"]
+
+    def test_lanes_cannot_be_added_while_polling(self, make_consumer):
+        consumer = make_consumer([])
+        consumer.add_lane("event", "http://queue/users-events")
+        consumer.consume({})
+
+        with pytest.raises(RuntimeError):
+            consumer.add_lane("late", "http://queue/late")
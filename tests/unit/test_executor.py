@@ -0,0 +1,148 @@
+import threading
+import time
+import pytest
+from core.executor import HandlerExecutor
+
+
+def collect(results, event):
+    def on_done(result, error):
+        results.append((result, error))
+        event.set()
+    return on_done
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.mark.unit
+class TestHandlerExecutor:
+
+    def test_unknown_mode_rejected(self):
+        with pytest.raises(ValueError):
+            HandlerExecutor(mode="fibers")
+
+    @pytest.mark.parametrize("mode", ["sync", "thread", "asyncio"])
+    def test_runs_handler_and_reports_result(self, mode):
+        executor = HandlerExecutor(mode=mode, max_in_flight=4)
+        results, done = [], threading.Event()
+
+        executor.submit(lambda payload: payload["value"] * 2, {"value": 21}, collect(results, done))
+
+        assert done.wait(2)
+        executor.shutdown()
+        assert results == [(42, None)]
+
+    def test_handler_error_is_reported(self):
+        executor = HandlerExecutor(mode="thread", max_in_flight=2)
+        results, done = [], threading.Event()
+
+        def failing(payload):
+            raise RuntimeError("boom")
+
+        executor.submit(failing, {}, collect(results, done))
+
+        assert done.wait(2)
+        executor.shutdown()
+        assert results[0][0] is None
+        assert str(results[0][1]) == "boom"
+
+    def test_handlers_run_in_parallel(self):
+        executor = HandlerExecutor(mode="thread", max_in_flight=5)
+        barrier = threading.Barrier(5, timeout=2)
+        results, done = [], threading.Event()
+
+        def handler(payload):
+            barrier.wait()
+            return payload["i"]
+
+        def on_done(result, error):
+            results.append(result)
+            if len(results) == 5:
+                done.set()
+
+        for i in range(5):
+            executor.submit(handler, {"i": i}, on_done)
+
+        assert done.wait(3)
+        executor.shutdown()
+        assert sorted(results) == list(range(5))
+
+    def test_same_key_runs_in_order(self):
+        executor = HandlerExecutor(mode="thread", max_in_flight=8)
+        order, done = [], threading.Event()
+
+        def handler(payload):
+            # earlier messages are slower: without ordering they would finish last
+            time.sleep(0.02 * (5 - payload["i"]))
+            order.append(payload["i"])
+
+        def on_done(result, error):
+            if len(order) == 5:
+                done.set()
+
+        for i in range(5):
+            executor.submit(handler, {"i": i}, on_done, key=("user", 1))
+
+        assert done.wait(3)
+        executor.shutdown()
+        assert order == [0, 1, 2, 3, 4]
+
+    def test_capacity_is_bounded(self):
+        executor = HandlerExecutor(mode="thread", max_in_flight=2)
+        release = threading.Event()
+
+        for _ in range(2):
+            executor.submit(lambda payload: release.wait(2), {}, lambda result, error: None)
+
+        assert executor.wait_for_capacity(timeout=0.05) == 0
+
+        release.set()
+        assert executor.wait_for_capacity(timeout=2) > 0
+        executor.shutdown()
+
+    def test_tasks_waiting_for_a_key_take_no_capacity(self):
+        executor = HandlerExecutor(mode="thread", max_in_flight=2)
+        release, done = threading.Event(), threading.Event()
+
+        for _ in range(3):
+            executor.submit(lambda payload: release.wait(2), {}, lambda result, error: None, key=("user", 1))
+
+        assert executor.in_flight() == 1
+        executor.submit(lambda payload: None, {}, lambda result, error: done.set(), key=("user", 2))
+
+        assert done.wait(2)
+        release.set()
+        executor.shutdown()
+        assert executor.in_flight() == 0
+
+    def test_task_with_several_keys_waits_for_each(self):
+        executor = HandlerExecutor(mode="thread", max_in_flight=8)
+        order, release, done = [], threading.Event(), threading.Event()
+
+        def handler(payload):
+            if payload["step"] == "user-1":
+                release.wait(2)
+            order.append(payload["step"])
+
+        def on_done(result, error):
+            if len(order) == 4:
+                done.set()
+
+        executor.submit(handler, {"step": "user-1"}, on_done, key=("user", 1))
+        executor.submit(handler, {"step": "user-2"}, on_done, key=("user", 2))
+        executor.submit(handler, {"step": "batch"}, on_done, key=[("user", 1), ("user", 2)])
+        executor.submit(handler, {"step": "user-3"}, on_done, key=("user", 3))
+
+        # user 3 is not in the batch, so it does not wait behind it
+        assert wait_until(lambda: order == ["user-2", "user-3"])
+        release.set()
+
+        assert done.wait(2)
+        executor.shutdown()
+        assert order == ["user-2", "user-3", "user-1", "batch"]
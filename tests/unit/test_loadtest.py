@@ -0,0 +1,33 @@
+import argparse
+import pytest
+from benchmarks import loadtest
+
+
+@pytest.mark.unit
+class TestLoadTestReport:
+
+    def test_percentile_nearest_rank(self):
+        values = [float(value) for value in range(1, 101)]
+
+        assert loadtest.percentile(values, 50) == 50
+        assert loadtest.percentile(values, 99) == 99
+        assert loadtest.percentile(values, 99.9) == 100
+        assert loadtest.percentile([], 99) == 0.0
+
+    def test_parse_mix(self):
+        assert loadtest.parse_mix("register=2,list") == {"register": 2.0, "list": 1.0}
+
+        with pytest.raises(argparse.ArgumentTypeError):
+            loadtest.parse_mix("delete=1")
+
+    def test_summarize_counts_errors_per_endpoint(self):
+        samples = {"list": [0.01, 0.02], "register": [0.03]}
+        statuses = {"list": {"200": 1, "500": 1}, "register": {"200": 1}}
+
+        summary = loadtest.summarize(samples, statuses, wall_time=1.5)
+
+        assert summary["overall"]["requests"] == 3
+        assert summary["overall"]["errors"] == 1
+        assert summary["overall"]["throughput_rps"] == 2.0
+        assert summary["endpoints"]["list"]["p50_ms"] == pytest.approx(10.0)
+        assert summary["endpoints"]["register"]["statuses"] == {"200": 1}
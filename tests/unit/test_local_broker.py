@@ -0,0 +1,234 @@
+import json
+import threading
+import time
+import pytest
+from botocore.exceptions import ClientError
+from core.local_broker import LocalBroker, queue_name
+from core.publisher import Publisher
+from core.consumer import Consumer
+
+
+@pytest.fixture
+def broker():
+    broker = LocalBroker()
+    broker.create_topic("beeneu-topic")
+    return broker
+
+
+@pytest.mark.unit
+class TestLocalBroker:
+
+    def test_queues_are_addressed_by_name(self, broker):
+        broker.create_queue("users-queue")
+        sqs = broker.sqs_client()
+
+        sqs.send_message(QueueUrl="http://sqs.sa-east-1.localhost.localstack.cloud:4566/000000000000/users-queue", MessageBody="hi")
+        messages = sqs.receive_message(QueueUrl="http://localhost:4566/000000000000/users-queue")["Messages"]
+
+        assert queue_name("http://localhost:4566/000000000000/users-queue/") == "users-queue"
+        assert [message["Body"] for message in messages] == ["hi"]
+
+    def test_publish_fans_out_raw_and_enveloped(self, broker):
+        topic_arn = "arn:aws:sns:sa-east-1:000000000000:beeneu-topic"
+        raw_url = broker.create_queue("raw-queue")
+        envelope_url = broker.create_queue("envelope-queue")
+        broker.subscribe(topic_arn, raw_url, raw=True)
+        broker.subscribe(topic_arn, envelope_url, raw=False)
+        attributes = {"codec": {"DataType": "String", "StringValue": "json"}}
+
+        broker.sns_client().publish(TopicArn=topic_arn, Message='{"a": 1}', MessageAttributes=attributes)
+
+        sqs = broker.sqs_client()
+        raw = sqs.receive_message(QueueUrl=raw_url, MessageAttributeNames=["All"])["Messages"][0]
+        envelope = json.loads(sqs.receive_message(QueueUrl=envelope_url)["Messages"][0]["Body"])
+        assert raw["Body"] == '{"a": 1}'
+        assert raw["MessageAttributes"] == attributes
+        assert envelope["Message"] == '{"a": 1}'
+        assert envelope["MessageAttributes"] == {"codec": {"Type": "String", "Value": "json"}}
+
+    def test_attributes_only_when_requested(self, broker):
+        url = broker.create_queue("q")
+        broker.sqs_client().send_message(QueueUrl=url, MessageBody="x", MessageAttributes={"codec": {"DataType": "String", "StringValue": "json"}})
+
+        message = broker.sqs_client().receive_message(QueueUrl=url)["Messages"][0]
+
+        assert "MessageAttributes" not in message
+
+    def test_long_poll_returns_when_a_message_arrives(self, broker):
+        url = broker.create_queue("q")
+        sqs = broker.sqs_client()
+        threading.Timer(0.05, lambda: sqs.send_message(QueueUrl=url, MessageBody="late")).start()
+
+        start = time.monotonic()
+        messages = sqs.receive_message(QueueUrl=url, WaitTimeSeconds=2)["Messages"]
+
+        assert messages[0]["Body"] == "late"
+        assert time.monotonic() - start < 1
+
+    def test_empty_long_poll_waits_and_returns_nothing(self, broker):
+        url = broker.create_queue("q")
+
+        start = time.monotonic()
+        response = broker.sqs_client().receive_message(QueueUrl=url, WaitTimeSeconds=0.1)
+
+        assert response == {}
+        assert time.monotonic() - start >= 0.1
+
+    def test_visibility_timeout_redelivers_unacked_messages(self, broker):
+        url = broker.create_queue("q")
+        sqs = broker.sqs_client()
+        sqs.send_message(QueueUrl=url, MessageBody="x")
+
+        first = sqs.receive_message(QueueUrl=url, VisibilityTimeout=0.05)["Messages"][0]
+        assert sqs.receive_message(QueueUrl=url) == {}
+        second = sqs.receive_message(QueueUrl=url, WaitTimeSeconds=1)["Messages"][0]
+
+        assert second["MessageId"] == first["MessageId"]
+        assert second["ReceiptHandle"] != first["ReceiptHandle"]
+
+    def test_deleted_messages_are_gone(self, broker):
+        url = broker.create_queue("q")
+        sqs = broker.sqs_client()
+        sqs.send_message_batch(QueueUrl=url, Entries=[{"Id": str(i), "MessageBody": str(i)} for i in range(3)])
+
+        messages = sqs.receive_message(QueueUrl=url, MaxNumberOfMessages=10, VisibilityTimeout=0.05)["Messages"]
+        result = sqs.delete_message_batch(
+            QueueUrl=url,
+            Entries=[{"Id": str(i), "ReceiptHandle": m["ReceiptHandle"]} for i, m in enumerate(messages)]
+        )
+        time.sleep(0.06)
+
+        assert len(result["Successful"]) == 3
+        assert broker.depth(url) == (0, 0)
+
+    def test_batch_limits(self, broker):
+        url = broker.create_queue("q")
+        sqs = broker.sqs_client()
+
+        with pytest.raises(ClientError):
+            sqs.send_message_batch(QueueUrl=url, Entries=[{"Id": str(i), "MessageBody": "x"} for i in range(11)])
+        with pytest.raises(ClientError):
+            sqs.delete_message_batch(QueueUrl=url, Entries=[])
+
+    def test_unknown_queue(self, broker):
+        with pytest.raises(ClientError) as error:
+            broker.sqs_client().receive_message(QueueUrl="http://localhost:4566/000000000000/missing")
+
+        assert error.value.response["Error"]["Code"] == "AWS.SimpleQueueService.NonExistentQueue"
+
+    def test_create_and_delete_queue(self, broker):
+        sqs = broker.sqs_client()
+
+        url = sqs.create_queue(QueueName="gateway-1")["QueueUrl"]
+        assert sqs.create_queue(QueueName="gateway-1")["QueueUrl"] == url
+
+        sqs.delete_queue(QueueUrl=url)
+        with pytest.raises(ClientError):
+            sqs.delete_queue(QueueUrl=url)
+
+    def test_filter_policy_matching(self, broker):
+        topic_arn = "arn:aws:sns:sa-east-1:000000000000:beeneu-topic"
+        tagged_url = broker.create_queue("tagged")
+        untagged_url = broker.create_queue("untagged")
+        broker.subscribe(topic_arn, tagged_url, filter_policy={"event_type": ["A", {"exists": True}]})
+        broker.subscribe(topic_arn, untagged_url, filter_policy={"event_type": [{"exists": False}]})
+        sns = broker.sns_client()
+
+        sns.publish(TopicArn=topic_arn, Message="a", MessageAttributes={"event_type": {"DataType": "String", "StringValue": "B"}})
+        sns.publish(TopicArn=topic_arn, Message="b")
+
+        assert broker.depth(tagged_url) == (1, 0)
+        assert broker.depth(untagged_url) == (1, 0)
+
+    def test_injected_failures_and_latency(self):
+        broker = LocalBroker(latency=0.02, failure_rate=1.0, seed=1)
+        url = broker.create_queue("q")
+
+        start = time.monotonic()
+        with pytest.raises(ClientError):
+            broker.sqs_client().send_message(QueueUrl=url, MessageBody="x")
+
+        assert time.monotonic() - start >= 0.02
+        assert broker.depth(url) == (0, 0)
+
+
+@pytest.mark.unit
+class TestLocalBrokerEndToEnd:
+
+    def test_rpc_round_trip_through_publisher_and_consumer(self, broker):
+        topic_arn = "arn:aws:sns:sa-east-1:000000000000:beeneu-topic"
+        queue_url = broker.create_queue("users-queue")
+        response_url = broker.create_queue("beeneu-response-queue")
+        broker.subscribe(topic_arn, queue_url)
+
+        publisher = Publisher(topic_arn, response_url, sns_client=broker.sns_client(), sqs_client=broker.sqs_client())
+        publisher.POLLING_TIME = 0.1
+        consumer = Consumer(queue_url, response_url, execution_mode="thread", sqs_client=broker.sqs_client())
+        consumer.POLLING_TIME = 0.1
+        running = True
+
+        def consume():
+            while running:
+                consumer.consume({"ECHO_RPC": lambda payload: {"echo": payload["value"]}})
+
+        thread = threading.Thread(target=consume, daemon=True)
+        thread.start()
+        try:
+            result = publisher.call_rpc("ECHO_RPC", {"value": 42})
+        finally:
+            running = False
+            thread.join(timeout=2)
+            consumer.close(timeout=2)
+            publisher.close()
+
+        assert result["success"] is True
+        assert result["data"] == {"echo": 42}
+        assert broker.depth(queue_url) == (0, 0)
+
+
+    def test_gateways_with_private_queues_get_their_own_replies(self, broker):
+        topic_arn = "arn:aws:sns:sa-east-1:000000000000:beeneu-topic"
+        queue_url = broker.create_queue("users-queue")
+        broker.subscribe(topic_arn, queue_url)
+
+        consumer = Consumer(queue_url, execution_mode="thread", sqs_client=broker.sqs_client())
+        consumer.POLLING_TIME = 0.1
+        gateways = []
+        for _ in range(2):
+            publisher = Publisher(topic_arn, sns_client=broker.sns_client(), sqs_client=broker.sqs_client())
+            publisher.POLLING_TIME = 0.1
+            publisher.TIMEOUT = 3
+            publisher.create_private_response_queue()
+            gateways.append(publisher)
+        private_urls = [gateway.response_queue_url for gateway in gateways]
+        running = True
+
+        def consume():
+            while running:
+                consumer.consume({"ECHO_RPC": lambda payload: {"echo": payload["value"]}})
+
+        results = {}
+
+        def call(index):
+            results[index] = gateways[index % 2].call_rpc("ECHO_RPC", {"value": index})
+
+        thread = threading.Thread(target=consume, daemon=True)
+        thread.start()
+        try:
+            callers = [threading.Thread(target=call, args=(index,)) for index in range(20)]
+            for caller in callers:
+                caller.start()
+            for caller in callers:
+                caller.join()
+        finally:
+            running = False
+            thread.join(timeout=2)
+            consumer.close(timeout=2)
+            for gateway in gateways:
+                gateway.close()
+
+        assert all(results[index]["data"] == {"echo": index} for index in range(20))
+        assert len(set(private_urls)) == 2
+        for url in private_urls:
+            with pytest.raises(ClientError):
+                broker.depth(url)
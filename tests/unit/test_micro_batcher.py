@@ -0,0 +1,88 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from core.micro_batcher import RPCBatcher
+
+
+def echo_publisher():
+    # Batch RPC stand-in: every item succeeds and is echoed back as the "user"
+    async def call_rpc(event_type, payload):
+        results = [{"index": index, "user": item} for index, item in enumerate(payload["users"])]
+        return {"success": True, "data": {"results": results}, "status": "OK"}
+
+    publisher = MagicMock()
+    publisher.call_rpc = AsyncMock(side_effect=call_rpc)
+    return publisher
+
+
+@pytest.mark.unit
+class TestRPCBatcher:
+
+    async def test_concurrent_calls_share_one_batch(self):
+        publisher = echo_publisher()
+        batcher = RPCBatcher("REGISTER_USERS_BATCH_RPC", max_items=50, max_delay=0.01)
+
+        results = await asyncio.gather(*(batcher.call(publisher, {"dni": str(index)}) for index in range(5)))
+
+        assert [result["data"]["dni"] for result in results] == ["0", "1", "2", "3", "4"]
+        assert all(result["success"] for result in results)
+        publisher.call_rpc.assert_awaited_once_with(
+            event_type="REGISTER_USERS_BATCH_RPC",
+            payload={"users": [{"dni": str(index)} for index in range(5)]}
+        )
+        assert (batcher.batches, batcher.items) == (1, 5)
+
+    async def test_full_batch_is_sent_without_waiting_for_the_window(self):
+        publisher = echo_publisher()
+        batcher = RPCBatcher("REGISTER_USERS_BATCH_RPC", max_items=3, max_delay=60)
+
+        results = await asyncio.wait_for(
+            asyncio.gather(*(batcher.call(publisher, {"dni": str(index)}) for index in range(6))),
+            timeout=1
+        )
+
+        assert len(results) == 6
+        assert [len(call.kwargs["payload"]["users"]) for call in publisher.call_rpc.await_args_list] == [3, 3]
+
+    async def test_item_errors_are_returned_to_their_caller_only(self):
+        publisher = MagicMock()
+        publisher.call_rpc = AsyncMock(return_value={
+            "success": True,
+            "data": {"results": [{"index": 0, "user": {"id": 1}}, {"index": 1, "error": "User with id 9 not found"}]}
+        })
+        batcher = RPCBatcher("UPDATE_USERS_BATCH_RPC")
+
+        first, second = await asyncio.gather(batcher.call(publisher, {"id": 1}), batcher.call(publisher, {"id": 9}))
+
+        assert first["data"] == {"id": 1}
+        assert second["data"] == {"error": "User with id 9 not found"}
+
+    async def test_rpc_failure_is_shared(self):
+        publisher = MagicMock()
+        publisher.call_rpc = AsyncMock(return_value={"success": False, "error": "Timeout after 10 seconds"})
+        batcher = RPCBatcher("REGISTER_USERS_BATCH_RPC")
+
+        results = await asyncio.gather(*(batcher.call(publisher, {}) for _ in range(3)))
+
+        assert all(result == {"success": False, "error": "Timeout after 10 seconds"} for result in results)
+
+    async def test_publisher_exception_becomes_failure(self):
+        publisher = MagicMock()
+        publisher.call_rpc = AsyncMock(side_effect=RuntimeError("boom"))
+        batcher = RPCBatcher("REGISTER_USERS_BATCH_RPC")
+
+        result = await batcher.call(publisher, {})
+
+        assert result == {"success": False, "error": "boom"}
+
+    async def test_cancelled_caller_does_not_affect_the_others(self):
+        publisher = echo_publisher()
+        batcher = RPCBatcher("REGISTER_USERS_BATCH_RPC", max_delay=0.02)
+
+        abandoned = asyncio.ensure_future(batcher.call(publisher, {"dni": "1"}))
+        kept = asyncio.ensure_future(batcher.call(publisher, {"dni": "2"}))
+        await asyncio.sleep(0)
+        abandoned.cancel()
+
+        assert (await kept)["data"] == {"dni": "2"}
+        assert len(publisher.call_rpc.await_args.kwargs["payload"]["users"]) == 2
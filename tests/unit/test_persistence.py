@@ -0,0 +1,185 @@
+import os
+import pytest
+from datetime import timedelta
+from freezegun import freeze_time
+from core.persistence import WriteAheadLog, DurableStore
+from apis.users.repository import UserRepository
+from apis.statistics.repository import StatisticsRepository
+
+
+def restart(repo, directory, **kwargs):
+    repo.close_persistence()
+    return repo.enable_persistence(str(directory), **kwargs)
+
+
+@pytest.fixture
+def users_repo(reset_users_state, tmp_path):
+    repo = UserRepository()
+    repo.enable_persistence(str(tmp_path), fsync="always", snapshot_every=1000)
+    yield repo
+    repo.close_persistence()
+
+
+@pytest.fixture
+def statistics_repo(reset_statistics_state, tmp_path):
+    repo = StatisticsRepository()
+    repo.enable_persistence(str(tmp_path), fsync="always", snapshot_every=1000)
+    yield repo
+    repo.close_persistence()
+
+
+@pytest.mark.unit
+class TestWriteAheadLog:
+
+    def test_append_and_replay(self, tmp_path):
+        wal = WriteAheadLog(str(tmp_path), "test", fsync="off")
+        wal.open(0)
+        wal.append(1, b"first")
+        wal.append(2, b"second")
+        wal.close()
+
+        records = list(WriteAheadLog(str(tmp_path), "test").replay())
+
+        assert records == [(1, 1, b"first"), (2, 2, b"second")]
+
+    def test_replay_after_lsn(self, tmp_path):
+        wal = WriteAheadLog(str(tmp_path), "test", fsync="off")
+        wal.open(0)
+        for i in range(5):
+            wal.append(1, bytes([i]))
+        wal.close()
+
+        records = list(WriteAheadLog(str(tmp_path), "test").replay(after_lsn=3))
+
+        assert [lsn for lsn, _, _ in records] == [4, 5]
+
+    def test_torn_tail_is_truncated(self, tmp_path):
+        wal = WriteAheadLog(str(tmp_path), "test", fsync="off")
+        wal.open(0)
+        wal.append(1, b"complete")
+        wal.close()
+        path = wal.segments()[-1][1]
+        with open(path, "ab") as file:
+            file.write(b"\x05\x00\x00\x00garbage")
+
+        reopened = WriteAheadLog(str(tmp_path), "test", fsync="off")
+        records = list(reopened.replay())
+        reopened.open(0)
+        reopened.append(1, b"next")
+        reopened.close()
+
+        assert records == [(1, 1, b"complete")]
+        assert [payload for _, _, payload in WriteAheadLog(str(tmp_path), "test").replay()] == [b"complete", b"next"]
+
+    def test_unknown_fsync_policy(self, tmp_path):
+        with pytest.raises(ValueError):
+            WriteAheadLog(str(tmp_path), "test", fsync="sometimes")
+
+
+@pytest.mark.unit
+class TestDurableStore:
+
+    def test_snapshot_truncates_history(self, tmp_path):
+        store = DurableStore(str(tmp_path), "test", fsync="off", snapshot_every=3)
+        store.recover(lambda view: None, lambda op, payload: None)
+        for i in range(3):
+            store.append(1, bytes([i]))
+        assert store.should_snapshot()
+        store.snapshot(b"state-after-3", background=False)
+        store.append(1, b"tail")
+        store.close()
+
+        loaded, applied = [], []
+        reopened = DurableStore(str(tmp_path), "test", fsync="off")
+        reopened.recover(lambda view: loaded.append(bytes(view)), lambda op, payload: applied.append(payload))
+        reopened.close()
+
+        assert loaded == [b"state-after-3"]
+        assert applied == [b"tail"]
+        assert len([name for name in os.listdir(tmp_path) if name.endswith(".wal")]) == 1
+
+    def test_corrupt_snapshot_is_skipped(self, tmp_path):
+        store = DurableStore(str(tmp_path), "test", fsync="off")
+        store.recover(lambda view: None, lambda op, payload: None)
+        store.append(1, b"a")
+        store.snapshot(b"state", background=False)
+        store.close()
+        snapshot = [name for name in os.listdir(tmp_path) if name.endswith(".snap")][0]
+        with open(tmp_path / snapshot, "r+b") as file:
+            file.seek(-1, os.SEEK_END)
+            file.write(b"X")
+
+        loaded = []
+        reopened = DurableStore(str(tmp_path), "test", fsync="off")
+        reopened.recover(lambda view: loaded.append(bytes(view)), lambda op, payload: None)
+        reopened.close()
+
+        assert loaded == []
+
+
+@pytest.mark.unit
+class TestRepositoryRecovery:
+
+    def test_users_survive_restart(self, users_repo, tmp_path):
+        john = users_repo.create({"name": "John", "surname": "Doe", "dni": "111", "address": "St 1"})
+        users_repo.create({"name": "Jane", "surname": "Doe", "dni": "222", "address": "St 2"})
+        john = users_repo.update(john["id"], {"name": "Johnny"})
+
+        assert restart(users_repo, tmp_path) == 3
+
+        assert users_repo.get_by_id(john["id"]) == john
+        assert users_repo.list_all({"surname": "Doe"})[1]["name"] == "Jane"
+        assert users_repo.get_updates_count() == 1
+
+    def test_users_restart_from_snapshot_and_tail(self, users_repo, tmp_path):
+        restart(users_repo, tmp_path, fsync="group", snapshot_every=10)
+        for i in range(25):
+            users_repo.create({"name": "John", "surname": "Doe", "dni": str(i), "address": "St"})
+        users_repo.update(3, {"dni": "x"})
+        expected = users_repo.users
+
+        replayed = restart(users_repo, tmp_path, fsync="group", snapshot_every=10)
+
+        # a snapshot is written in the background every 10 records
+        assert replayed < 26
+        assert users_repo.users == expected
+        assert users_repo.find_by_dni("x")[0]["id"] == 3
+        assert users_repo.list_all({"name": "John"}) == expected
+
+    def test_statistics_survive_restart(self, statistics_repo, tmp_path):
+        with freeze_time("2024-12-10 12:00:00"):
+            statistics_repo.increment_total_users()
+        statistics_repo.increment_total_users()
+        statistics_repo.increment_total_updates()
+
+        restart(statistics_repo, tmp_path)
+
+        assert statistics_repo.get_total_users() == 2
+        assert statistics_repo.get_total_updates() == 1
+        assert statistics_repo.get_registered_last_24h() == 1
+
+    def test_statistics_restart_from_snapshot(self, statistics_repo, tmp_path):
+        restart(statistics_repo, tmp_path, snapshot_every=5)
+        for _ in range(12):
+            statistics_repo.increment_total_users()
+        statistics_repo.increment_total_updates()
+
+        replayed = restart(statistics_repo, tmp_path, snapshot_every=5)
+
+        assert replayed < 13
+        assert statistics_repo.get_total_users() == 12
+        assert statistics_repo.get_total_updates() == 1
+        assert statistics_repo.get_registered_in_window(timedelta(hours=1)) == 12
+
+    def test_statistics_applied_sequences_survive_restart(self, statistics_repo, tmp_path):
+        restart(statistics_repo, tmp_path, snapshot_every=3)
+        for seq in (1, 2, 4, 5):
+            statistics_repo.increment_total_users(seq=seq)
+        statistics_repo.increment_total_updates(seq=7)
+
+        restart(statistics_repo, tmp_path, snapshot_every=3)
+
+        assert statistics_repo.increment_total_users(seq=4) is False
+        assert statistics_repo.increment_total_updates(seq=7) is False
+        assert statistics_repo.increment_total_users(seq=3) is True
+        assert statistics_repo.get_total_users() == 5
@@ -0,0 +1,513 @@
+import asyncio
+import json
+import threading
+import time
+import pytest
+from unittest.mock import MagicMock
+from core.publisher import Publisher, AsyncPublisher
+from core.codec import CodecError, available_codecs, codec_attributes, get_codec
+from core.resilience import HedgePolicy, LatencyTracker
+
+
+class FakeResponseQueue:
+    def __init__(self, extra_messages=None):
+        self.lock = threading.Lock()
+        self.messages = list(extra_messages or [])
+        self.deleted = []
+
+    def publish(self, TopicArn, Message, MessageAttributes=None):
+        body = json.loads(Message)
+        reply = {"correlation_id": body["correlation_id"], "data": body["payload"], "status": "OK"}
+        with self.lock:
+            self.messages.append({"Body": json.dumps(reply), "ReceiptHandle": f"rh-{len(self.deleted)}-{body['correlation_id']}"})
+        return {"MessageId": "1"}
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages, WaitTimeSeconds, **kwargs):
+        with self.lock:
+            batch, self.messages = self.messages[:MaxNumberOfMessages], self.messages[MaxNumberOfMessages:]
+        if not batch:
+            threading.Event().wait(0.01)
+        return {"Messages": batch}
+
+    def delete_message_batch(self, QueueUrl, Entries):
+        self.deleted.extend(entry["ReceiptHandle"] for entry in Entries)
+        return {"Successful": [{"Id": entry["Id"]} for entry in Entries], "Failed": []}
+
+
+@pytest.fixture
+def fake_queue():
+    return FakeResponseQueue()
+
+
+@pytest.fixture
+def publisher(fake_queue):
+    pub = Publisher(topic_arn="arn:test", response_queue_url="http://queue/response")
+    pub.sns = MagicMock()
+    pub.sns.publish.side_effect = fake_queue.publish
+    pub.sqs = MagicMock()
+    pub.sqs.receive_message.side_effect = fake_queue.receive_message
+    pub.sqs.delete_message_batch.side_effect = fake_queue.delete_message_batch
+    pub.TIMEOUT = 2
+    yield pub
+    pub.close()
+
+
+@pytest.fixture
+async def async_publisher(fake_queue):
+    pub = AsyncPublisher(topic_arn="arn:test", response_queue_url="http://queue/response")
+    pub.sns = MagicMock()
+    pub.sns.publish.side_effect = fake_queue.publish
+    pub.sqs = MagicMock()
+    pub.sqs.receive_message.side_effect = fake_queue.receive_message
+    pub.sqs.delete_message_batch.side_effect = fake_queue.delete_message_batch
+    pub.TIMEOUT = 2
+    yield pub
+    await pub.close()
+
+
+@pytest.mark.unit
+class TestPublisherResponseListener:
+
+    def test_call_rpc_returns_matching_response(self, publisher):
+        result = publisher.call_rpc("TOTAL_USERS_RPC", {"value": 1})
+
+        assert result["success"] is True
+        assert result["data"] == {"value": 1}
+        assert result["status"] == "OK"
+
+    def test_concurrent_calls_receive_their_own_response(self, publisher):
+        results = {}
+
+        def call(index):
+            results[index] = publisher.call_rpc("LIST_USERS_RPC", {"index": index})
+
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(25)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert all(results[i]["data"] == {"index": i} for i in range(25))
+
+    def test_single_listener_for_many_calls(self, publisher):
+        publisher.call_rpc("TOTAL_USERS_RPC", {})
+        listener = publisher._listener
+        publisher.call_rpc("TOTAL_USERS_RPC", {})
+
+        assert publisher._listener is listener
+
+    def test_responses_deleted_in_batches(self, publisher, fake_queue):
+        for i in range(3):
+            publisher.call_rpc("TOTAL_USERS_RPC", {"i": i})
+
+        assert len(fake_queue.deleted) == 3
+        publisher.sqs.delete_message.assert_not_called()
+
+    def test_unknown_correlation_id_is_deleted(self, publisher, fake_queue):
+        fake_queue.messages.append({"Body": json.dumps({"correlation_id": "stale"}), "ReceiptHandle": "stale-rh"})
+
+        publisher.call_rpc("TOTAL_USERS_RPC", {})
+
+        assert "stale-rh" in fake_queue.deleted
+
+    def test_timeout_when_no_response(self, publisher):
+        publisher.sns.publish.side_effect = None
+        publisher.TIMEOUT = 0.1
+
+        result = publisher.call_rpc("TOTAL_USERS_RPC", {})
+
+        assert result["success"] is False
+        assert "Timeout" in result["error"]
+        assert publisher._pending == {}
+
+    def test_publish_error_returns_failure(self, publisher):
+        publisher.sns.publish.side_effect = Exception("broker down")
+
+        result = publisher.call_rpc("TOTAL_USERS_RPC", {})
+
+        assert result == {"success": False, "error": "broker down"}
+        assert publisher._pending == {}
+
+
+@pytest.mark.unit
+class TestAsyncPublisher:
+
+    async def test_call_rpc_returns_matching_response(self, async_publisher):
+        result = await async_publisher.call_rpc("TOTAL_USERS_RPC", {"value": 1})
+
+        assert result["success"] is True
+        assert result["data"] == {"value": 1}
+
+    async def test_many_concurrent_calls_share_one_listener(self, async_publisher):
+        results = await asyncio.gather(*[
+            async_publisher.call_rpc("LIST_USERS_RPC", {"index": i}) for i in range(200)
+        ])
+
+        assert [result["data"]["index"] for result in results] == list(range(200))
+        assert async_publisher.sqs.receive_message.call_count < 200
+
+    async def test_publish(self, async_publisher):
+        result = await async_publisher.publish("SEND_EMAIL", {"name": "John"})
+
+        assert result["success"] is True
+        async_publisher.sns.publish.assert_called_once()
+
+    async def test_timeout_when_no_response(self, async_publisher):
+        async_publisher.sns.publish.side_effect = None
+        async_publisher.TIMEOUT = 0.1
+
+        result = await async_publisher.call_rpc("TOTAL_USERS_RPC", {})
+
+        assert result["success"] is False
+        assert "Timeout" in result["error"]
+        assert async_publisher._pending == {}
+
+    async def test_publish_error_returns_failure(self, async_publisher):
+        async_publisher.sns.publish.side_effect = Exception("broker down")
+
+        result = await async_publisher.call_rpc("TOTAL_USERS_RPC", {})
+
+        assert result == {"success": False, "error": "broker down"}
+
+    async def test_stopped_listener_restarts_on_next_call(self, async_publisher):
+        await async_publisher.call_rpc("TOTAL_USERS_RPC", {"value": 1})
+        listener = async_publisher._listener
+
+        await async_publisher.stop_listener()
+        assert listener.done()
+
+        result = await async_publisher.call_rpc("TOTAL_USERS_RPC", {"value": 2})
+        assert result["data"] == {"value": 2}
+
+    async def test_cancelled_call_drops_its_pending_entry(self, async_publisher):
+        async_publisher.sns.publish.side_effect = None
+
+        call = asyncio.create_task(async_publisher.call_rpc("TOTAL_USERS_RPC", {}))
+        await asyncio.sleep(0.05)
+        assert len(async_publisher._pending) == 1
+
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+
+        assert async_publisher._pending == {}
+
+
+@pytest.mark.unit
+class TestPublisherCodec:
+
+    def test_messages_are_tagged_with_codec_event_type_and_lane(self, publisher):
+        publisher.publish("SEND_EMAIL", {"name": "John"})
+
+        attributes = publisher.sns.publish.call_args.kwargs["MessageAttributes"]
+        assert attributes == {
+            "codec": {"DataType": "String", "StringValue": "json"},
+            "event_type": {"DataType": "String", "StringValue": "SEND_EMAIL"},
+            "lane": {"DataType": "String", "StringValue": "event"}
+        }
+
+    def test_unknown_codec_rejected(self):
+        with pytest.raises(CodecError):
+            Publisher(topic_arn="arn:test", codec="protobuf")
+
+    def test_rpc_round_trip_with_tagged_reply(self, publisher, fake_queue):
+        if "msgpack-b64" not in available_codecs():
+            pytest.skip("msgpack not installed")
+        codec = get_codec("msgpack-b64")
+        publisher.codec = codec
+
+        def publish(TopicArn, Message, MessageAttributes=None):
+            request = codec.decode(Message)
+            reply = {"correlation_id": request["correlation_id"], "data": {"ok": True}, "status": "OK"}
+            fake_queue.messages.append({
+                "Body": codec.encode(reply),
+                "ReceiptHandle": "rh",
+                "MessageAttributes": codec_attributes(codec)
+            })
+
+        publisher.sns.publish.side_effect = publish
+
+        assert publisher.call_rpc("TOTAL_USERS_RPC", {})["data"] == {"ok": True}
+
+
+@pytest.mark.unit
+class TestPublisherResilience:
+
+    def test_breaker_fails_fast_after_consecutive_timeouts(self, publisher):
+        publisher.sns.publish.side_effect = None
+        publisher.TIMEOUT = 0.05
+        publisher.BREAKER_FAILURES = 2
+
+        for _ in range(2):
+            assert "Timeout" in publisher.call_rpc("TOTAL_USERS_RPC", {})["error"]
+        started = time.monotonic()
+        result = publisher.call_rpc("TOTAL_USERS_RPC", {})
+
+        assert time.monotonic() - started < 0.05
+        assert result["status"] == "CIRCUIT_OPEN" and result["retry_after"] > 0
+        assert publisher.sns.publish.call_count == 2
+        # Other event types have breakers of their own
+        assert publisher._breaker("LIST_USERS_RPC").allow()
+
+    def test_reply_closes_half_open_breaker(self, publisher):
+        breaker = publisher._breaker("TOTAL_USERS_RPC")
+        breaker.reset_timeout = 0
+        for _ in range(publisher.BREAKER_FAILURES):
+            breaker.record_failure()
+
+        assert publisher.call_rpc("TOTAL_USERS_RPC", {})["success"] is True
+        assert breaker.state == "closed"
+
+    def test_timeout_and_deadline_adapt_to_observed_latency(self, publisher):
+        publisher.TIMEOUT = 5
+        publisher.latencies.floor = 0.2
+        for _ in range(publisher.latencies.min_samples):
+            publisher.call_rpc("TOTAL_USERS_RPC", {})
+
+        timeout = publisher._rpc_timeout("TOTAL_USERS_RPC")
+        before = time.time()
+        publisher.call_rpc("TOTAL_USERS_RPC", {})
+
+        assert 0.2 <= timeout < 5
+        assert json.loads(publisher.sns.publish.call_args.kwargs["Message"])["deadline"] <= before + timeout + 0.1
+        assert publisher._rpc_timeout("LIST_USERS_RPC") == 5
+
+    async def test_async_breaker_rejects_streams_too(self, async_publisher):
+        for _ in range(async_publisher.BREAKER_FAILURES):
+            async_publisher._breaker("LIST_USERS_STREAM_RPC").record_failure()
+
+        chunks = [chunk async for chunk in async_publisher.stream_rpc("LIST_USERS_STREAM_RPC", {})]
+
+        assert [chunk["status"] for chunk in chunks] == ["CIRCUIT_OPEN"]
+        async_publisher.sns.publish.assert_not_called()
+
+
+@pytest.mark.unit
+class TestPublisherHedging:
+
+    def hedged(self, publisher, fake_queue, answer_from=2):
+        # Only the answer_from-th copy of a request gets a reply
+        copies = []
+
+        def publish(**kwargs):
+            copies.append(json.loads(kwargs["Message"]))
+            if len(copies) >= answer_from:
+                return fake_queue.publish(**kwargs)
+            return {"MessageId": str(len(copies))}
+
+        publisher.sns.publish.side_effect = publish
+        publisher.latencies = LatencyTracker(min_samples=1, refresh=1)
+        publisher.latencies.record("TOTAL_USERS_RPC", 0.01)
+        publisher.hedging = HedgePolicy(["TOTAL_USERS_RPC"], budget=1, burst=1)
+        return copies
+
+    def test_slow_read_is_sent_again_with_the_same_correlation_id(self, publisher, fake_queue):
+        copies = self.hedged(publisher, fake_queue)
+
+        result = publisher.call_rpc("TOTAL_USERS_RPC", {"value": 1})
+
+        assert result["success"] is True and result["data"] == {"value": 1}
+        assert len(copies) == 2 and copies[0] == copies[1]
+        assert publisher.hedging.hedged == 1
+
+    def test_other_event_types_are_never_hedged(self, publisher, fake_queue):
+        copies = self.hedged(publisher, fake_queue)
+        publisher.latencies.record("REGISTER_USER_RPC", 0.01)
+        publisher.TIMEOUT = 0.1
+
+        result = publisher.call_rpc("REGISTER_USER_RPC", {})
+
+        assert "Timeout" in result["error"]
+        assert len(copies) == 1
+
+    def test_exhausted_budget_sends_no_hedge(self, publisher, fake_queue):
+        copies = self.hedged(publisher, fake_queue)
+        publisher.hedging.budget = 0
+        publisher.TIMEOUT = 0.1
+
+        result = publisher.call_rpc("TOTAL_USERS_RPC", {})
+
+        assert "Timeout" in result["error"]
+        assert len(copies) == 1
+        assert publisher.hedging.over_budget == 1
+
+    async def test_async_first_reply_wins(self, async_publisher, fake_queue):
+        copies = self.hedged(async_publisher, fake_queue)
+
+        result = await async_publisher.call_rpc("TOTAL_USERS_RPC", {"value": 2})
+
+        assert result["data"] == {"value": 2}
+        assert len(copies) == 2
+
+
+@pytest.mark.unit
+class TestAsyncPublisherStreaming:
+
+    def chunked_replies(self, fake_queue, order, total):
+        def publish(TopicArn, Message, MessageAttributes=None):
+            correlation_id = json.loads(Message)["correlation_id"]
+            for seq in order:
+                reply = {
+                    "correlation_id": correlation_id,
+                    "data": {"users": [seq]},
+                    "status": "OK",
+                    "chunk": {"seq": seq, "last": seq == total - 1}
+                }
+                fake_queue.messages.append({"Body": json.dumps(reply), "ReceiptHandle": f"rh-{seq}"})
+        return publish
+
+    async def test_chunks_are_yielded_in_order(self, async_publisher, fake_queue):
+        async_publisher.sns.publish.side_effect = self.chunked_replies(fake_queue, [2, 0, 3, 1], 4)
+
+        chunks = [chunk async for chunk in async_publisher.stream_rpc("LIST_USERS_STREAM_RPC", {})]
+
+        assert [chunk["data"]["users"] for chunk in chunks] == [[0], [1], [2], [3]]
+        assert async_publisher._streams == {}
+
+    async def test_plain_reply_ends_stream(self, async_publisher):
+        chunks = [chunk async for chunk in async_publisher.stream_rpc("LIST_USERS_STREAM_RPC", {"a": 1})]
+
+        assert len(chunks) == 1
+        assert chunks[0]["data"] == {"a": 1}
+
+    async def test_missing_chunk_times_out(self, async_publisher, fake_queue):
+        async_publisher.TIMEOUT = 0.2
+        async_publisher.sns.publish.side_effect = self.chunked_replies(fake_queue, [0, 2], 3)
+
+        chunks = [chunk async for chunk in async_publisher.stream_rpc("LIST_USERS_STREAM_RPC", {})]
+
+        assert chunks[0]["data"]["users"] == [0]
+        assert chunks[-1]["success"] is False
+        assert "Timeout" in chunks[-1]["error"]
+
+    async def test_cancelled_stream_drops_its_entry(self, async_publisher):
+        async_publisher.sns.publish.side_effect = None
+
+        async def read_all():
+            return [chunk async for chunk in async_publisher.stream_rpc("LIST_USERS_STREAM_RPC", {})]
+
+        reader = asyncio.create_task(read_all())
+        await asyncio.sleep(0.05)
+        assert len(async_publisher._streams) == 1
+
+        reader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await reader
+
+        assert async_publisher._streams == {}
+
+
+@pytest.mark.unit
+class TestPublishBatch:
+
+    def batch_sizes(self, pub):
+        return [len(call.kwargs["PublishBatchRequestEntries"]) for call in pub.sns.publish_batch.call_args_list]
+
+    def test_events_are_sent_in_groups_of_ten(self, publisher):
+        publisher.sns.publish_batch.return_value = {"Successful": [], "Failed": []}
+        events = [("USER_REGISTERED_EVENT", {"id": index}) for index in range(23)]
+
+        result = publisher.publish_batch(events)
+
+        assert result == {"success": True, "published": 23, "failed": []}
+        assert self.batch_sizes(publisher) == [10, 10, 3]
+        entries = publisher.sns.publish_batch.call_args_list[0].kwargs["PublishBatchRequestEntries"]
+        assert json.loads(entries[4]["Message"])["payload"] == {"id": 4}
+        assert entries[4]["MessageAttributes"] == {
+            **codec_attributes(publisher.codec),
+            "event_type": {"DataType": "String", "StringValue": "USER_REGISTERED_EVENT"},
+            "lane": {"DataType": "String", "StringValue": "event"}
+        }
+
+    def test_failed_entries_are_reported_and_not_notified(self, publisher):
+        publisher.sns.publish_batch.return_value = {
+            "Successful": [],
+            "Failed": [{"Id": "1", "Code": "InternalError", "Message": "boom"}]
+        }
+        notified = []
+        publisher.add_publish_listener(lambda event_type, payload: notified.append(payload["id"]))
+
+        result = publisher.publish_batch([("SEND_EMAIL", {"id": 0}), ("SEND_EMAIL", {"id": 1})])
+
+        assert result["success"] is False
+        assert result["published"] == 1
+        assert result["failed"] == [{"event_type": "SEND_EMAIL", "error": "boom"}]
+        assert notified == [0]
+
+    async def test_async_groups_run_and_failures_are_isolated(self, async_publisher):
+        calls = []
+
+        def publish_batch(TopicArn, PublishBatchRequestEntries):
+            calls.append(len(PublishBatchRequestEntries))
+            if len(calls) == 2:
+                raise RuntimeError("throttled")
+            return {"Successful": [], "Failed": []}
+
+        async_publisher.sns.publish_batch.side_effect = publish_batch
+
+        result = await async_publisher.publish_batch([("SEND_EMAIL", {"id": index}) for index in range(25)])
+
+        assert sorted(calls) == [5, 10, 10]
+        assert result["success"] is False
+        assert result["published"] + len(result["failed"]) == 25
+        assert {failure["error"] for failure in result["failed"]} == {"throttled"}
+
+    async def test_empty_batch(self, async_publisher):
+        assert await async_publisher.publish_batch([]) == {"success": True, "published": 0, "failed": []}
+        async_publisher.sns.publish_batch.assert_not_called()
+
+
+@pytest.mark.unit
+class TestPrivateResponseQueue:
+
+    def test_rpc_requests_carry_reply_to(self, publisher):
+        publisher.sqs.create_queue.return_value = {"QueueUrl": "http://queue/beeneu-gateway-abc"}
+
+        url = publisher.create_private_response_queue()
+        result = publisher.call_rpc("TOTAL_USERS_RPC", {})
+        publisher.publish("USER_UPDATED_EVENT", {})
+
+        name = publisher.sqs.create_queue.call_args.kwargs["QueueName"]
+        assert name.startswith("beeneu-gateway-") and len(name) <= 80
+        assert url == publisher.response_queue_url == "http://queue/beeneu-gateway-abc"
+        assert result["success"] is True
+        rpc, event = [json.loads(call.kwargs["Message"]) for call in publisher.sns.publish.call_args_list]
+        assert rpc["reply_to"] == url
+        assert "reply_to" not in event
+
+    def test_rpc_requests_carry_a_deadline(self, publisher):
+        before = time.time()
+        publisher.call_rpc("TOTAL_USERS_RPC", {})
+        publisher.publish("USER_UPDATED_EVENT", {})
+
+        rpc, event = [json.loads(call.kwargs["Message"]) for call in publisher.sns.publish.call_args_list]
+        assert before + publisher.TIMEOUT <= rpc["deadline"] <= time.time() + publisher.TIMEOUT
+        assert "deadline" not in event
+
+    def test_named_queue_is_claimed(self, publisher):
+        publisher.sqs.create_queue.return_value = {"QueueUrl": "http://queue/gateway-pod-1"}
+
+        publisher.create_private_response_queue("gateway-pod-1")
+        publisher.create_private_response_queue("ignored")
+
+        publisher.sqs.create_queue.assert_called_once()
+        assert publisher.sqs.create_queue.call_args.kwargs["QueueName"] == "gateway-pod-1"
+
+    def test_close_deletes_queue_and_restores_shared_one(self, publisher):
+        publisher.sqs.create_queue.return_value = {"QueueUrl": "http://queue/private"}
+        publisher.create_private_response_queue()
+
+        publisher.close()
+
+        publisher.sqs.delete_queue.assert_called_once_with(QueueUrl="http://queue/private")
+        assert publisher.response_queue_url == "http://queue/response"
+
+    async def test_async_close_deletes_queue(self, async_publisher):
+        async_publisher.sqs.create_queue.return_value = {"QueueUrl": "http://queue/private"}
+        async_publisher.create_private_response_queue()
+
+        result = await async_publisher.call_rpc("TOTAL_USERS_RPC", {"a": 1})
+        await async_publisher.close()
+
+        assert result["data"] == {"a": 1}
+        async_publisher.sqs.delete_queue.assert_called_once_with(QueueUrl="http://queue/private")
@@ -0,0 +1,128 @@
+import time
+import pytest
+from core.resilience import CLOSED, OPEN, HALF_OPEN, CircuitBreaker, HedgePolicy, LatencyTracker
+
+
+@pytest.mark.unit
+class TestCircuitBreaker:
+
+    def test_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker("TOTAL_USERS_RPC", failure_threshold=3, reset_timeout=60)
+
+        for _ in range(2):
+            breaker.record_failure()
+        breaker.record_success()
+        for _ in range(2):
+            breaker.record_failure()
+        assert breaker.state == CLOSED and breaker.allow()
+
+        breaker.record_failure()
+
+        assert breaker.state == OPEN
+        assert not breaker.allow()
+        assert breaker.rejected == 1
+        assert 0 < breaker.retry_after() <= 60
+
+    def test_half_open_lets_one_probe_through(self):
+        breaker = CircuitBreaker("TOTAL_USERS_RPC", failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure()
+        time.sleep(0.06)
+
+        assert breaker.allow()
+        assert breaker.state == HALF_OPEN
+        assert not breaker.allow()
+
+        breaker.record_success()
+
+        assert breaker.state == CLOSED and breaker.allow()
+
+    def test_failed_probe_reopens(self):
+        breaker = CircuitBreaker("TOTAL_USERS_RPC", failure_threshold=5, reset_timeout=0.05)
+        for _ in range(5):
+            breaker.record_failure()
+        time.sleep(0.06)
+        assert breaker.allow()
+
+        breaker.record_failure()
+
+        assert breaker.state == OPEN and not breaker.allow()
+
+    def test_abandoned_probe_is_retried(self):
+        breaker = CircuitBreaker("TOTAL_USERS_RPC", failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure()
+        time.sleep(0.06)
+        assert breaker.allow()
+
+        time.sleep(0.06)
+
+        assert breaker.allow()
+
+
+@pytest.mark.unit
+class TestLatencyTracker:
+
+    def test_ceiling_until_enough_samples(self):
+        tracker = LatencyTracker(min_samples=20, refresh=1)
+        for _ in range(19):
+            tracker.record("TOTAL_USERS_RPC", 0.01)
+
+        assert tracker.timeout("TOTAL_USERS_RPC", ceiling=10) == 10
+
+    def test_timeout_follows_the_percentile(self):
+        tracker = LatencyTracker(percentile=99, factor=2, min_samples=10, floor=0.1, refresh=1)
+        for index in range(100):
+            tracker.record("LIST_USERS_RPC", 0.5 if index == 99 else 0.2)
+
+        # p99 of 100 samples is the 99th smallest: 0.2 s
+        assert tracker.timeout("LIST_USERS_RPC", ceiling=10) == pytest.approx(0.4)
+        assert tracker.timeout("TOTAL_USERS_RPC", ceiling=10) == 10
+
+    def test_timeout_is_clamped(self):
+        tracker = LatencyTracker(factor=3, min_samples=10, floor=1.0, refresh=1)
+        for _ in range(10):
+            tracker.record("FAST_RPC", 0.001)
+            tracker.record("SLOW_RPC", 8)
+
+        assert tracker.timeout("FAST_RPC", ceiling=10) == 1.0
+        assert tracker.timeout("SLOW_RPC", ceiling=10) == 10
+
+    def test_old_samples_leave_the_window(self):
+        tracker = LatencyTracker(window=20, percentile=50, factor=1, min_samples=10, floor=0, refresh=1)
+        for _ in range(20):
+            tracker.record("TOTAL_USERS_RPC", 5)
+        for _ in range(20):
+            tracker.record("TOTAL_USERS_RPC", 0.1)
+
+        assert tracker.timeout("TOTAL_USERS_RPC", ceiling=10) == pytest.approx(0.1)
+
+
+@pytest.mark.unit
+class TestHedgePolicy:
+
+    def tracker(self, event_type="TOTAL_USERS_RPC"):
+        tracker = LatencyTracker(min_samples=10, refresh=1)
+        for index in range(100):
+            tracker.record(event_type, (index + 1) / 1000)
+        return tracker
+
+    def test_delay_is_the_percentile_latency(self):
+        policy = HedgePolicy(["TOTAL_USERS_RPC"], percentile=95)
+
+        assert policy.delay("TOTAL_USERS_RPC", self.tracker()) == pytest.approx(0.095)
+        assert policy.delay("REGISTER_USER_RPC", self.tracker("REGISTER_USER_RPC")) is None
+        assert policy.delay("TOTAL_USERS_RPC", LatencyTracker()) is None
+
+    def test_budget_caps_hedges(self):
+        policy = HedgePolicy(["TOTAL_USERS_RPC"], budget=0.1, burst=2)
+        tracker = self.tracker()
+
+        for _ in range(9):
+            policy.delay("TOTAL_USERS_RPC", tracker)
+        assert not policy.acquire()
+        policy.delay("TOTAL_USERS_RPC", tracker)
+        assert policy.acquire()
+
+        for _ in range(100):
+            policy.delay("TOTAL_USERS_RPC", tracker)
+        assert [policy.acquire() for _ in range(3)] == [True, True, False]
+        assert (policy.hedged, policy.over_budget) == (3, 2)
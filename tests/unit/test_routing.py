@@ -0,0 +1,174 @@
+import json
+import pytest
+from unittest.mock import MagicMock
+from core.local_broker import LocalBroker, queue_arn
+from core.publisher import Publisher
+from core.routing import apply_filter_policy, apply_lane_policies, event_type_attributes, filter_policy, lane_filter_policy, lane_for
+from apis.users import main as users_service
+from apis.users.repository import UserRepository
+from apis.statistics import main as statistics_service
+from apis.statistics.repository import StatisticsRepository
+
+TOPIC_ARN = "arn:aws:sns:sa-east-1:000000000000:beeneu-topic"
+
+
+@pytest.fixture
+def broker():
+    broker = LocalBroker()
+    broker.create_topic("beeneu-topic")
+    for service in (users_service, statistics_service):
+        # Lane-split at subscribe time, like localstack-init
+        broker.subscribe(TOPIC_ARN, broker.create_queue(service.QUEUE_URL.rsplit("/", 1)[-1]), filter_policy=lane_filter_policy("rpc"))
+        broker.subscribe(
+            TOPIC_ARN, broker.create_queue(service.EVENTS_QUEUE_URL.rsplit("/", 1)[-1]), filter_policy=lane_filter_policy("event")
+        )
+    return broker
+
+
+def queued_event_types(broker, queue_url):
+    messages = broker.sqs_client().receive_message(QueueUrl=queue_url, MaxNumberOfMessages=10).get("Messages", [])
+    return sorted(json.loads(message["Body"])["event_type"] for message in messages)
+
+
+@pytest.mark.unit
+class TestFilterPolicies:
+
+    def test_policy_lists_event_types_and_keeps_untagged_messages(self):
+        assert filter_policy(["B_RPC", "A_EVENT", "B_RPC"]) == {"event_type": ["A_EVENT", "B_RPC", {"exists": False}]}
+        assert event_type_attributes("A_EVENT") == {
+            "event_type": {"DataType": "String", "StringValue": "A_EVENT"},
+            "lane": {"DataType": "String", "StringValue": "event"}
+        }
+
+    def test_lane_policies(self):
+        assert lane_for("TOTAL_USERS_RPC") == "rpc"
+        assert lane_for("USER_REGISTERED_EVENT") == "event"
+        assert filter_policy(["B_RPC"], lane="rpc") == {"event_type": ["B_RPC", {"exists": False}], "lane": ["rpc", {"exists": False}]}
+        assert filter_policy(["A_EVENT"], lane="event") == {"event_type": ["A_EVENT"], "lane": ["event"]}
+        assert lane_filter_policy("rpc") == {"lane": ["rpc", {"exists": False}]}
+        assert lane_filter_policy("event") == {"lane": ["event"]}
+
+    def test_each_queue_only_gets_what_its_handlers_take(self, broker, reset_users_state, reset_statistics_state):
+        tables = {
+            users_service.QUEUE_URL: users_service.build_event_handlers(UserRepository()),
+            statistics_service.QUEUE_URL: statistics_service.build_event_handlers(StatisticsRepository()),
+        }
+        for queue_url, handlers in tables.items():
+            assert apply_filter_policy(TOPIC_ARN, queue_url, handlers, broker.sns_client(), broker.sqs_client())
+
+        publisher = Publisher(TOPIC_ARN, sns_client=broker.sns_client(), sqs_client=broker.sqs_client())
+        for event_type in ("REGISTER_USER_RPC", "TOTAL_USERS_RPC", "USER_REGISTERED_EVENT", "SEND_EMAIL"):
+            publisher.publish(event_type, {})
+
+        assert queued_event_types(broker, users_service.QUEUE_URL) == ["REGISTER_USER_RPC", "SEND_EMAIL"]
+        assert queued_event_types(broker, statistics_service.QUEUE_URL) == ["TOTAL_USERS_RPC", "USER_REGISTERED_EVENT"]
+
+    def test_untagged_messages_reach_every_queue(self, broker):
+        apply_filter_policy(TOPIC_ARN, users_service.QUEUE_URL, ["REGISTER_USER_RPC"], broker.sns_client(), broker.sqs_client())
+
+        broker.sns_client().publish(TopicArn=TOPIC_ARN, Message=json.dumps({"event_type": "LEGACY"}))
+
+        assert queued_event_types(broker, users_service.QUEUE_URL) == ["LEGACY"]
+
+    def test_queue_without_subscription(self, broker):
+        queue_url = broker.create_queue("orphan-queue")
+
+        assert apply_filter_policy(TOPIC_ARN, queue_url, ["X"], broker.sns_client(), broker.sqs_client()) is False
+
+    def test_broker_errors_are_not_fatal(self):
+        sqs = MagicMock()
+        sqs.get_queue_attributes.side_effect = RuntimeError("unreachable")
+
+        assert apply_filter_policy(TOPIC_ARN, "http://queue/users", ["X"], MagicMock(), sqs) is False
+
+    def test_subscription_pages_are_followed(self):
+        sqs = MagicMock()
+        sqs.get_queue_attributes.return_value = {"Attributes": {"QueueArn": "arn:queue"}}
+        sns = MagicMock()
+        sns.list_subscriptions_by_topic.side_effect = [
+            {"Subscriptions": [{"SubscriptionArn": "sub-1", "Endpoint": "arn:other"}], "NextToken": "next"},
+            {"Subscriptions": [{"SubscriptionArn": "sub-2", "Endpoint": "arn:queue"}]},
+        ]
+
+        assert apply_filter_policy(TOPIC_ARN, "http://queue/users", ["X"], sns, sqs) is True
+
+        assert sns.list_subscriptions_by_topic.call_args_list[1].kwargs == {"TopicArn": TOPIC_ARN, "NextToken": "next"}
+        sns.set_subscription_attributes.assert_called_once_with(
+            SubscriptionArn="sub-2",
+            AttributeName="FilterPolicy",
+            AttributeValue=json.dumps(filter_policy(["X"]))
+        )
+
+
+@pytest.mark.unit
+class TestLanePolicies:
+
+    def test_rpcs_and_events_are_split(self, broker, reset_users_state, reset_statistics_state):
+        for service, repository in ((users_service, UserRepository()), (statistics_service, StatisticsRepository())):
+            handlers = service.build_event_handlers(repository)
+            assert apply_lane_policies(
+                TOPIC_ARN, service.QUEUE_URL, service.EVENTS_QUEUE_URL, handlers, broker.sns_client(), broker.sqs_client()
+            )
+
+        publisher = Publisher(TOPIC_ARN, sns_client=broker.sns_client(), sqs_client=broker.sqs_client())
+        for event_type in ("REGISTER_USER_RPC", "TOTAL_USERS_RPC", "USER_REGISTERED_EVENT", "SEND_EMAIL"):
+            publisher.publish(event_type, {})
+
+        assert queued_event_types(broker, users_service.QUEUE_URL) == ["REGISTER_USER_RPC"]
+        assert queued_event_types(broker, users_service.EVENTS_QUEUE_URL) == ["SEND_EMAIL"]
+        assert queued_event_types(broker, statistics_service.QUEUE_URL) == ["TOTAL_USERS_RPC"]
+        assert queued_event_types(broker, statistics_service.EVENTS_QUEUE_URL) == ["USER_REGISTERED_EVENT"]
+
+    def test_untagged_messages_go_to_the_rpc_lane_only(self, broker):
+        apply_lane_policies(
+            TOPIC_ARN, users_service.QUEUE_URL, users_service.EVENTS_QUEUE_URL, ["REGISTER_USER_RPC", "SEND_EMAIL"],
+            broker.sns_client(), broker.sqs_client()
+        )
+
+        broker.sns_client().publish(TopicArn=TOPIC_ARN, Message=json.dumps({"event_type": "LEGACY"}))
+
+        assert queued_event_types(broker, users_service.QUEUE_URL) == ["LEGACY"]
+        assert queued_event_types(broker, users_service.EVENTS_QUEUE_URL) == []
+
+    def test_unsubscribed_event_lane_keeps_every_event_type_on_the_main_queue(self, broker):
+        queue_url = broker.create_queue("solo-queue")
+        broker.subscribe(TOPIC_ARN, queue_url)
+        events_queue_url = broker.create_queue("solo-events-queue")
+
+        assert apply_lane_policies(
+            TOPIC_ARN, queue_url, events_queue_url, ["REGISTER_USER_RPC", "SEND_EMAIL"],
+            broker.sns_client(), broker.sqs_client()
+        ) is False
+
+        publisher = Publisher(TOPIC_ARN, sns_client=broker.sns_client(), sqs_client=broker.sqs_client())
+        for event_type in ("REGISTER_USER_RPC", "SEND_EMAIL", "TOTAL_USERS_RPC"):
+            publisher.publish(event_type, {})
+
+        assert queued_event_types(broker, queue_url) == ["REGISTER_USER_RPC", "SEND_EMAIL"]
+
+    def test_failure_between_the_two_policies_never_duplicates(self, broker):
+        sns = broker.sns_client()
+        events_subscription = next(
+            subscription["SubscriptionArn"] for subscription in broker.subscriptions(TOPIC_ARN)
+            if subscription["Endpoint"] == queue_arn("users-events-queue")
+        )
+        set_attributes = sns.set_subscription_attributes
+
+        def refuse_event_lane(**kwargs):
+            if kwargs["SubscriptionArn"] == events_subscription:
+                raise RuntimeError("throttled")
+            return set_attributes(**kwargs)
+
+        sns.set_subscription_attributes = refuse_event_lane
+        assert apply_lane_policies(
+            TOPIC_ARN, users_service.QUEUE_URL, users_service.EVENTS_QUEUE_URL, ["REGISTER_USER_RPC", "SEND_EMAIL"],
+            sns, broker.sqs_client()
+        ) is False
+
+        publisher = Publisher(TOPIC_ARN, sns_client=broker.sns_client(), sqs_client=broker.sqs_client())
+        for event_type in ("REGISTER_USER_RPC", "SEND_EMAIL", "USER_REGISTERED_EVENT"):
+            publisher.publish(event_type, {})
+
+        # The event lane is not narrowed yet but still only gets events
+        assert queued_event_types(broker, users_service.QUEUE_URL) == ["REGISTER_USER_RPC"]
+        assert queued_event_types(broker, users_service.EVENTS_QUEUE_URL) == ["SEND_EMAIL", "USER_REGISTERED_EVENT"]
@@ -0,0 +1,148 @@
+import asyncio
+import pytest
+from unittest.mock import MagicMock
+from freezegun import freeze_time
+from core.rpc_cache import RPCCache
+
+
+def slow_publisher(result=None, delay=0.05):
+    calls = []
+
+    async def call_rpc(event_type, payload):
+        calls.append((event_type, payload))
+        await asyncio.sleep(delay)
+        return result if result is not None else {"success": True, "data": {"n": len(calls)}}
+
+    publisher = MagicMock()
+    publisher.call_rpc = call_rpc
+    publisher.calls = calls
+    return publisher
+
+
+@pytest.mark.unit
+class TestRPCCache:
+
+    async def test_concurrent_identical_calls_share_one_rpc(self):
+        cache = RPCCache(ttl=1)
+        publisher = slow_publisher()
+
+        results = await asyncio.gather(*(cache.call_rpc(publisher, "TOTAL_USERS_RPC", {}) for _ in range(50)))
+
+        assert len(publisher.calls) == 1
+        assert all(result == {"success": True, "data": {"n": 1}} for result in results)
+        assert (cache.misses, cache.coalesced) == (1, 49)
+
+    async def test_different_payloads_are_separate_calls(self):
+        cache = RPCCache(ttl=1)
+        publisher = slow_publisher(delay=0)
+
+        await cache.call_rpc(publisher, "LIST_USERS_RPC", {"name": "Ana"})
+        await cache.call_rpc(publisher, "LIST_USERS_RPC", {"name": "Luis"})
+        await cache.call_rpc(publisher, "LIST_USERS_RPC", {"name": "Ana"})
+
+        assert len(publisher.calls) == 2
+
+    async def test_results_expire_after_ttl(self):
+        cache = RPCCache(ttl=5)
+        publisher = slow_publisher(delay=0)
+
+        with freeze_time("2026-01-01 12:00:00") as frozen:
+            first = await cache.call_rpc(publisher, "TOTAL_USERS_RPC", {})
+            frozen.tick(4)
+            cached = await cache.call_rpc(publisher, "TOTAL_USERS_RPC", {})
+            frozen.tick(2)
+            refreshed = await cache.call_rpc(publisher, "TOTAL_USERS_RPC", {})
+
+        assert first == cached
+        assert refreshed["data"] == {"n": 2}
+        assert cache.hits == 1
+
+    async def test_failures_are_shared_but_not_cached(self):
+        cache = RPCCache(ttl=60)
+        publisher = slow_publisher(result={"success": False, "error": "Timeout"})
+
+        results = await asyncio.gather(*(cache.call_rpc(publisher, "TOTAL_USERS_RPC", {}) for _ in range(3)))
+        await cache.call_rpc(publisher, "TOTAL_USERS_RPC", {})
+
+        assert all(result["success"] is False for result in results)
+        assert len(publisher.calls) == 2
+
+    async def test_published_events_invalidate_related_rpcs(self):
+        cache = RPCCache(ttl=60)
+        cache.invalidate_on("USER_REGISTERED_EVENT", "TOTAL_USERS_RPC")
+        publisher = slow_publisher(delay=0)
+
+        await cache.call_rpc(publisher, "TOTAL_USERS_RPC", {})
+        await cache.call_rpc(publisher, "TOTAL_UPDATES_RPC", {})
+        cache.on_publish("USER_REGISTERED_EVENT", {"id": 1})
+        cache.on_publish("SEND_EMAIL", {})
+        await cache.call_rpc(publisher, "TOTAL_USERS_RPC", {})
+        await cache.call_rpc(publisher, "TOTAL_UPDATES_RPC", {})
+
+        assert [event for event, _ in publisher.calls] == ["TOTAL_USERS_RPC", "TOTAL_UPDATES_RPC", "TOTAL_USERS_RPC"]
+
+    async def test_invalidation_during_flight_is_not_overwritten(self):
+        cache = RPCCache(ttl=60)
+        publisher = slow_publisher()
+
+        pending = asyncio.ensure_future(cache.call_rpc(publisher, "TOTAL_USERS_RPC", {}))
+        await asyncio.sleep(0.01)
+        cache.invalidate("TOTAL_USERS_RPC")
+        await pending
+        await cache.call_rpc(publisher, "TOTAL_USERS_RPC", {})
+
+        assert len(publisher.calls) == 2
+
+    async def test_callers_after_invalidation_do_not_join_the_stale_call(self):
+        cache = RPCCache(ttl=60)
+        publisher = slow_publisher()
+
+        before = asyncio.ensure_future(cache.call_rpc(publisher, "TOTAL_USERS_RPC", {}))
+        await asyncio.sleep(0.01)
+        cache.invalidate("TOTAL_USERS_RPC")
+        after = await cache.call_rpc(publisher, "TOTAL_USERS_RPC", {})
+        await before
+
+        # The second caller started its own RPC, and only that result is cached
+        assert len(publisher.calls) == 2
+        assert await cache.call_rpc(publisher, "TOTAL_USERS_RPC", {}) is after
+        assert (cache.misses, cache.coalesced, cache.hits) == (2, 0, 1)
+
+    async def test_cancelled_caller_does_not_cancel_others(self):
+        cache = RPCCache(ttl=1)
+        publisher = slow_publisher()
+
+        first = asyncio.ensure_future(cache.call_rpc(publisher, "TOTAL_USERS_RPC", {}))
+        second = asyncio.ensure_future(cache.call_rpc(publisher, "TOTAL_USERS_RPC", {}))
+        await asyncio.sleep(0.01)
+        first.cancel()
+
+        assert (await second)["success"] is True
+        assert len(publisher.calls) == 1
+
+    async def test_bounded_entries(self):
+        cache = RPCCache(ttl=60, max_entries=2)
+        publisher = slow_publisher(delay=0)
+
+        for name in ("a", "b", "c"):
+            await cache.call_rpc(publisher, "LIST_USERS_RPC", {"name": name})
+        await cache.call_rpc(publisher, "LIST_USERS_RPC", {"name": "a"})
+
+        assert len(cache._entries) == 2
+        assert len(publisher.calls) == 4
+
+
+@pytest.mark.unit
+class TestPublishListeners:
+
+    def test_listener_called_after_successful_publish(self):
+        from core.publisher import Publisher
+        publisher = Publisher(topic_arn="arn:test", sns_client=MagicMock(), sqs_client=MagicMock())
+        listener = MagicMock(side_effect=[RuntimeError("boom"), None])
+        publisher.add_publish_listener(listener)
+
+        assert publisher.publish("USER_REGISTERED_EVENT", {"id": 1})["success"] is True
+        publisher.sns.publish.side_effect = Exception("down")
+        publisher.publish("USER_REGISTERED_EVENT", {"id": 2})
+
+        listener.assert_called_once_with("USER_REGISTERED_EVENT", {"id": 1})
@@ -73,10 +73,10 @@ class TestRegisteredLast24RPC:
         
         argentina_tz = ZoneInfo("America/Argentina/Buenos_Aires")
         old_timestamp = datetime.now(argentina_tz) - timedelta(hours=26)
-        repo._user_registration_timeline.append(old_timestamp)
+        repo._user_registration_timeline.record(old_timestamp)
         
         recent_timestamp = datetime.now(argentina_tz) - timedelta(hours=1)
-        repo._user_registration_timeline.append(recent_timestamp)
+        repo._user_registration_timeline.record(recent_timestamp)
         
         result = handlers.registered_last_24_rpc({})
         
@@ -87,11 +87,11 @@ class TestRegisteredLast24RPC:
         
         argentina_tz = ZoneInfo("America/Argentina/Buenos_Aires")
         exactly_24h = datetime.now(argentina_tz) - timedelta(hours=24)
-        repo._user_registration_timeline.append(exactly_24h)
+        repo._user_registration_timeline.record(exactly_24h)
         # Assuming boundary condition: > cutoff. if exactly cutoff, it is not > (so excluded)
         
         within_24h = datetime.now(argentina_tz) - timedelta(hours=23, minutes=30)
-        repo._user_registration_timeline.append(within_24h)
+        repo._user_registration_timeline.record(within_24h)
         
         result = handlers.registered_last_24_rpc({})
         
@@ -113,11 +113,11 @@ class TestUserRegisteredEvent:
     def test_user_registered_adds_to_timeline(self, reset_statistics_state, handlers):
         repo = StatisticsRepository()
         
-        initial_count = len(repo._user_registration_timeline)
+        initial_count = repo._user_registration_timeline.total
         handlers.user_registered_event({"id": 1, "name": "Test"})
         
-        assert len(repo._user_registration_timeline) == initial_count + 1
-        assert isinstance(repo._user_registration_timeline[-1], datetime)
+        assert repo._user_registration_timeline.total == initial_count + 1
+        assert repo.get_registered_last_24h() == 1
     
     def test_user_registered_multiple_events(self, reset_statistics_state, handlers):
         handlers.user_registered_event({})
@@ -152,3 +152,38 @@ class TestUserUpdatedEvent:
         
         result = handlers.total_users_rpc({})
         assert result["total_users"] == 0
+
+
+@pytest.mark.unit
+class TestStatisticsSummaryRPC:
+    
+    def test_summary_defaults_to_last_24h(self, reset_statistics_state, handlers):
+        handlers.user_registered_event({})
+        handlers.user_updated_event({})
+        
+        result = handlers.statistics_summary_rpc({})
+        
+        assert result == {"total_users": 1, "total_updates": 1, "registered": {"24h": 1}}
+    
+    def test_summary_multiple_windows(self, reset_statistics_state, handlers):
+        repo = StatisticsRepository()
+        argentina_tz = ZoneInfo("America/Argentina/Buenos_Aires")
+        now = datetime.now(argentina_tz)
+        repo._register(now - timedelta(minutes=30))
+        repo._register(now - timedelta(hours=5))
+        repo._register(now - timedelta(days=3))
+        
+        result = handlers.statistics_summary_rpc({"windows": ["1h", "24h", "7d"]})
+        
+        assert result["total_users"] == 3
+        assert result["registered"] == {"1h": 1, "24h": 2, "7d": 3}
+    
+    def test_summary_invalid_window(self, reset_statistics_state, handlers):
+        result = handlers.statistics_summary_rpc({"windows": ["1y"]})
+        
+        assert "Validation error" in result["error"]
+    
+    def test_summary_window_beyond_retention(self, reset_statistics_state, handlers):
+        result = handlers.statistics_summary_rpc({"windows": ["90d"]})
+        
+        assert "exceeds retention" in result["error"]
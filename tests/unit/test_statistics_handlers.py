@@ -1,4 +1,5 @@
 from unittest.mock import MagicMock
+from datetime import timedelta
 import pytest
 from apis.statistics.event_dispatcher import EventHandlers
 
@@ -19,3 +20,9 @@ class TestStatisticsEventHandlers:
     def test_user_registered_event(self, handlers, mock_repo):
         handlers.user_registered_event({})
         mock_repo.increment_total_users.assert_called_once()
+
+    def test_statistics_summary_rpc(self, handlers, mock_repo):
+        mock_repo.get_summary.return_value = {"total_users": 3, "total_updates": 1, "registered": {"1h": 1}}
+        result = handlers.statistics_summary_rpc({"windows": ["1h"]})
+        assert result["registered"] == {"1h": 1}
+        mock_repo.get_summary.assert_called_once_with({"1h": timedelta(hours=1)})
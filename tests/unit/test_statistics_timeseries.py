@@ -0,0 +1,90 @@
+import pytest
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from apis.statistics.timeseries import RegistrationTimeline, parse_window
+
+ARGENTINA_TZ = ZoneInfo("America/Argentina/Buenos_Aires")
+NOW = datetime(2024, 12, 10, 12, 0, 30, tzinfo=ARGENTINA_TZ)
+
+
+@pytest.fixture
+def timeline():
+    return RegistrationTimeline()
+
+
+@pytest.mark.unit
+class TestRegistrationTimeline:
+
+    def test_empty_timeline_counts_zero(self, timeline):
+        assert timeline.count_since(timedelta(hours=24), NOW) == 0
+
+    def test_counts_events_inside_window(self, timeline):
+        timeline.record(NOW - timedelta(hours=26))
+        timeline.record(NOW - timedelta(hours=23))
+        timeline.record(NOW - timedelta(minutes=5))
+        timeline.record(NOW)
+
+        assert timeline.count_since(timedelta(hours=24), NOW) == 3
+        assert timeline.count_since(timedelta(hours=1), NOW) == 2
+        assert timeline.count_since(timedelta(days=7), NOW) == 4
+        assert timeline.total == 4
+
+    def test_window_slides_with_time(self, timeline):
+        timeline.record(NOW)
+
+        assert timeline.count_since(timedelta(hours=24), NOW + timedelta(hours=23)) == 1
+        assert timeline.count_since(timedelta(hours=24), NOW + timedelta(hours=25)) == 0
+
+    def test_events_older_than_window_are_excluded(self, timeline):
+        timeline.record(NOW - timedelta(hours=24, minutes=1))
+
+        assert timeline.count_since(timedelta(hours=24), NOW) == 0
+
+    def test_out_of_order_events(self, timeline):
+        timeline.record(NOW)
+        timeline.record(NOW - timedelta(hours=2))
+        timeline.record(NOW - timedelta(hours=30))
+
+        assert timeline.count_since(timedelta(hours=1), NOW) == 1
+        assert timeline.count_since(timedelta(hours=24), NOW) == 2
+        assert timeline.count_since(timedelta(days=2), NOW) == 3
+
+    def test_long_gap_wraps_the_ring(self, timeline):
+        timeline.record(NOW)
+        later = NOW + timedelta(days=45)
+        timeline.record(later)
+
+        assert timeline.count_since(timedelta(days=30), later) == 1
+        assert timeline.total == 2
+
+    def test_memory_is_bounded(self, timeline):
+        for minute in range(5000):
+            timeline.record(NOW + timedelta(minutes=minute))
+
+        assert len(timeline._cumulative) == timeline.size
+        assert timeline.count_since(timedelta(hours=1), NOW + timedelta(minutes=4999)) == 60
+
+    def test_window_beyond_retention_rejected(self, timeline):
+        with pytest.raises(ValueError):
+            timeline.count_since(timedelta(days=31), NOW)
+
+    def test_non_positive_window_rejected(self, timeline):
+        with pytest.raises(ValueError):
+            timeline.count_since(timedelta(0), NOW)
+
+
+@pytest.mark.unit
+class TestParseWindow:
+
+    @pytest.mark.parametrize("label, expected", [
+        ("15m", timedelta(minutes=15)),
+        ("24h", timedelta(hours=24)),
+        (" 7d ", timedelta(days=7)),
+    ])
+    def test_valid(self, label, expected):
+        assert parse_window(label) == expected
+
+    @pytest.mark.parametrize("label", ["", "h", "0h", "-1h", "1.5h", "3w", "24"])
+    def test_invalid(self, label):
+        with pytest.raises(ValueError):
+            parse_window(label)
@@ -0,0 +1,225 @@
+import base64
+import json
+import time
+import zlib
+import pytest
+from unittest.mock import AsyncMock
+from core.local_broker import LocalBroker
+from apis.statistics.repository import EPOCH_COUNT, EPOCH_ID, SEQUENCE_HEADER, AppliedSequence, EpochSequences, StatisticsRepository
+from apis.statistics.event_dispatcher import EventHandlers
+from apis.statistics.view import StatisticsView
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.fixture
+def broker():
+    broker = LocalBroker()
+    broker.create_queue("gateway-statistics-queue")
+    return broker
+
+
+@pytest.fixture
+def view(broker):
+    view = StatisticsView("http://localhost:4566/000000000000/gateway-statistics-queue", sqs_client=broker.sqs_client())
+    view.consumer.POLLING_TIME = 0.05
+    yield view
+    view.stop()
+
+
+def send_event(broker, event_type, payload=None):
+    broker.sqs_client().send_message(
+        QueueUrl="http://localhost:4566/000000000000/gateway-statistics-queue",
+        MessageBody=json.dumps({"event_type": event_type, "correlation_id": "cid", "payload": payload or {}})
+    )
+
+
+def snapshot_of(total_users, total_updates):
+    # Users 1..total_users registered and update_seq 1..total_updates applied
+    repo = StatisticsRepository.detached()
+    for seq in range(1, total_users + 1):
+        repo.increment_total_users(seq=seq)
+    for seq in range(1, total_updates + 1):
+        repo.increment_total_updates(seq=seq)
+    return repo.export_snapshot()
+
+
+@pytest.mark.unit
+class TestDetachedRepository:
+
+    def test_detached_instances_are_independent(self, reset_statistics_state):
+        detached = StatisticsRepository.detached()
+        detached.increment_total_users()
+
+        assert StatisticsRepository() is StatisticsRepository()
+        assert detached is not StatisticsRepository()
+        assert StatisticsRepository().get_total_users() == 0
+
+    def test_snapshot_rpc_round_trip(self):
+        source = StatisticsRepository.detached()
+        source.increment_total_users()
+        source.increment_total_users()
+        source.increment_total_updates()
+
+        data = EventHandlers(source).statistics_snapshot_rpc({})
+        target = StatisticsRepository.detached()
+        target.import_snapshot(zlib.decompress(base64.b64decode(data["snapshot"])))
+
+        assert target.get_summary({}) == {"total_users": 2, "total_updates": 1, "registered": {}}
+        assert target.get_registered_last_24h() == 2
+
+    def test_snapshot_carries_applied_sequences(self):
+        target = StatisticsRepository.detached()
+        target.import_snapshot(snapshot_of(3, 2))
+
+        assert target.increment_total_users(seq=3) is False
+        assert target.increment_total_updates(seq=2) is False
+        assert target.increment_total_users(seq=4) is True
+        assert (target.get_total_users(), target.get_total_updates()) == (4, 2)
+
+    def test_snapshot_without_sequences_still_loads(self):
+        source = StatisticsRepository.detached()
+        source.increment_total_users(seq=1)
+        # Body layout from before events were sequenced: counts and timeline only
+        legacy = source.export_snapshot()[:-(2 * EPOCH_COUNT.size + EPOCH_ID.size + SEQUENCE_HEADER.size)]
+
+        target = StatisticsRepository.detached()
+        target.import_snapshot(legacy)
+
+        assert target.get_total_users() == 1
+        assert target.increment_total_users(seq=1) is True
+
+    def test_sequences_are_scoped_by_users_epoch(self):
+        repo = StatisticsRepository.detached()
+        repo.increment_total_users(seq=1, epoch=100)
+        repo.increment_total_updates(seq=1, epoch=100)
+
+        # A reset users store starts its ids and update_seq over in a new epoch
+        assert repo.increment_total_users(seq=1, epoch=200) is True
+        assert repo.increment_total_updates(seq=1, epoch=200) is True
+        assert repo.increment_total_users(seq=1, epoch=100) is False
+
+        target = StatisticsRepository.detached()
+        target.import_snapshot(repo.export_snapshot())
+        assert target.increment_total_users(seq=1, epoch=200) is False
+        assert target.increment_total_updates(seq=1, epoch=100) is False
+        assert target.increment_total_updates(seq=2, epoch=100) is True
+
+
+@pytest.mark.unit
+class TestEpochSequences:
+
+    def test_least_recently_used_epoch_is_dropped(self):
+        sequences = EpochSequences()
+        sequences.MAX_EPOCHS = 2
+        sequences.add(1, 1)
+        sequences.add(2, 1)
+        sequences.add(1, 2)
+        sequences.add(3, 1)
+
+        assert list(sequences.epochs) == [1, 3]
+        assert (1, 2) in sequences
+        assert (2, 1) not in sequences
+
+
+@pytest.mark.unit
+class TestAppliedSequence:
+
+    def test_out_of_order_numbers_advance_the_watermark(self):
+        sequence = AppliedSequence()
+        for seq in (2, 3, 1, 5):
+            sequence.add(seq)
+
+        assert (sequence.through, sequence.ahead) == (3, {5})
+        assert 1 in sequence and 5 in sequence
+        assert 4 not in sequence
+
+    def test_missing_number_is_given_up(self):
+        sequence = AppliedSequence()
+        sequence.MAX_AHEAD = 2
+        for seq in (2, 3, 4):
+            sequence.add(seq)
+
+        assert (sequence.through, sequence.ahead) == (4, set())
+        assert 1 in sequence
+
+
+@pytest.mark.unit
+class TestStatisticsView:
+
+    def test_not_fresh_until_seeded(self, view):
+        view.start()
+
+        assert not wait_until(lambda: view._synced_at is not None, timeout=0.2)
+        assert view.staleness() is None
+        assert view.is_fresh() is False
+
+    def test_events_before_seed_wait_for_the_snapshot(self, broker, view):
+        view.start()
+        send_event(broker, "USER_REGISTERED_EVENT", {"id": 5})
+        send_event(broker, "USER_REGISTERED_EVENT", {"id": 6})
+        assert not wait_until(lambda: broker.depth("gateway-statistics-queue") == (0, 0), timeout=0.2)
+
+        view.load_snapshot(snapshot_of(5, 2))
+
+        # User 5 is already counted in the snapshot, user 6 is not
+        assert wait_until(lambda: broker.depth("gateway-statistics-queue") == (0, 0))
+        assert wait_until(lambda: view._synced_at is not None)
+        assert view.repository.get_total_users() == 6
+
+    def test_events_in_the_snapshot_are_skipped_after_seed(self, broker, view):
+        view.load_snapshot(snapshot_of(5, 2))
+        view.start()
+
+        send_event(broker, "USER_UPDATED_EVENT", {"id": 1, "update_seq": 2})
+        send_event(broker, "USER_UPDATED_EVENT", {"id": 1, "update_seq": 3})
+
+        assert wait_until(lambda: view.repository.get_total_updates() == 3)
+        assert wait_until(lambda: broker.depth("gateway-statistics-queue") == (0, 0))
+        assert view.repository.get_total_updates() == 3
+
+    def test_events_after_seed_are_folded(self, broker, view):
+        view.load_snapshot(snapshot_of(5, 2))
+        view.start()
+
+        send_event(broker, "USER_REGISTERED_EVENT")
+        send_event(broker, "USER_UPDATED_EVENT")
+        send_event(broker, "SEND_EMAIL")
+
+        assert wait_until(lambda: view.repository.get_total_updates() == 3)
+        assert view.repository.get_total_users() == 6
+        assert view.repository.get_registered_last_24h() == 6
+        assert view.is_fresh() is True
+        assert 0 <= view.staleness() < 1
+
+    def test_backlog_from_before_start_is_folded_once(self, broker, view):
+        send_event(broker, "USER_REGISTERED_EVENT", {"id": 1})
+        send_event(broker, "USER_REGISTERED_EVENT", {"id": 2})
+        view.load_snapshot(snapshot_of(1, 0))
+
+        view.start()
+        assert wait_until(lambda: view._synced_at is not None)
+
+        # User 1 is in the snapshot, user 2 is not
+        assert wait_until(lambda: broker.depth("gateway-statistics-queue") == (0, 0))
+        assert view.repository.get_total_users() == 2
+
+    async def test_seed_retries_until_snapshot_arrives(self, view):
+        view.SEED_RETRY = 0
+        publisher = AsyncMock()
+        publisher.call_rpc.side_effect = [
+            {"success": False, "error": "Timeout after 10 seconds"},
+            {"success": True, "data": {"snapshot": base64.b64encode(zlib.compress(snapshot_of(3, 1))).decode()}},
+        ]
+
+        await view.seed(publisher)
+
+        assert publisher.call_rpc.call_count == 2
+        assert view.repository.get_total_users() == 3
@@ -1,9 +1,14 @@
 
 
+import json
 import pytest
 from datetime import datetime
 from apis.users.event_dispatcher import EventHandlers
 from apis.users.repository import UserRepository
+from apis.users.schemas import MAX_PAGE_SIZE
+from core.codec import available_codecs, get_codec
+
+SQS_MAX_MESSAGE_BYTES = 256 * 1024
 
 
 @pytest.fixture
@@ -57,7 +62,8 @@ class TestListUsersRPC:
         
         result = handlers.list_users_rpc({})
         
-        assert len(result) == 2
+        assert len(result["users"]) == 2
+        assert result["next_cursor"] is None
     
     def test_list_users_filter_by_name(self, reset_users_state, handlers):
         handlers.register_user_rpc({"name": "John", "surname": "Doe", "dni": "111", "address": "St 1"})
@@ -65,8 +71,8 @@ class TestListUsersRPC:
         
         result = handlers.list_users_rpc({"name": "John", "surname": None, "dni": None})
         
-        assert len(result) == 1
-        assert result[0]["name"] == "John"
+        assert len(result["users"]) == 1
+        assert result["users"][0]["name"] == "John"
     
     def test_list_users_filter_by_dni(self, reset_users_state, handlers):
         handlers.register_user_rpc({"name": "John", "surname": "Doe", "dni": "111", "address": "St 1"})
@@ -74,8 +80,8 @@ class TestListUsersRPC:
         
         result = handlers.list_users_rpc({"name": None, "surname": None, "dni": "222"})
         
-        assert len(result) == 1
-        assert result[0]["dni"] == "222"
+        assert len(result["users"]) == 1
+        assert result["users"][0]["dni"] == "222"
     
     def test_list_users_multiple_filters(self, reset_users_state, handlers):
         handlers.register_user_rpc({"name": "John", "surname": "Doe", "dni": "111", "address": "St 1"})
@@ -83,15 +89,15 @@ class TestListUsersRPC:
         
         result = handlers.list_users_rpc({"name": "John", "surname": "Doe", "dni": None})
         
-        assert len(result) == 1
-        assert result[0]["surname"] == "Doe"
+        assert len(result["users"]) == 1
+        assert result["users"][0]["surname"] == "Doe"
     
     def test_list_users_no_matches(self, reset_users_state, handlers):
         handlers.register_user_rpc({"name": "John", "surname": "Doe", "dni": "111", "address": "St 1"})
         
         result = handlers.list_users_rpc({"name": "NonExistent", "surname": None, "dni": None})
         
-        assert len(result) == 0
+        assert result["users"] == []
 
 
 @pytest.mark.unit
@@ -156,3 +162,174 @@ class TestSendEmail:
             assert True
         except Exception as e:
             pytest.fail(f"send_email raised an exception: {e}")
+
+
+@pytest.mark.unit
+class TestListUsersPaging:
+    
+    def test_paged_request_returns_cursor(self, reset_users_state, handlers):
+        for dni in ("111", "222", "333"):
+            handlers.register_user_rpc({"name": "John", "surname": "Doe", "dni": dni, "address": "St 1"})
+        
+        first = handlers.list_users_rpc({"limit": 2})
+        second = handlers.list_users_rpc({"limit": 2, "cursor": first["next_cursor"]})
+        
+        assert [user["dni"] for user in first["users"]] == ["111", "222"]
+        assert [user["dni"] for user in second["users"]] == ["333"]
+        assert second["next_cursor"] is None
+    
+    def test_request_without_limit_is_capped_at_max_page_size(self, reset_users_state, handlers, monkeypatch):
+        monkeypatch.setattr("apis.users.event_dispatcher.MAX_PAGE_SIZE", 2)
+        for dni in ("111", "222", "333"):
+            handlers.register_user_rpc({"name": "John", "surname": "Doe", "dni": dni, "address": "St 1"})
+        
+        first = handlers.list_users_rpc({})
+        second = handlers.list_users_rpc({"cursor": first["next_cursor"]})
+        
+        assert [user["dni"] for user in first["users"]] == ["111", "222"]
+        assert [user["dni"] for user in second["users"]] == ["333"]
+        assert second["next_cursor"] is None
+    
+    @pytest.mark.parametrize("codec", available_codecs())
+    def test_page_of_long_users_fits_in_one_sqs_message(self, reset_users_state, handlers, codec):
+        users = [
+            {"name": "John", "surname": "Doe", "dni": str(index), "address": "Calle " + "x" * 250}
+            for index in range(MAX_PAGE_SIZE + 1)
+        ]
+        handlers.register_users_batch_rpc({"users": users[:500]})
+        handlers.register_users_batch_rpc({"users": users[500:1000]})
+        handlers.register_users_batch_rpc({"users": users[1000:]})
+        
+        listed, cursor = [], None
+        while True:
+            page = handlers.list_users_rpc({"cursor": cursor} if cursor else {})
+            reply = {"correlation_id": "c" * 36, "data": page, "status": "OK"}
+            assert len(get_codec(codec).encode(reply).encode()) < SQS_MAX_MESSAGE_BYTES
+            listed.extend(user["id"] for user in page["users"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        
+        assert listed == list(range(1, MAX_PAGE_SIZE + 2))
+    
+    def test_stream_chunks_of_long_users_fit_in_one_sqs_message(self, reset_users_state, handlers):
+        handlers.register_users_batch_rpc({"users": [
+            {"name": "John", "surname": "Doe", "dni": str(index), "address": "Calle " + "x" * 250}
+            for index in range(500)
+        ]})
+        
+        pages = list(handlers.list_users_stream_rpc({}))
+        
+        assert len(pages) > 1
+        assert sum(len(page["users"]) for page in pages) == 500
+        assert all(len(json.dumps(page)) < SQS_MAX_MESSAGE_BYTES for page in pages)
+    
+    def test_invalid_cursor_returns_validation_error(self, reset_users_state, handlers):
+        result = handlers.list_users_rpc({"limit": 2, "cursor": "not-a-cursor"})
+        
+        assert "Validation error" in result["error"]
+    
+    def test_invalid_limit_returns_validation_error(self, reset_users_state, handlers):
+        result = handlers.list_users_rpc({"limit": 0})
+        
+        assert "Validation error" in result["error"]
+    
+    def test_stream_yields_pages(self, reset_users_state, handlers):
+        handlers.STREAM_CHUNK_SIZE = 2
+        for dni in ("111", "222", "333", "444", "555"):
+            handlers.register_user_rpc({"name": "John", "surname": "Doe", "dni": dni, "address": "St 1"})
+        
+        pages = list(handlers.list_users_stream_rpc({}))
+        
+        assert [len(page["users"]) for page in pages] == [2, 2, 1]
+    
+    def test_stream_applies_filters(self, reset_users_state, handlers):
+        handlers.register_user_rpc({"name": "John", "surname": "Doe", "dni": "111", "address": "St 1"})
+        handlers.register_user_rpc({"name": "Jane", "surname": "Doe", "dni": "222", "address": "St 1"})
+        
+        pages = list(handlers.list_users_stream_rpc({"name": "Jane"}))
+        
+        assert [user["dni"] for page in pages for user in page["users"]] == ["222"]
+
+
+@pytest.mark.unit
+class TestListUsersProjection:
+    
+    def test_fields_projection(self, reset_users_state, handlers):
+        handlers.register_user_rpc({"name": "John", "surname": "Doe", "dni": "111", "address": "St 1"})
+        
+        result = handlers.list_users_rpc({"fields": ["id", "dni"]})
+        
+        assert result["users"] == [{"id": 1, "dni": "111"}]
+    
+    def test_count_only(self, reset_users_state, handlers):
+        handlers.register_user_rpc({"name": "John", "surname": "Doe", "dni": "111", "address": "St 1"})
+        handlers.register_user_rpc({"name": "Jane", "surname": "Doe", "dni": "222", "address": "St 1"})
+        
+        assert handlers.list_users_rpc({"count_only": True}) == {"count": 2}
+        assert handlers.list_users_rpc({"name": "Jane", "count_only": True}) == {"count": 1}
+    
+    def test_unknown_field_returns_validation_error(self, reset_users_state, handlers):
+        result = handlers.list_users_rpc({"fields": ["password"]})
+        
+        assert "Validation error" in result["error"]
+    
+    def test_paged_projection(self, reset_users_state, handlers):
+        for dni in ("111", "222"):
+            handlers.register_user_rpc({"name": "John", "surname": "Doe", "dni": dni, "address": "St 1"})
+        
+        result = handlers.list_users_rpc({"limit": 1, "fields": ["dni"]})
+        
+        assert result["users"] == [{"dni": "111"}]
+        assert result["next_cursor"] is not None
+
+
+@pytest.mark.unit
+class TestRegisterUsersBatchRPC:
+    
+    def test_valid_and_invalid_items_in_order(self, reset_users_state, sample_user, handlers):
+        result = handlers.register_users_batch_rpc({"users": [sample_user, {"name": "Jane"}, sample_user]})
+        
+        assert result["created"] == 2
+        assert result["failed"] == 1
+        assert [item["index"] for item in result["results"]] == [0, 1, 2]
+        assert result["results"][0]["user"]["id"] == 1
+        assert "Validation error" in result["results"][1]["error"]
+        assert result["results"][2]["user"]["id"] == 2
+        assert len(handlers.repo.users) == 2
+    
+    def test_empty_batch_is_a_validation_error(self, reset_users_state, handlers):
+        result = handlers.register_users_batch_rpc({"users": []})
+        
+        assert "Validation error" in result["error"]
+    
+    def test_oversized_batch_is_a_validation_error(self, reset_users_state, sample_user, handlers):
+        result = handlers.register_users_batch_rpc({"users": [sample_user] * 501})
+        
+        assert "Validation error" in result["error"]
+        assert handlers.repo.users == []
+
+
+@pytest.mark.unit
+class TestUpdateUsersBatchRPC:
+    
+    def test_per_item_results(self, reset_users_state, sample_user, handlers):
+        handlers.register_user_rpc(sample_user)
+        handlers.register_user_rpc(sample_user)
+        
+        result = handlers.update_users_batch_rpc({"users": [
+            {"id": 2, "address": "Calle 9"},
+            {"address": "no id"},
+            {"id": 7, "address": "Calle 9"},
+        ]})
+        
+        assert (result["updated"], result["failed"]) == (1, 2)
+        assert result["results"][0]["user"]["address"] == "Calle 9"
+        assert "Validation error" in result["results"][1]["error"]
+        assert "not found" in result["results"][2]["error"]
+        assert handlers.repo.get_updates_count() == 1
+    
+    def test_empty_batch_is_a_validation_error(self, reset_users_state, handlers):
+        result = handlers.update_users_batch_rpc({"users": []})
+        
+        assert "Validation error" in result["error"]
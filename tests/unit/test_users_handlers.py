@@ -38,19 +38,20 @@ class TestUsersEventHandlers:
 
     def test_update_user_rpc_success(self, handlers, mock_repo):
         payload = {"id": 1, "name": "Ivan Updated"}
-        mock_repo.update.return_value = {"id": 1, "name": "Ivan Updated"}
+        mock_repo.update_many.return_value = [{"id": 1, "name": "Ivan Updated", "update_seq": 1}]
         
         result = handlers.update_user_rpc(payload)
         
-        mock_repo.update.assert_called_once()
+        mock_repo.update_many.assert_called_once_with([{"id": 1, "name": "Ivan Updated"}])
         assert result["name"] == "Ivan Updated"
+        assert result["update_seq"] == 1
 
     def test_update_user_rpc_not_found(self, handlers, mock_repo):
         payload = {"id": 999, "name": "Ivan"}
         
-        mock_repo.update.side_effect = UserNotFoundError("User not found")
+        mock_repo.update_many.return_value = [None]
         
         result = handlers.update_user_rpc(payload)
         
         assert "error" in result
-        assert "User not found" in result["error"]
+        assert "User with id 999 not found" in result["error"]
@@ -0,0 +1,361 @@
+import time
+import pytest
+from datetime import datetime, timedelta
+from apis.users.repository import UserRepository, UserNotFoundError, UserValidationError, encode_cursor, decode_cursor
+
+
+@pytest.fixture
+def repo(reset_users_state):
+    return UserRepository()
+
+
+def make_user(repo, name="John", surname="Doe", dni="111", address="St 1"):
+    return repo.create({"name": name, "surname": surname, "dni": dni, "address": address})
+
+
+@pytest.mark.unit
+class TestUserRepositoryIndexes:
+
+    def test_get_by_id(self, repo):
+        user = make_user(repo)
+
+        assert repo.get_by_id(user["id"]) == user
+        assert repo.get_by_id(999) is None
+
+    def test_find_by_dni(self, repo):
+        make_user(repo, dni="111")
+        target = make_user(repo, dni="222")
+
+        assert repo.find_by_dni("222") == [target]
+        assert repo.find_by_dni("333") == []
+
+    def test_filters_intersect_indexes(self, repo):
+        make_user(repo, name="John", surname="Doe", dni="1")
+        john_smith = make_user(repo, name="John", surname="Smith", dni="2")
+        make_user(repo, name="Jane", surname="Smith", dni="3")
+
+        assert repo.list_all({"name": "John", "surname": "Smith"}) == [john_smith]
+
+    def test_results_keep_id_order(self, repo):
+        users = [make_user(repo, name="John", dni=str(i)) for i in range(5)]
+
+        assert repo.list_all({"name": "John"}) == users
+
+    def test_update_moves_user_between_index_entries(self, repo):
+        user = make_user(repo, name="John", dni="111")
+
+        user = repo.update(user["id"], {"name": "Jane", "dni": "999"})
+
+        assert repo.list_all({"name": "John"}) == []
+        assert repo.list_all({"name": "Jane"}) == [user]
+        assert repo.find_by_dni("111") == []
+        assert repo.find_by_dni("999") == [user]
+
+    def test_update_with_none_keeps_index(self, repo):
+        user = make_user(repo, name="John")
+
+        user = repo.update(user["id"], {"name": None, "address": "New St"})
+
+        assert repo.list_all({"name": "John"}) == [user]
+
+    def test_update_unknown_id(self, repo):
+        with pytest.raises(UserNotFoundError):
+            repo.update(42, {"name": "Jane"})
+
+    def test_filter_by_non_indexed_field(self, repo):
+        make_user(repo, address="St 1", dni="1")
+        target = make_user(repo, address="St 2", dni="2")
+
+        assert repo.list_all({"address": "St 2"}) == [target]
+
+    def test_filter_values_compare_as_strings(self, repo):
+        user = make_user(repo, dni="12345678")
+
+        assert repo.list_all({"dni": 12345678}) == [user]
+
+    def test_clear_resets_indexes(self, repo):
+        make_user(repo)
+
+        repo.clear()
+
+        assert repo.list_all({}) == []
+        assert repo.list_all({"name": "John"}) == []
+
+
+@pytest.mark.unit
+class TestCompactStorage:
+
+    def test_serialized_shape(self, repo):
+        user = make_user(repo)
+
+        assert list(user) == ["id", "name", "surname", "dni", "address", "created_at", "updated_at"]
+        assert datetime.fromisoformat(user["created_at"]).utcoffset() == timedelta(hours=-3)
+
+    def test_timestamps_round_trip(self, repo):
+        user = make_user(repo)
+
+        assert repo.get_by_id(user["id"])["created_at"] == user["created_at"]
+
+    def test_repeated_names_are_interned(self, repo):
+        for i in range(50):
+            make_user(repo, name="John", surname="Doe", dni=str(i))
+
+        assert len(repo._strings.values) == 2
+
+    def test_unknown_fields_rejected(self, repo):
+        with pytest.raises(UserValidationError):
+            repo.create({"name": "John", "surname": "Doe", "dni": "1", "address": "St", "email": "x"})
+
+    def test_non_ascii_values(self, repo):
+        user = make_user(repo, name="María", surname="Pérez", address="Av. Córdoba 1234")
+
+        assert repo.list_all({"surname": "Pérez"}) == [user]
+        assert user["address"] == "Av. Córdoba 1234"
+
+    def test_renames_back_and_forth_do_not_duplicate(self, repo):
+        user = make_user(repo, name="John")
+        for name in ("Jane", "John", "Jane", "John"):
+            user = repo.update(user["id"], {"name": name})
+
+        assert repo.list_all({"name": "John"}) == [user]
+        assert repo.list_all({"name": "Jane"}) == []
+
+    def test_stale_postings_are_compacted(self, repo):
+        users = [make_user(repo, name="John", dni=str(i)) for i in range(10)]
+        for user in users[:8]:
+            repo.update(user["id"], {"name": "Jane"})
+
+        code = repo._strings.codes["John"]
+        assert len(repo._postings["name"][code]) <= 4
+        assert [u["id"] for u in repo.list_all({"name": "John"})] == [9, 10]
+
+    def test_shared_dni(self, repo):
+        first = make_user(repo, dni="111")
+        second = make_user(repo, dni="111")
+
+        assert repo.find_by_dni("111") == [first, second]
+
+        second = repo.update(second["id"], {"dni": "222"})
+        assert repo.find_by_dni("111") == [first]
+        assert repo.find_by_dni("222") == [second]
+
+    def test_snapshot_round_trip(self, repo):
+        make_user(repo, name="John", dni="111")
+        make_user(repo, name="Jane", dni="222")
+        repo.update(1, {"address": "New St"})
+        snapshot = repo.export_snapshot()
+        expected = repo.users
+
+        repo.clear()
+        repo.import_snapshot(snapshot)
+
+        assert repo.users == expected
+        assert repo.find_by_dni("222") == [expected[1]]
+        assert repo.get_updates_count() == 1
+
+    @pytest.mark.slow
+    def test_memory_at_least_three_times_lower(self, repo):
+        from benchmarks.memory_users import measure, legacy_store, compact_store
+
+        legacy = measure(legacy_store, 20_000)
+        compact = measure(compact_store, 20_000)
+
+        assert legacy / compact >= 3
+
+
+@pytest.mark.unit
+class TestUserRepositoryPagination:
+
+    def test_pages_cover_every_user_once(self, repo):
+        for index in range(7):
+            repo.create({"name": "Ana", "surname": "Sosa", "dni": str(index), "address": "Calle 1"})
+
+        ids, cursor = [], None
+        while True:
+            page = repo.list_page({}, limit=3, cursor=cursor)
+            ids.extend(user["id"] for user in page["users"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+
+        assert ids == list(range(1, 8))
+
+    def test_exact_multiple_has_no_trailing_page(self, repo):
+        for index in range(4):
+            repo.create({"name": "Ana", "surname": "Sosa", "dni": str(index), "address": "Calle 1"})
+
+        first = repo.list_page({}, limit=2)
+        second = repo.list_page({}, limit=2, cursor=first["next_cursor"])
+
+        assert second["next_cursor"] is None
+        assert [user["id"] for user in second["users"]] == [3, 4]
+
+    def test_filtered_pages(self, repo):
+        for index in range(6):
+            repo.create({"name": "Ana" if index % 2 else "Luis", "surname": "Sosa", "dni": str(index), "address": "Calle 1"})
+
+        first = repo.list_page({"name": "Ana"}, limit=2)
+        second = repo.list_page({"name": "Ana"}, limit=2, cursor=first["next_cursor"])
+
+        assert [user["id"] for user in first["users"]] == [2, 4]
+        assert [user["id"] for user in second["users"]] == [6]
+        assert second["next_cursor"] is None
+
+    def test_max_bytes_ends_page_early(self, repo):
+        for index in range(5):
+            repo.create({"name": "Ana", "surname": "Sosa", "dni": str(index), "address": "x" * 100})
+
+        ids, cursor = [], None
+        while True:
+            page = repo.list_page({}, limit=5, cursor=cursor, max_bytes=400)
+            assert 1 <= len(page["users"]) < 5
+            ids.extend(user["id"] for user in page["users"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+
+        assert ids == list(range(1, 6))
+
+    def test_max_bytes_keeps_at_least_one_user(self, repo):
+        repo.create({"name": "Ana", "surname": "Sosa", "dni": "1", "address": "x" * 1000})
+        repo.create({"name": "Ana", "surname": "Sosa", "dni": "2", "address": "Calle 1"})
+
+        page = repo.list_page({}, limit=2, max_bytes=100)
+
+        assert [user["id"] for user in page["users"]] == [1]
+        assert page["next_cursor"] is not None
+
+    @pytest.mark.parametrize("cursor", ["garbage", encode_cursor(1)[:-2], "YWZ0ZXI6LTE"])
+    def test_invalid_cursor(self, repo, cursor):
+        with pytest.raises(UserValidationError):
+            repo.list_page({}, limit=2, cursor=cursor)
+
+    def test_cursor_round_trip(self):
+        assert decode_cursor(encode_cursor(12345)) == 12345
+
+
+@pytest.mark.unit
+class TestUserRepositoryProjection:
+
+    def test_list_all_projects_fields(self, repo):
+        make_user(repo, dni="111")
+        make_user(repo, name="Jane", dni="222")
+
+        assert repo.list_all({"name": "Jane"}, fields=["id", "dni"]) == [{"id": 2, "dni": "222"}]
+
+    def test_projection_keeps_requested_order_and_drops_duplicates(self, repo):
+        make_user(repo)
+
+        user = repo.list_all({}, fields=["surname", "id", "surname"])[0]
+
+        assert list(user) == ["surname", "id"]
+
+    def test_page_cursor_without_id_field(self, repo):
+        for dni in ("1", "2", "3"):
+            make_user(repo, dni=dni)
+
+        first = repo.list_page({}, limit=2, fields=["dni"])
+        second = repo.list_page({}, limit=2, cursor=first["next_cursor"], fields=["dni"])
+
+        assert first["users"] == [{"dni": "1"}, {"dni": "2"}]
+        assert second == {"users": [{"dni": "3"}], "next_cursor": None}
+
+    def test_unknown_field(self, repo):
+        with pytest.raises(UserValidationError):
+            repo.list_all({}, fields=["password"])
+
+    def test_count(self, repo):
+        make_user(repo, dni="111")
+        make_user(repo, name="Jane", dni="222")
+        make_user(repo, name="Jane", dni="333")
+        repo.update(3, {"name": "Ann"})
+
+        assert repo.count({}) == 3
+        assert repo.count({"name": "Jane"}) == 1
+        assert repo.count({"name": "Nobody"}) == 0
+
+
+@pytest.mark.unit
+class TestUserRepositoryCreateMany:
+
+    def test_creates_consecutive_ids_with_one_timestamp(self, repo):
+        make_user(repo)
+
+        users = repo.create_many([
+            {"name": "Ana", "surname": "Sosa", "dni": "2", "address": "Calle 1"},
+            {"name": "Luis", "surname": "Paz", "dni": "3", "address": "Calle 2"},
+        ])
+
+        assert [user["id"] for user in users] == [2, 3]
+        assert users[0]["created_at"] == users[1]["created_at"]
+        assert repo.find_by_dni("3")[0]["name"] == "Luis"
+        assert repo.list_all({"name": "Ana"})[0]["id"] == 2
+
+    def test_unknown_field_rejects_whole_batch(self, repo):
+        with pytest.raises(UserValidationError):
+            repo.create_many([
+                {"name": "Ana", "surname": "Sosa", "dni": "2", "address": "Calle 1"},
+                {"name": "Ana", "surname": "Sosa", "dni": "2", "address": "Calle 1", "age": 3},
+            ])
+
+        assert repo.users == []
+
+    def test_empty_batch(self, repo):
+        assert repo.create_many([]) == []
+
+
+@pytest.mark.unit
+class TestUserRepositoryUpdateMany:
+
+    def test_applies_patches_and_reports_missing_ids(self, repo):
+        make_user(repo, dni="111")
+        make_user(repo, dni="222")
+
+        results = repo.update_many([
+            {"id": 2, "address": "Calle 9"},
+            {"id": 99, "address": "Calle 9"},
+            {"id": 1, "name": "Ana", "dni": "333"},
+        ])
+
+        assert results[0]["address"] == "Calle 9"
+        assert results[1] is None
+        assert (results[2]["name"], results[2]["dni"]) == ("Ana", "333")
+        assert repo.get_updates_count() == 2
+        assert repo.find_by_dni("111") == []
+        assert repo.list_all({"name": "Ana"})[0]["id"] == 1
+
+    def test_same_user_patched_twice_keeps_last_value(self, repo):
+        make_user(repo)
+
+        repo.update_many([{"id": 1, "address": "A"}, {"id": 1, "address": "B"}])
+
+        assert repo.get_by_id(1)["address"] == "B"
+
+    def test_updates_are_numbered_in_order(self, repo):
+        make_user(repo)
+        repo.update(1, {"address": "A"})
+
+        results = repo.update_many([{"id": 1, "address": "B"}, {"id": 2, "address": "C"}, {"id": 1, "address": "D"}])
+
+        assert [user and user["update_seq"] for user in results] == [2, None, 3]
+        assert "update_seq" not in repo.get_by_id(1)
+
+    def test_clear_starts_a_new_users_epoch(self, repo):
+        first = make_user(repo)
+        [before] = repo.update_many([{"id": first["id"], "address": "Calle 2"}])
+
+        repo.clear()
+        time.sleep(0.001)
+        second = make_user(repo)
+        [after] = repo.update_many([{"id": second["id"], "address": "Calle 2"}])
+
+        assert (before["id"], before["update_seq"]) == (after["id"], after["update_seq"]) == (1, 1)
+        assert before["users_epoch"] != after["users_epoch"] == repo.get_epoch()
+
+    def test_unknown_field_rejects_whole_batch(self, repo):
+        make_user(repo)
+
+        with pytest.raises(UserValidationError):
+            repo.update_many([{"id": 1, "address": "A"}, {"id": 1, "age": 3}])
+
+        assert repo.get_by_id(1)["address"] == "St 1"